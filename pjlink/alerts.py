@@ -0,0 +1,162 @@
+from collections import namedtuple
+import threading
+import time
+
+from pjlink.projector import Status
+
+# condition(status) decides whether the alert should fire, and clear(status)
+# whether a firing alert should stop (by default, when condition doesn't
+# hold); both are only given Statuses with all of fields known. An alert
+# fires after condition has held for for_polls polls in a row, and clears
+# after clear has held for clear_polls.
+Rule = namedtuple('Rule', 'name fields condition clear for_polls clear_polls')
+
+# An alert starting (firing is True) or stopping for one projector.
+Transition = namedtuple('Transition', 'rule name firing at')
+
+def make_rule(name, fields, condition, clear=None, for_polls=1,
+              clear_polls=1):
+    unknown = set(fields) - set(Status._fields)
+    if unknown:
+        raise ValueError('Unknown fields: %s' % ', '.join(sorted(unknown)))
+    if clear is None:
+        clear = lambda status: not condition(status)
+    return Rule(name, tuple(fields), condition, clear, for_polls, clear_polls)
+
+def error_rule(name, kind, states=('warning', 'error'), power=None,
+               for_polls=1, clear_polls=1):
+    """
+    Fires while the projector reports one of states for kind of error (e.g.
+    'filter'), and, if power is given, is in that power state.
+    """
+    states = frozenset(states)
+
+    def condition(status):
+        if power is not None and status.power != power:
+            return False
+        return dict(status.errors)[kind] in states
+
+    fields = ('errors',) if power is None else ('power', 'errors')
+    return make_rule(name, fields, condition, None, for_polls, clear_polls)
+
+def lamp_life_rule(name, rated, fraction=0.9, margin=0.05):
+    # Fires once any lamp is past fraction of its rated hours, and only
+    # clears when they're all back under fraction - margin (i.e. replaced).
+    def condition(status):
+        return any(hours >= rated * fraction for hours, _ in status.lamps)
+
+    def clear(status):
+        return all(
+            hours < rated * (fraction - margin) for hours, _ in status.lamps)
+
+    return make_rule(name, ('lamps',), condition, clear)
+
+class _Device(object):
+    def __init__(self):
+        self.status = Status(None, None, None, None, None)
+        self.firing = set()
+        # rule -> polls in a row that it's wanted to change state.
+        self.pending = {}
+
+class AlertEngine(object):
+    """
+    Evaluates Rules against the Statuses of a fleet as they're polled.
+
+    Rules are indexed by the fields they use, so a poll only evaluates the
+    rules whose fields changed, plus any that are part-way through counting
+    polls. Each alert is only reported when it starts or stops firing:
+    ``update`` returns the Transitions, and also passes each one to
+    ``on_transition`` if it's set.
+    """
+
+    def __init__(self, rules, clock=time.time):
+        self.rules = list(rules)
+        self.clock = clock
+        self.on_transition = None
+        self.by_field = dict((field, []) for field in Status._fields)
+        for rule in self.rules:
+            for field in rule.fields:
+                self.by_field[field].append(rule)
+        self.devices = {}
+        self.lock = threading.Lock()
+        # How many times a rule has been evaluated, for tuning.
+        self.evaluations = 0
+
+    def update(self, name, status, now=None):
+        """Takes a projector's latest Status; fields left as None are kept."""
+        now = self.clock() if now is None else now
+        with self.lock:
+            transitions = self._update(name, status, now)
+        if self.on_transition is not None:
+            for transition in transitions:
+                self.on_transition(transition)
+        return transitions
+
+    def _update(self, name, status, now):
+        device = self.devices.get(name)
+        if device is None:
+            device = self.devices[name] = _Device()
+
+        polled = set()
+        changed = {}
+        for field, value in zip(Status._fields, status):
+            if value is None:
+                continue
+            polled.add(field)
+            if value != getattr(device.status, field):
+                changed[field] = value
+        if changed:
+            device.status = device.status._replace(**changed)
+
+        affected = set()
+        for field in changed:
+            affected.update(self.by_field[field])
+        # Those still counting polls need this one counted too.
+        for rule in device.pending:
+            if polled.intersection(rule.fields):
+                affected.add(rule)
+
+        transitions = []
+        current = device.status
+        for rule in affected:
+            if any(getattr(current, field) is None for field in rule.fields):
+                continue
+            self.evaluations += 1
+            firing = rule in device.firing
+            if firing:
+                wanted, needed = rule.clear(current), rule.clear_polls
+            else:
+                wanted, needed = rule.condition(current), rule.for_polls
+            if not wanted:
+                device.pending.pop(rule, None)
+                continue
+            count = device.pending.get(rule, 0) + 1
+            if count < needed:
+                device.pending[rule] = count
+                continue
+            device.pending.pop(rule, None)
+            if firing:
+                device.firing.discard(rule)
+            else:
+                device.firing.add(rule)
+            transitions.append(Transition(rule.name, name, not firing, now))
+        transitions.sort()
+        return transitions
+
+    def on_status(self, name, status, changed=True):
+        # For Poller.on_status.
+        self.update(name, status)
+
+    def firing(self):
+        """Returns the (rule name, projector name) pairs now firing."""
+        with self.lock:
+            return sorted(
+                (rule.name, name)
+                for name, device in self.devices.items()
+                for rule in device.firing
+            )
+
+    def forget(self, name):
+        # Drops a projector without reporting its alerts as stopped.
+        with self.lock:
+            self.devices.pop(name, None)
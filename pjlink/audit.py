@@ -0,0 +1,123 @@
+from collections import namedtuple
+import json
+import os
+import queue
+import threading
+import time
+
+# result is 'OK', or the error the projector replied with.
+Record = namedtuple('Record', 'time device body param result')
+
+MAX_BYTES = 10 * 1024 * 1024
+BACKUPS = 5
+MAX_QUEUE = 10000
+BATCH = 500
+FLUSH_INTERVAL = 1.0
+
+_STOP = object()
+
+def format_record(record):
+    return json.dumps({
+        'time': time.strftime(
+            '%Y-%m-%dT%H:%M:%S', time.gmtime(record.time),
+        ) + '.%03dZ' % (record.time % 1 * 1000),
+        'device': record.device,
+        'command': record.body,
+        'param': record.param,
+        'result': record.result,
+    }, sort_keys=True)
+
+class AuditLog(object):
+    """
+    Appends Records to a rotating JSON-lines file from a background thread.
+    Recording only queues; when the queue is full, callers wait for the
+    writer to catch up, or with ``block=False``, the record is dropped and
+    counted instead.
+    """
+
+    def __init__(self, path, max_bytes=MAX_BYTES, backups=BACKUPS,
+                 max_queue=MAX_QUEUE, batch=BATCH,
+                 flush_interval=FLUSH_INTERVAL, block=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch = batch
+        self.flush_interval = flush_interval
+        self.block = block
+        self.queue = queue.Queue(max_queue)
+        self.dropped = 0
+        self.written = 0
+        # The last exception raised while writing, if any.
+        self.error = None
+        self.closed = False
+
+        self.f = open(path, 'a')
+        self.thread = threading.Thread(target=self._run, name='pjlink-audit')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def record(self, device, body, param, result):
+        if self.closed:
+            # Nothing would write it out.
+            self.dropped += 1
+            return
+        record = Record(time.time(), device, body, param, result)
+        try:
+            self.queue.put(record, self.block)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                records = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            # Take whatever else is waiting, up to a batch.
+            while len(records) < self.batch:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in records:
+                # Records can still land after it, from callers racing close.
+                records = [r for r in records if r is not _STOP]
+                stopping = True
+                while True:
+                    try:
+                        records.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+            if records:
+                try:
+                    self._write(records)
+                except (OSError, ValueError) as e:
+                    self.error = e
+
+    def _write(self, records):
+        self.f.write(''.join(format_record(r) + '\n' for r in records))
+        self.f.flush()
+        self.written += len(records)
+        if self.f.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self.f.close()
+        for i in range(self.backups - 1, 0, -1):
+            source = '%s.%d' % (self.path, i)
+            if os.path.exists(source):
+                os.replace(source, '%s.%d' % (self.path, i + 1))
+        if self.backups:
+            os.replace(self.path, self.path + '.1')
+        else:
+            os.remove(self.path)
+        self.f = open(self.path, 'a')
+
+    def close(self):
+        # Writes out everything recorded so far.
+        self.closed = True
+        if self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join()
+        self.f.close()
@@ -0,0 +1,137 @@
+from collections import Counter
+import itertools
+import threading
+import time
+
+from pjlink import protocol
+from pjlink.projector import ProjectorError
+
+# Maps error messages back to the codes projectors send.
+ERROR_CODES = dict(
+    (message, code.decode('ascii'))
+    for code, message in protocol.ERRORS.items()
+)
+
+DEFAULT_MIX = 'POWR:4,ERST,LAMP,INPT,AVMT'
+
+def parse_mix(text):
+    # e.g. POWR:4,ERST,INPT=31:2 -- queries unless given a parameter, and
+    # a weight of 1 unless given one.
+    mix = []
+    for item in text.split(','):
+        item, _, weight = item.strip().partition(':')
+        body, _, param = item.partition('=')
+        body = body.upper()
+        if len(body) != 4:
+            raise ValueError('Invalid command: %s' % body)
+        mix.extend([(body, param or '?')] * int(weight or 1))
+    return mix
+
+class BenchResult(object):
+    def __init__(self):
+        self.latencies = []
+        self.errors = Counter()
+        # Completed commands per second of the run.
+        self.timeline = Counter()
+        self.duration = 0
+        self.lock = threading.Lock()
+
+    def record(self, second, latency, error):
+        with self.lock:
+            self.latencies.append(latency)
+            self.timeline[second] += 1
+            if error is not None:
+                self.errors[error] += 1
+
+    @property
+    def count(self):
+        return len(self.latencies)
+
+    def percentile(self, p):
+        if not self.latencies:
+            return 0
+        latencies = sorted(self.latencies)
+        rank = max(int(round(p / 100.0 * len(latencies))) - 1, 0)
+        return latencies[rank]
+
+    def error_rate(self, code):
+        return self.errors[code] / float(self.count or 1)
+
+    def report(self):
+        lines = ['commands: %d (%.1f/s)' % (
+            self.count, self.count / (self.duration or 1))]
+        lines.append('errors: %s' % (', '.join(
+            '%s %d (%.2f%%)' % (code, n, 100 * self.error_rate(code))
+            for code, n in sorted(self.errors.items())
+        ) or 'none'))
+        lines.append('latency: %s' % ', '.join(
+            'p%s %.2f ms' % (p, 1000 * self.percentile(p))
+            for p in (50, 90, 99, 100)
+        ))
+        lines.append('throughput:')
+        for second in range(int(self.duration + 0.999)):
+            lines.append('  %3ds: %d' % (second, self.timeline[second]))
+        return '\n'.join(lines)
+
+def run(open_projector, targets, mix, duration=10.0, concurrency=1,
+        rate=None):
+    # With a rate, latency is measured from when each command was due, so
+    # a stalled projector can't hide its stalls by holding up the sender.
+    result = BenchResult()
+    tickets = itertools.count()
+    lock = threading.Lock()
+    start = time.perf_counter()
+    end = start + duration
+
+    def worker(target):
+        p = None
+        while True:
+            with lock:
+                i = next(tickets)
+            if rate:
+                due = start + i / float(rate)
+                if due >= end:
+                    break
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                due = time.perf_counter()
+                if due >= end:
+                    break
+
+            body, param = mix[i % len(mix)]
+            error = None
+            try:
+                if p is None:
+                    p = open_projector(target)
+                if param == '?':
+                    p.get(body)
+                else:
+                    p.set(body, param)
+            except ProjectorError as e:
+                error = ERROR_CODES.get(e.args[0], 'other')
+            except (OSError, ValueError, EOFError):
+                error = 'connection'
+                if p is not None:
+                    p.f.close()
+                p = None
+
+            now = time.perf_counter()
+            result.record(int(due - start), now - due, error)
+
+        if p is not None:
+            p.f.close()
+
+    threads = [
+        threading.Thread(target=worker, args=(target,))
+        for target in targets
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    result.duration = time.perf_counter() - start
+    return result
@@ -1,20 +1,29 @@
 import argparse
+import asyncio
 from getpass import getpass
 from os import path
-from socket import socket
 import sys
 import textwrap
+import time
 
 from six import print_, PY2
-from six.moves.configparser import (
-    NoSectionError,
-    ConfigParser
-)
 
 import appdirs
 
 from pjlink import Projector
+from pjlink import bench
+from pjlink import cluster
+from pjlink import gateway
+from pjlink import mqtt
+from pjlink import probe
+from pjlink import proxy
+from pjlink import snapshot
 from pjlink import projector
+from pjlink.inventory import Inventory, load_inventory, make_entry
+from pjlink.poller import Poller
+from pjlink.session import SessionPool
+from pjlink.stats import LatencyStats, TimedFile
+from pjlink.transport import TCPTransport
 from pjlink.cliutils import make_command
 
 if PY2:
@@ -85,6 +94,130 @@ def cmd_errors(p):
     for what, state in sorted(p.get_errors().items()):
         print('%s: %s' % (what, state))
 
+def open_projector(host, port, password, get_password=getpass):
+    transport = TCPTransport(host, port)
+    proj = Projector(transport.open())
+    if password:
+        get_password = lambda: password
+    if proj.authenticate(get_password) is False:
+        raise projector.ProjectorError('Incorrect password.')
+    return proj
+
+def cmd_bench(projector, config, hosts, mix, duration, concurrency, rate):
+    targets = [
+        resolve_projector(host, config)
+        for host in (hosts or [projector])
+    ]
+    result = bench.run(
+        lambda target: open_projector(*target),
+        targets, bench.parse_mix(mix),
+        duration=duration, concurrency=concurrency, rate=rate,
+    )
+    print(result.report())
+
+def cmd_ping(projector, config, hosts, timeout, concurrency):
+    if hosts or projector:
+        targets = [
+            resolve_projector(host, config)[:2]
+            for host in (hosts or [projector])
+        ]
+    else:
+        # Sweep the whole inventory.
+        targets = [
+            (entry.host, entry.port)
+            for entry in load_inventory(config_path(config))
+        ]
+    results = probe.sweep(targets, timeout=timeout, concurrency=concurrency)
+    for result in results:
+        target = '%s:%d' % (result.host, result.port)
+        if result.alive:
+            print('%s: %.1f ms (%s)' % (
+                target, result.latency * 1000,
+                'password' if result.auth else 'no password',
+            ))
+        else:
+            print('%s: down (%s)' % (target, result.error))
+    if not all(result.alive for result in results):
+        sys.exit(1)
+
+def cmd_gateway(projector, config, listen):
+    host, _, port = listen.rpartition(':')
+    server = gateway.Gateway(SessionPool(load_inventory(config_path(config))))
+    try:
+        asyncio.run(server.serve_forever(host or 'localhost', int(port)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+def cmd_proxy(projector, config, names, listen):
+    if names:
+        inventory = load_inventory(config_path(config))
+    else:
+        host, port, password = resolve_projector(projector, config)
+        inventory = Inventory([make_entry('default', host, port, password)])
+        names = ['default']
+
+    # Each projector gets its own port, counting up from the given one.
+    host, _, port = listen.rpartition(':')
+    listeners = {}
+    for i, name in enumerate(names):
+        listeners[name] = (host or 'localhost', int(port) + i)
+        print('%s: %s:%d' % (name, host or 'localhost', int(port) + i))
+    sys.stdout.flush()
+
+    server = proxy.Proxy(SessionPool(inventory))
+    try:
+        asyncio.run(server.serve_forever(listeners))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+def cmd_mqtt(projector, config, broker, prefix, snapshot_path):
+    inventory = load_inventory(config_path(config))
+    pool = SessionPool(inventory)
+    host, _, port = broker.rpartition(':')
+    client = mqtt.PahoClient.connect(host or 'localhost', int(port))
+    bridge = mqtt.Bridge(pool, client, prefix=prefix)
+    poller = Poller([entry.name for entry in inventory], pool.get)
+    poller.on_status = bridge.on_status
+    poller.on_error = bridge.on_error
+    checkpointer = None
+    if snapshot_path:
+        checkpointer = snapshot.Checkpointer(snapshot_path, poller, pool)
+        checkpointer.restore()
+        checkpointer.start()
+    bridge.start()
+    try:
+        poller.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bridge.close()
+        client.close()
+        try:
+            if checkpointer is not None:
+                checkpointer.close()
+        finally:
+            pool.close()
+
+def cmd_cluster(projector, config, node, store, ttl):
+    inventory = load_inventory(config_path(config))
+    pool = SessionPool(inventory)
+    # The node adds projectors to the poller as it gets their leases.
+    poller = Poller([], pool.get)
+    member = cluster.ClusterNode(
+        node, [entry.name for entry in inventory],
+        cluster.FileLeaseStore(store), poller, ttl=ttl,
+    )
+    try:
+        member.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        member.leave()
+        pool.close()
 
 def make_parser():
     ad = appdirs.user_data_dir('pjlink')
@@ -108,6 +241,10 @@ def make_parser():
         help='host:port of the projector to connect to (e.g. 127.0.0.1:4352)',
     )
     parser.add_argument('-c', '--config')
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='print how long each phase of the command took',
+    )
 
     sub = parser.add_subparsers(title='command')
 
@@ -131,8 +268,88 @@ def make_parser():
     make_command(sub, 'errors', cmd_errors)
     make_command(sub, 'help', None)
 
+    bench_cmd = make_command(sub, 'bench', cmd_bench, connect=False)
+    bench_cmd.add_argument(
+        'hosts', nargs='*',
+        help='projectors to load (defaults to the -p projector)',
+    )
+    bench_cmd.add_argument(
+        '-m', '--mix', default=bench.DEFAULT_MIX,
+        help='commands to send, with weights (default: %(default)s)',
+    )
+    bench_cmd.add_argument('-d', '--duration', type=float, default=10.0)
+    bench_cmd.add_argument(
+        '-n', '--concurrency', type=int, default=1,
+        help='connections per projector',
+    )
+    bench_cmd.add_argument(
+        '-r', '--rate', type=float,
+        help='total commands per second (default: as fast as possible)',
+    )
+
+    ping = make_command(sub, 'ping', cmd_ping, connect=False)
+    ping.add_argument(
+        'hosts', nargs='*',
+        help='projectors to probe (defaults to -p, or the whole inventory)',
+    )
+    ping.add_argument(
+        '-t', '--timeout', type=float, default=probe.PROBE_TIMEOUT,
+        help='seconds to wait for each greeting (default: %(default)s)',
+    )
+    ping.add_argument(
+        '-n', '--concurrency', type=int, default=probe.CONCURRENCY,
+        help='probes in flight at once (default: %(default)s)',
+    )
+
+    proxy_cmd = make_command(sub, 'proxy', cmd_proxy, connect=False)
+    proxy_cmd.add_argument(
+        'names', nargs='*',
+        help='inventory projectors to proxy (defaults to the -p projector)',
+    )
+    proxy_cmd.add_argument(
+        '-l', '--listen', default='localhost:14352',
+        help='host:port for the first projector (default: %(default)s)',
+    )
+
+    gateway_cmd = make_command(sub, 'gateway', cmd_gateway, connect=False)
+    gateway_cmd.add_argument(
+        '-l', '--listen', default='localhost:8080',
+        help='host:port to serve HTTP on (default: %(default)s)',
+    )
+
+    mqtt_cmd = make_command(sub, 'mqtt', cmd_mqtt, connect=False)
+    mqtt_cmd.add_argument(
+        '-b', '--broker', default='localhost:1883',
+        help='host:port of the MQTT broker (default: %(default)s)',
+    )
+    mqtt_cmd.add_argument(
+        '--prefix', default=mqtt.PREFIX,
+        help='topic prefix (default: %(default)s)',
+    )
+    mqtt_cmd.add_argument(
+        '--snapshot', dest='snapshot_path',
+        help='file to keep what is known about the fleet in across restarts',
+    )
+
+    cluster_cmd = make_command(sub, 'cluster', cmd_cluster, connect=False)
+    cluster_cmd.add_argument('node', help='a name for this node')
+    cluster_cmd.add_argument(
+        '-s', '--store', required=True,
+        help='directory the nodes share for heartbeats and leases',
+    )
+    cluster_cmd.add_argument(
+        '--ttl', type=float, default=cluster.TTL,
+        help='seconds before a silent node is replaced (default: %(default)s)',
+    )
+
     return parser
 
+def config_path(conf_file):
+    if conf_file is None:
+        appdir = appdirs.user_data_dir('pjlink')
+        conf_file = path.join(appdir, 'pjlink.conf')
+    return conf_file
+
 def resolve_projector(projector, conf_file):
     password = None
 
@@ -143,24 +360,19 @@ def resolve_projector(projector, conf_file):
         return host, port, password
 
     # Otherwise, try reading from a config file.
-    if conf_file is None:
-        appdir = appdirs.user_data_dir('pjlink')
-        conf_file = path.join(appdir, 'pjlink.conf')
+    conf_file = config_path(conf_file)
 
     try:
-        config = ConfigParser({'port': '4352', 'password': ''})
-        with open(conf_file, 'r') as f:
-            config.readfp(f)
+        inventory = load_inventory(conf_file)
 
         section = projector
         if projector is None:
             section = 'default'
 
-        host = config.get(section, 'host')
-        port = config.getint(section, 'port')
-        password = config.get(section, 'password') or None
+        entry = inventory[section]
+        host, port, password = entry.host, entry.port, entry.password
 
-    except (NoSectionError, IOError):
+    except (KeyError, IOError):
         if projector is None:
             raise KeyError('No default projector defined in %s' % conf_file)
 
@@ -183,25 +395,52 @@ def main():
         return
     projector = kwargs.pop('projector')
     config = kwargs.pop('config')
+    profile = kwargs.pop('profile')
+
+    # Some commands manage their own connections.
+    if not kwargs.pop('__connect__', True):
+        func(projector=projector, config=config, **kwargs)
+        return
+
     host, port, password = resolve_projector(projector, config)
 
-    sock = socket()
-    sock.connect((host, port))
-    f = sock.makefile('rwb')
+    transport = TCPTransport(host, port)
+    f = transport.open()
+
+    stats = None
+    if profile:
+        f = TimedFile(f)
+        stats = LatencyStats()
+        timing = transport.timing
+        sys.stderr.write('resolve: %.1f ms\nconnect: %.1f ms (%s)\n' % (
+            timing.resolve * 1000, timing.connect * 1000, timing.address[0],
+        ))
 
     if password:
         get_password = lambda: password
     else:
         get_password = getpass
 
-    proj = Projector(f)
+    proj = Projector(f, stats=stats)
+    start = time.perf_counter()
     rv = proj.authenticate(get_password)
     if rv is False:
         sys.stderr.write('Incorrect password.')
         sys.stderr.flush()
         return
 
+    if profile:
+        # Includes any time spent waiting for a password to be typed.
+        sys.stderr.write('auth: %.1f ms\n' % (
+            (time.perf_counter() - start) * 1000))
+        f.reset()
+
     func(proj, **kwargs)
 
+    if profile:
+        sys.stderr.write('write: %.1f ms\nread: %.1f ms\n' % (
+            f.write_time * 1000, f.read_time * 1000))
+        stats.dump(sys.stderr)
+
 if __name__ == '__main__':
     main()
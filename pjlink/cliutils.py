@@ -95,10 +95,11 @@ def prompt_choices(
         if rv in _choices:
             return rv
 
-def make_command(group, name, function):
+def make_command(group, name, function, connect=True):
     parser = group.add_parser(name, help=function.__doc__)
     parser.set_defaults(
         __func__=function,
+        __connect__=connect,
     )
     return parser
 
@@ -0,0 +1,259 @@
+import bisect
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # e.g. on Windows, where FileLeaseStore can't be used.
+    fcntl = None
+
+from pjlink.connection import CONNECT_TIMEOUT
+from pjlink.transport import IO_TIMEOUT
+
+# Seconds a node's heartbeat and leases last without being renewed.
+TTL = 60.0
+# The longest a poll can take: connecting, then waiting on a reply.
+MAX_POLL = CONNECT_TIMEOUT + IO_TIMEOUT
+# How far apart the nodes' clocks might be.
+CLOCK_SKEW = 1.0
+# Points on the ring per node; more evens out the shares.
+REPLICAS = 64
+
+def _hash(key):
+    return int.from_bytes(
+        hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+class HashRing(object):
+    """
+    Consistent hashing of projector names onto nodes, so that a node
+    joining or leaving only moves the projectors it gains or loses.
+    """
+
+    def __init__(self, nodes=(), replicas=REPLICAS):
+        self.replicas = replicas
+        self.points = []
+        self.owners = []
+        self.nodes = set()
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.replicas):
+            point = _hash('%s#%d' % (node, i))
+            at = bisect.bisect(self.points, point)
+            self.points.insert(at, point)
+            self.owners.insert(at, node)
+
+    def remove(self, node):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        kept = [
+            (point, owner) for point, owner in zip(self.points, self.owners)
+            if owner != node
+        ]
+        self.points = [point for point, _ in kept]
+        self.owners = [owner for _, owner in kept]
+
+    def owner(self, name):
+        if not self.points:
+            return None
+        at = bisect.bisect(self.points, _hash(name)) % len(self.points)
+        return self.owners[at]
+
+class FileLeaseStore(object):
+    """
+    Node heartbeats and per-projector leases in a JSON file, shared by the
+    nodes (on one machine, or a shared filesystem with working locks).
+    Every change happens under an exclusive lock and is swapped into place.
+    It stands in for a proper coordination service.
+    """
+
+    def __init__(self, directory):
+        if fcntl is None:
+            raise ImportError('FileLeaseStore needs fcntl, which this '
+                              'platform lacks')
+        self.path = os.path.join(directory, 'cluster.json')
+        self.lock_path = os.path.join(directory, 'cluster.lock')
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except IOError:
+            return {'nodes': {}, 'leases': {}}
+
+    def _save(self, data):
+        directory = os.path.dirname(self.path)
+        fd, tmp = tempfile.mkstemp(dir=directory or '.')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def _change(self, func):
+        with open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                data = self._load()
+                result = func(data)
+                self._save(data)
+                return result
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def heartbeat(self, node, ttl, now):
+        """Records that node is alive; returns the live nodes."""
+        def change(data):
+            nodes = data['nodes']
+            nodes[node] = now + ttl
+            for other, expires in list(nodes.items()):
+                if expires <= now:
+                    del nodes[other]
+            return sorted(nodes)
+        return self._change(change)
+
+    def acquire(self, node, names, ttl, now):
+        """
+        Takes or renews node's leases on names, where they're free, and
+        releases any others it holds. Returns the names it now holds.
+        """
+        names = set(names)
+
+        def change(data):
+            leases = data['leases']
+            held = set()
+            for name, (owner, expires) in list(leases.items()):
+                if owner == node and name not in names:
+                    del leases[name]
+            for name in names:
+                owner, expires = leases.get(name, (None, 0))
+                if owner in (None, node) or expires <= now:
+                    leases[name] = (node, now + ttl)
+                    held.add(name)
+            return held
+        return self._change(change)
+
+    def leave(self, node):
+        # Drops node and its leases straight away.
+        def change(data):
+            data['nodes'].pop(node, None)
+            for name, (owner, _) in list(data['leases'].items()):
+                if owner == node:
+                    del data['leases'][name]
+        self._change(change)
+
+    def leases(self):
+        # name -> (node, expiry)
+        return dict(
+            (name, tuple(lease))
+            for name, lease in self._load()['leases'].items()
+        )
+
+class ClusterNode(object):
+    """
+    One of several nodes polling an inventory between them.
+
+    Each beat, the node renews its heartbeat, works out from the live nodes
+    which projectors it should own, and leases them. It polls only what
+    it holds a lease on, and drops projectors (waiting out any poll in
+    progress) before releasing them. It also only starts a poll if the
+    poll would finish, taking up to ``max_poll`` seconds, before the lease
+    could lapse. So a projector is never polled by two nodes at once. A
+    dead node's leases expire after ``ttl``, and the survivors pick its
+    projectors up.
+    """
+
+    def __init__(self, node, names, store, poller, ttl=TTL, interval=None,
+                 max_poll=MAX_POLL, clock=time.time, sleep=time.sleep):
+        self.node = node
+        self.names = list(names)
+        self.store = store
+        self.poller = poller
+        self.ttl = ttl
+        self.interval = ttl / 3.0 if interval is None else interval
+        self.max_poll = max_poll
+        if self.interval + max_poll + CLOCK_SKEW >= ttl:
+            raise ValueError(
+                'A ttl of %s leaves no time to poll between beats' % ttl)
+        self.clock = clock
+        self.sleep = sleep
+        self.held = set()
+        # When polls must stop being started, unless the leases are renewed.
+        self.safe_until = 0
+        self.next_beat = 0
+        self.stopping = False
+
+    def _drop(self, names):
+        names = set(names)
+        for name in names:
+            self.poller.remove(name)
+        # Any polls already under way have to finish first.
+        while self.poller.inflight & names:
+            self.poller.finish(timeout=None)
+        self.held -= names
+
+    def beat(self, now=None):
+        now = self.clock() if now is None else now
+        self.next_beat = now + self.interval
+        try:
+            ring = HashRing(self.store.heartbeat(self.node, self.ttl, now))
+            ring.add(self.node)
+            wanted = set(
+                name for name in self.names if ring.owner(name) == self.node)
+            # Stop polling what we're giving up before anyone can take it.
+            self._drop(self.held - wanted)
+            held = self.store.acquire(self.node, wanted, self.ttl, now)
+        except (IOError, ValueError):
+            # Our leases are only good until they'd expire.
+            if self.clock() >= self.safe_until:
+                self._drop(self.held)
+            return self.held
+        self.safe_until = now + self.ttl - self.max_poll - CLOCK_SKEW
+        self._drop(self.held - held)
+        for name in sorted(held - self.held):
+            self.poller.add(name)
+        self.held = held
+        return held
+
+    def run_once(self, now=None):
+        now = self.clock() if now is None else now
+        if now >= self.next_beat:
+            self.beat(now)
+        if now < self.safe_until:
+            self.poller.start_due()
+        elif self.held:
+            self._drop(self.held)
+        self.poller.finish()
+
+    def run(self, poll=1.0):
+        # Runs until stop is called.
+        try:
+            while not self.stopping:
+                self.run_once()
+                delay = self.next_beat - self.clock()
+                due = self.poller.next_due()
+                if due is not None:
+                    delay = min(delay, due - self.poller.clock())
+                delay = max(min(delay, poll), 0)
+                if self.poller.inflight:
+                    self.poller.finish(timeout=delay or 0.001)
+                else:
+                    self.sleep(delay)
+        finally:
+            self.poller.close()
+
+    def stop(self):
+        self.stopping = True
+
+    def leave(self):
+        # Hands everything back straight away, rather than waiting for the
+        # leases to expire.
+        self._drop(self.held)
+        self.store.leave(self.node)
@@ -0,0 +1,155 @@
+from collections import namedtuple
+import errno
+import selectors
+import socket
+import time
+
+DEFAULT_PORT = 4352
+
+# How long to wait for a TCP connection to be established.
+CONNECT_TIMEOUT = 5.0
+# How long to give one address before also trying the next (RFC 8305).
+ATTEMPT_DELAY = 0.25
+
+_IN_PROGRESS = (
+    errno.EINPROGRESS,
+    errno.EWOULDBLOCK,
+    errno.EALREADY,
+    getattr(errno, 'WSAEWOULDBLOCK', errno.EWOULDBLOCK),
+)
+
+Timing = namedtuple('Timing', 'resolve connect address')
+
+def _error(err, addr):
+    return OSError(err, '%s: %s' % (addr, errno.errorcode.get(err, err)))
+
+def interleave(infos):
+    # Alternate address families, starting with the resolver's preference.
+    by_family = {}
+    order = []
+    for info in infos:
+        family = info[0]
+        if family not in by_family:
+            by_family[family] = []
+            order.append(family)
+        by_family[family].append(info)
+
+    result = []
+    while any(by_family.values()):
+        for family in order:
+            if by_family[family]:
+                result.append(by_family[family].pop(0))
+    return result
+
+class Resolver(object):
+    # getaddrinfo() doesn't tell us record TTLs, so use fixed ones.
+
+    def __init__(self, ttl=300, negative_ttl=30, clock=time.monotonic):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.cache = {}
+
+    def resolve(self, host, port=DEFAULT_PORT):
+        key = (host, port)
+        now = self.clock()
+
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] > now:
+            if cached[1] is None:
+                # Raise a fresh error, so tracebacks don't pile up on one.
+                raise socket.gaierror(*cached[2])
+            return cached[1]
+
+        try:
+            infos = socket.getaddrinfo(
+                host, port, 0, socket.SOCK_STREAM, socket.IPPROTO_TCP,
+            )
+        except socket.gaierror as e:
+            self.cache[key] = (now + self.negative_ttl, None, e.args)
+            raise
+
+        result = interleave(infos)
+        self.cache[key] = (now + self.ttl, result, None)
+        return result
+
+    def clear(self):
+        self.cache.clear()
+
+default_resolver = Resolver()
+
+def connect(host, port=DEFAULT_PORT, timeout=CONNECT_TIMEOUT,
+            delay=ATTEMPT_DELAY, resolver=None):
+    """
+    Connects to the first of the host's addresses to answer, starting a new
+    attempt every ``delay`` seconds. Returns (socket, Timing).
+    """
+    if resolver is None:
+        resolver = default_resolver
+
+    start = time.perf_counter()
+    infos = list(resolver.resolve(host, port))
+    resolved = time.perf_counter()
+
+    deadline = resolved + timeout
+    next_attempt = resolved
+    last_error = None
+    winner = None
+
+    sel = selectors.DefaultSelector()
+    try:
+        while winner is None:
+            now = time.perf_counter()
+            if now >= deadline:
+                raise socket.timeout(
+                    'Timed out connecting to %s:%d' % (host, port))
+
+            # Start another attempt if it's due, or if nothing is in flight.
+            if infos and (now >= next_attempt or not sel.get_map()):
+                family, type_, proto, _, addr = infos.pop(0)
+                try:
+                    sock = socket.socket(family, type_, proto)
+                except OSError as e:
+                    # e.g. IPv6 is disabled on this host.
+                    last_error = e
+                    continue
+                sock.setblocking(False)
+                err = sock.connect_ex(addr)
+                if err == 0:
+                    winner = sock, addr
+                    break
+                elif err in _IN_PROGRESS:
+                    sel.register(sock, selectors.EVENT_WRITE, addr)
+                else:
+                    sock.close()
+                    last_error = _error(err, addr)
+                next_attempt = now + delay
+                continue
+
+            if not sel.get_map():
+                raise last_error or OSError('No addresses for %s' % host)
+
+            wait = deadline - now
+            if infos:
+                wait = min(wait, next_attempt - now)
+
+            for key, _ in sel.select(max(wait, 0)):
+                sock = key.fileobj
+                sel.unregister(sock)
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if err == 0:
+                    winner = sock, key.data
+                    break
+                sock.close()
+                last_error = _error(err, key.data)
+                # That one's dead, so don't wait before trying the next.
+                next_attempt = time.perf_counter()
+    finally:
+        for key in list(sel.get_map().values()):
+            key.fileobj.close()
+        sel.close()
+
+    sock, addr = winner
+    sock.setblocking(True)
+    connected = time.perf_counter()
+    return sock, Timing(resolved - start, connected - resolved, addr)
@@ -0,0 +1,298 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+import json
+import time
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from pjlink.projector import (
+    ERROR_KINDS, MUTE_AUDIO, MUTE_VIDEO, ProjectorError, SOURCE_TYPES,
+)
+from pjlink.statetable import StateTable
+
+# How long a status is served from the cache before asking again.
+STATUS_TTL = 2.0
+# Commands in flight at once to any one projector.
+PER_DEVICE = 2
+MAX_BODY = 64 * 1024
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super(HTTPError, self).__init__(message)
+        self.status = status
+
+def status_json(status):
+    return {
+        'power': status.power,
+        'input': status.input and {
+            'source': status.input[0], 'number': status.input[1],
+        },
+        'mute': status.mute and {
+            'video': status.mute[0], 'audio': status.mute[1],
+        },
+        'errors': status.errors and dict(status.errors),
+        'lamps': status.lamps and [
+            {'hours': hours, 'on': on} for hours, on in status.lamps
+        ],
+    }
+
+def _message(e):
+    message = e.args[0] if e.args else type(e).__name__
+    if isinstance(message, bytes):
+        message = message.decode('utf-8', 'replace')
+    return str(message)
+
+class Gateway(object):
+    """
+    Serves a SessionPool's projectors over HTTP, as JSON. Statuses are
+    cached for ``ttl`` seconds, and concurrent requests for the same status
+    share a single query.
+    """
+
+    def __init__(self, pool, max_workers=32, per_device=PER_DEVICE,
+                 ttl=STATUS_TTL, clock=time.monotonic):
+        self.pool = pool
+        self.inventory = pool.inventory
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.per_device = per_device
+        self.ttl = ttl
+        self.clock = clock
+        self.semaphores = {}
+        # name -> (expiry, Status)
+        self.cache = {}
+        # name -> Task fetching its status
+        self.fetching = {}
+        self.table = StateTable()
+
+    def _entry(self, name):
+        try:
+            return self.inventory[name]
+        except KeyError:
+            raise HTTPError(404, 'No such projector: %s' % name)
+        except ValueError as e:
+            raise HTTPError(404, str(e))
+
+    async def call(self, name, func):
+        # Runs func(session) on a worker thread, a few at a time per device.
+        semaphore = self.semaphores.get(name)
+        if semaphore is None:
+            semaphore = self.semaphores[name] = \
+                asyncio.Semaphore(self.per_device)
+        async with semaphore:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.pool.run, name, func)
+
+    async def _fetch(self, name):
+        status = await self.call(name, lambda p: p.get_status())
+        self.cache[name] = (self.clock() + self.ttl, status)
+        # Every field was asked for, so any missing now aren't known.
+        self.table.replace(name, status)
+        return status
+
+    async def status(self, name, fresh=False):
+        cached = self.cache.get(name)
+        if not fresh and cached is not None and cached[0] > self.clock():
+            return cached[1]
+        task = self.fetching.get(name)
+        if task is None:
+            task = self.fetching[name] = asyncio.ensure_future(
+                self._fetch(name))
+            task.add_done_callback(lambda _: self.fetching.pop(name, None))
+        # Someone else may be waiting on it too, so don't let our caller
+        # going away cancel it.
+        return await asyncio.shield(task)
+
+    async def _fleet(self, params):
+        selector = {}
+        criteria = {}
+        tags = []
+        for key, value in params:
+            if key == 'tag':
+                tags.append(value)
+            elif key in ('building', 'floor', 'room'):
+                selector[key] = value
+            elif key in ('power', 'input') or key in ERROR_KINDS:
+                criteria[key] = value.split(',')
+            elif key != 'fresh':
+                raise HTTPError(400, 'Unknown filter: %s' % key)
+        fresh = dict(params).get('fresh') == '1'
+        entries = self.inventory.select(tags, **selector)
+
+        results = await asyncio.gather(*[
+            self.status(entry.name, fresh) for entry in entries
+        ], return_exceptions=True)
+
+        statuses = {}
+        failed = {}
+        for entry, result in zip(entries, results):
+            if isinstance(result, Exception):
+                failed[entry.name] = _message(result)
+            else:
+                statuses[entry.name] = result
+        if criteria:
+            try:
+                matching = set(self.table.select(**criteria))
+            except KeyError as e:
+                raise HTTPError(400, 'Unknown value: %s' % e.args[0])
+            statuses = dict(
+                (name, status) for name, status in statuses.items()
+                if name in matching
+            )
+
+        return {
+            'projectors': dict(
+                (name, status_json(status))
+                for name, status in statuses.items()
+            ),
+            'failed': failed,
+        }
+
+    async def _set(self, name, what, body):
+        try:
+            if what == 'power':
+                state = body['state']
+                if state not in ('on', 'off'):
+                    raise ValueError(state)
+                func = lambda p: p.set_power(state)
+            elif what == 'input':
+                source, number = body['source'], int(body['number'])
+                if source not in SOURCE_TYPES or not 1 <= number <= 9:
+                    raise ValueError(source)
+                func = lambda p: p.set_input(source, number)
+            elif what == 'mute':
+                flags = ((MUTE_VIDEO, 'video'), (MUTE_AUDIO, 'audio'))
+                changes = [
+                    (flag, bool(body[key])) for flag, key in flags
+                    if key in body
+                ]
+                if not changes:
+                    raise ValueError(body)
+                if len(changes) == 2 and changes[0][1] == changes[1][1]:
+                    changes = [(MUTE_VIDEO | MUTE_AUDIO, changes[0][1])]
+                def func(p):
+                    for flag, state in changes:
+                        p.set_mute(flag, state)
+            else:
+                raise HTTPError(404, 'Not found')
+        except (KeyError, TypeError, ValueError):
+            raise HTTPError(400, 'Invalid %s request' % what)
+
+        try:
+            await self.call(name, func)
+        finally:
+            self.cache.pop(name, None)
+        return {'ok': True}
+
+    async def _info(self, name):
+        def info(p):
+            return {
+                'name': p.get_name(),
+                'manufacturer': p.get_manufacturer(),
+                'product_name': p.get_product_name(),
+                'other_info': p.get_other_info(),
+            }
+        return await self.call(name, info)
+
+    async def handle(self, method, target, body=b''):
+        """Returns (status, JSON-able response) for a request."""
+        url = urlsplit(target)
+        params = parse_qsl(url.query)
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+
+        try:
+            if parts[0] != 'projectors' or len(parts) > 3:
+                raise HTTPError(404, 'Not found')
+            if len(parts) == 1:
+                if method != 'GET':
+                    raise HTTPError(405, 'Method not allowed')
+                return 200, await self._fleet(params)
+
+            name = parts[1]
+            self._entry(name)
+            what = parts[2] if len(parts) == 3 else None
+            if method == 'GET':
+                if what == 'info':
+                    return 200, await self._info(name)
+                fresh = dict(params).get('fresh') == '1'
+                status = status_json(await self.status(name, fresh))
+                if what is None:
+                    return 200, status
+                if what not in status:
+                    raise HTTPError(404, 'Not found')
+                return 200, {what: status[what]}
+            elif method in ('PUT', 'POST') and what is not None:
+                try:
+                    data = json.loads(body.decode('utf-8') or '{}')
+                except ValueError:
+                    raise HTTPError(400, 'Invalid JSON')
+                if not isinstance(data, dict):
+                    raise HTTPError(400, 'Expected a JSON object')
+                return 200, await self._set(name, what, data)
+            raise HTTPError(405, 'Method not allowed')
+
+        except HTTPError as e:
+            return e.status, {'error': str(e)}
+        except ProjectorError as e:
+            return 502, {'error': _message(e)}
+        except (OSError, EOFError, ValueError) as e:
+            return 503, {'error': 'Projector unreachable: %s' % _message(e)}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode('latin-1').split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length') or 0)
+                if length > MAX_BODY:
+                    status, response = 413, {'error': 'Request too large'}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length)
+                    status, response = await self.handle(method, target, body)
+                    connection = headers.get('connection', '').lower()
+                    keep_alive = connection != 'close' if \
+                        version == 'HTTP/1.1' else connection == 'keep-alive'
+
+                data = json.dumps(response, sort_keys=True).encode('utf-8')
+                writer.write((
+                    'HTTP/1.1 %d %s\r\n'
+                    'Content-Type: application/json\r\n'
+                    'Content-Length: %d\r\n'
+                    'Connection: %s\r\n\r\n' % (
+                        status, HTTPStatus(status).phrase, len(data),
+                        'keep-alive' if keep_alive else 'close',
+                    )
+                ).encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host='localhost', port=8080):
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def serve_forever(self, host='localhost', port=8080):
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown()
+        self.pool.close()
@@ -0,0 +1,172 @@
+from collections import namedtuple
+import json
+import os
+import threading
+
+from six.moves.configparser import ConfigParser
+
+from pjlink.connection import DEFAULT_PORT
+
+Entry = namedtuple('Entry', 'name host port password tags building floor room')
+
+GROUPS = ('building', 'floor', 'room')
+
+def make_entry(name, host, port=DEFAULT_PORT, password=None, tags=(),
+               building=None, floor=None, room=None):
+    if isinstance(tags, str):
+        tags = tags.replace(',', ' ').split()
+    return Entry(
+        name, host, int(port), password or None, frozenset(tags),
+        building or None, floor or None, room or None,
+    )
+
+class Inventory(object):
+    """An immutable fleet of projectors, indexed by name, tag and group."""
+
+    def __init__(self, entries, invalid=None):
+        self.entries = tuple(entries)
+        # Entries that couldn't be loaded, by name, with the reason why.
+        self.invalid = dict(invalid or {})
+        self.by_name = {}
+        self.by_tag = {}
+        self.by_group = {}
+
+        for entry in self.entries:
+            if entry.name in self.by_name:
+                raise ValueError('Duplicate projector: %s' % entry.name)
+            self.by_name[entry.name] = entry
+            for tag in entry.tags:
+                self.by_tag.setdefault(tag, []).append(entry)
+            for group in GROUPS:
+                value = getattr(entry, group)
+                if value is not None:
+                    self.by_group.setdefault((group, value), []).append(entry)
+
+        self._order = dict(
+            (entry.name, i) for i, entry in enumerate(self.entries)
+        )
+        for index in (self.by_tag, self.by_group):
+            for key, entries in index.items():
+                index[key] = tuple(entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def __getitem__(self, name):
+        try:
+            return self.by_name[name]
+        except KeyError:
+            if name in self.invalid:
+                raise ValueError(self.invalid[name])
+            raise
+
+    def get(self, name, default=None):
+        return self.by_name.get(name, default)
+
+    def tags(self):
+        return sorted(self.by_tag)
+
+    def select(self, tags=(), building=None, floor=None, room=None):
+        candidates = []
+        for tag in tags:
+            candidates.append(self.by_tag.get(tag, ()))
+        for group, value in zip(GROUPS, (building, floor, room)):
+            if value is not None:
+                candidates.append(self.by_group.get((group, value), ()))
+
+        if not candidates:
+            return self.entries
+
+        # Start from the smallest index, and filter it by the others.
+        candidates.sort(key=len)
+        names = set(entry.name for entry in candidates[0])
+        for entries in candidates[1:]:
+            if not names:
+                break
+            names.intersection_update(entry.name for entry in entries)
+
+        return tuple(
+            self.by_name[name] for name in sorted(names, key=self._order.get)
+        )
+
+def parse_ini(f):
+    # One section per projector. A broken section doesn't stop the others
+    # from being used; looking it up raises its error instead.
+    config = ConfigParser(
+        {'port': str(DEFAULT_PORT), 'password': ''}, interpolation=None,
+    )
+    config.read_file(f)
+
+    entries = []
+    invalid = {}
+    for section in config.sections():
+        options = dict(config.items(section))
+        if 'host' not in options:
+            invalid[section] = 'Projector %s has no host' % section
+            continue
+        try:
+            entries.append(make_entry(
+                section, options['host'], options['port'],
+                options['password'], options.get('tags', ''),
+                options.get('building'), options.get('floor'),
+                options.get('room'),
+            ))
+        except ValueError:
+            invalid[section] = 'Projector %s has an invalid port: %s' % (
+                section, options['port'])
+    return Inventory(entries, invalid)
+
+def parse_json(f):
+    # Either a list of projectors, or an object with a "projectors" list.
+    # As for parse_ini, broken entries are kept aside, and keys we don't
+    # use (e.g. "notes") are ignored.
+    data = json.load(f)
+    if isinstance(data, dict):
+        data = data['projectors']
+
+    entries = []
+    invalid = {}
+    for item in data:
+        if not isinstance(item, dict) or 'name' not in item:
+            continue
+        name = item['name']
+        if 'host' not in item:
+            invalid[name] = 'Projector %s has no host' % name
+            continue
+        try:
+            entries.append(make_entry(**dict(
+                (key, value) for key, value in item.items()
+                if key in Entry._fields
+            )))
+        except (TypeError, ValueError):
+            invalid[name] = 'Projector %s has an invalid port: %s' % (
+                name, item.get('port'))
+    return Inventory(entries, invalid)
+
+def load(path):
+    with open(path, 'r') as f:
+        if path.endswith('.json'):
+            return parse_json(f)
+        return parse_ini(f)
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def load_inventory(path):
+    # Parsed inventories are shared until the file changes on disk.
+    mtime = os.stat(path).st_mtime
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+    inventory = load(path)
+    with _cache_lock:
+        _cache[path] = (mtime, inventory)
+    return inventory
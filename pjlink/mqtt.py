@@ -0,0 +1,196 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import threading
+
+try:
+    import paho.mqtt.client as paho
+except ImportError:
+    paho = None
+
+from pjlink.projector import (
+    MUTE_AUDIO, MUTE_VIDEO, SOURCE_TYPES, ProjectorError,
+)
+
+PREFIX = 'pjlink'
+
+def topic_matches(pattern, topic):
+    # MQTT wildcards: + is one level, # is everything from there on.
+    pattern = pattern.split('/')
+    topic = topic.split('/')
+    for i, part in enumerate(pattern):
+        if part == '#':
+            return True
+        if i >= len(topic) or (part != '+' and part != topic[i]):
+            return False
+    return len(pattern) == len(topic)
+
+def state_payloads(status):
+    # The retained payload for each known field of a Status.
+    payloads = {}
+    if status.power is not None:
+        payloads['power'] = status.power
+    if status.input is not None:
+        payloads['input'] = '%s %d' % status.input
+    if status.mute is not None:
+        payloads['mute'] = json.dumps(
+            {'video': status.mute[0], 'audio': status.mute[1]},
+            sort_keys=True)
+    if status.errors is not None:
+        payloads['errors'] = json.dumps(dict(status.errors), sort_keys=True)
+    if status.lamps is not None:
+        payloads['lamps'] = json.dumps([
+            {'hours': hours, 'on': on} for hours, on in status.lamps
+        ])
+    return payloads
+
+def parse_command(field, payload):
+    """
+    Returns the (method name, args) actions for a command message, like
+    reconcile.plan does, or raises ValueError.
+    """
+    payload = payload.strip()
+    if field == 'power':
+        if payload not in ('on', 'off'):
+            raise ValueError('Invalid power: %s' % payload)
+        return [('set_power', (payload,))]
+    elif field == 'input':
+        source, _, number = payload.upper().partition(' ')
+        if source not in SOURCE_TYPES or not (number or '1').isdigit():
+            raise ValueError('Invalid input: %s' % payload)
+        return [('set_input', (source, int(number or 1)))]
+    elif field == 'mute':
+        # "on"/"off" for both, or e.g. {"video": true}.
+        if payload in ('on', 'off'):
+            return [('set_mute', (MUTE_VIDEO | MUTE_AUDIO, payload == 'on'))]
+        try:
+            changes = json.loads(payload)
+        except ValueError:
+            changes = None
+        if not isinstance(changes, dict) or not changes or \
+                not set(changes) <= {'video', 'audio'}:
+            raise ValueError('Invalid mute: %s' % payload)
+        if len(changes) == 2 and changes['video'] == changes['audio']:
+            return [
+                ('set_mute', (MUTE_VIDEO | MUTE_AUDIO, bool(changes['video'])))
+            ]
+        flags = {'video': MUTE_VIDEO, 'audio': MUTE_AUDIO}
+        return [
+            ('set_mute', (flags[what], bool(state)))
+            for what, state in sorted(changes.items(), reverse=True)
+        ]
+    raise ValueError('Unknown command: %s' % field)
+
+class PahoClient(object):
+    """Adapts a connected paho.mqtt.client.Client for a Bridge."""
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def connect(cls, host, port=1883, **kwargs):
+        if paho is None:
+            raise ImportError('The MQTT bridge needs paho-mqtt installed')
+        if hasattr(paho, 'CallbackAPIVersion'):
+            # paho-mqtt 2 needs telling which callback signatures we use;
+            # on_message's is the same in both.
+            kwargs.setdefault(
+                'callback_api_version', paho.CallbackAPIVersion.VERSION2)
+        client = paho.Client(**kwargs)
+        client.connect(host, port)
+        client.loop_start()
+        return cls(client)
+
+    def publish(self, topic, payload, retain=False):
+        self.client.publish(topic, payload, qos=1, retain=retain)
+
+    def subscribe(self, pattern, handler):
+        def on_message(client, userdata, message):
+            handler(message.topic, message.payload.decode('utf-8'))
+        self.client.message_callback_add(pattern, on_message)
+        self.client.subscribe(pattern, qos=1)
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+class Bridge(object):
+    """
+    Publishes projector state to MQTT, and carries out commands from it.
+
+    State goes to retained ``<prefix>/<name>/<field>`` topics, only when it
+    changes; ``on_status`` and ``on_error`` are meant for a Poller. Commands
+    sent to ``<prefix>/<name>/set/<power|input|mute>`` are run through the
+    SessionPool, and the projector's new state is published afterwards.
+    ``client`` needs ``publish(topic, payload, retain)`` and
+    ``subscribe(pattern, handler(topic, payload))``, like PahoClient.
+    """
+
+    def __init__(self, pool, client, prefix=PREFIX, max_workers=8):
+        self.pool = pool
+        self.client = client
+        self.prefix = prefix
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # topic -> payload of what we've published so far.
+        self.published = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.client.subscribe(self.prefix + '/+/set/+', self.handle_message)
+
+    def _publish(self, topic, payload):
+        # Publish under the lock too, or a racing thread's older payload
+        # could be retained last.
+        with self.lock:
+            if self.published.get(topic) == payload:
+                return
+            self.published[topic] = payload
+            self.client.publish(topic, payload, retain=True)
+
+    def on_status(self, name, status, changed=True):
+        base = '%s/%s/' % (self.prefix, name)
+        self._publish(base + 'online', 'true')
+        for field, payload in sorted(state_payloads(status).items()):
+            self._publish(base + field, payload)
+
+    def on_error(self, name, error):
+        self._publish('%s/%s/online' % (self.prefix, name), 'false')
+
+    def handle_message(self, topic, payload):
+        # Called on the client's network thread, so don't block it.
+        parts = topic[len(self.prefix) + 1:].split('/')
+        if len(parts) != 3 or parts[1] != 'set':
+            return
+        self.executor.submit(self.command, parts[0], parts[2], payload)
+
+    def command(self, name, field, payload):
+        error_topic = '%s/%s/error' % (self.prefix, name)
+        if name not in self.pool.inventory:
+            self.client.publish(error_topic, 'No such projector: %s' % name)
+            return
+        try:
+            actions = parse_command(field, payload)
+        except ValueError as e:
+            self.client.publish(error_topic, str(e))
+            return
+
+        def run(session):
+            for method, args in actions:
+                getattr(session, method)(*args)
+            return session.get_status()
+
+        try:
+            status = self.pool.run(name, run)
+        except ProjectorError as e:
+            message = e.args[0]
+            if isinstance(message, bytes):
+                message = message.decode('utf-8', 'replace')
+            self.client.publish(error_topic, message)
+            return
+        except (OSError, EOFError, ValueError) as e:
+            self.client.publish(error_topic, 'Unreachable: %s' % e)
+            self.on_error(name, e)
+            return
+        self.on_status(name, status)
+
+    def close(self):
+        self.executor.shutdown()
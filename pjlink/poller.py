@@ -0,0 +1,271 @@
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import itertools
+import queue
+import threading
+import time
+
+from pjlink.projector import Status
+from pjlink.reconcile import TRANSITIONAL_STATES
+from pjlink.session import BACKGROUND, priority
+
+# Seconds between polls: the fastest (while warming up or cooling down),
+# where a projector starts and returns to after a change, and the slowest.
+MIN_INTERVAL = 2.0
+BASE_INTERVAL = 10.0
+MAX_INTERVAL = 300.0
+# How much longer to wait each time nothing has changed.
+BACKOFF = 2.0
+
+class TokenBucket(object):
+    """Allows ``rate`` per second on average, in bursts of up to ``burst``."""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+
+    def _refill(self, now):
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, n=1, now=None):
+        self._refill(self.clock() if now is None else now)
+        if self.tokens < n:
+            return False
+        self.tokens -= n
+        return True
+
+    def wait_time(self, n=1, now=None):
+        # How long until n tokens will be available.
+        self._refill(self.clock() if now is None else now)
+        return max(n - self.tokens, 0) / self.rate
+
+def _has_errors(status):
+    return status.errors is not None and \
+        any(state != 'ok' for _, state in status.errors)
+
+class _Device(object):
+    def __init__(self, name, interval):
+        self.name = name
+        self.interval = interval
+        self.status = None
+        self.failures = 0
+        # Of its entry in the queue; any others are stale.
+        self.seq = None
+        # Whether status came from a snapshot, and hasn't been polled since.
+        self.stale = False
+
+class Poller(object):
+    """
+    Polls projectors for their Status, more often while they're changing
+    and less often the longer they stay the same.
+
+    ``open_projector(name)`` returns an authenticated Projector (e.g. a
+    SessionPool's get). ``budget`` caps the commands sent per second across
+    the whole fleet; polls that don't fit wait, most overdue first.
+    ``on_status(name, status, changed)`` is called after every poll, and
+    ``on_error(name, exception)`` when one fails, both on the polling
+    thread. Each projector is rescheduled as soon as it answers, so a slow
+    one doesn't hold up the rest.
+    """
+
+    def __init__(self, names, open_projector, fields=Status._fields,
+                 budget=None, min_interval=MIN_INTERVAL,
+                 base_interval=BASE_INTERVAL, max_interval=MAX_INTERVAL,
+                 backoff=BACKOFF, max_workers=16, clock=time.monotonic,
+                 sleep=time.sleep):
+        self.open_projector = open_projector
+        self.fields = tuple(fields)
+        self.min_interval = min_interval
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_workers = max_workers
+        self.clock = clock
+        self.sleep = sleep
+        self.bucket = None
+        if budget is not None:
+            # Always allow at least one poll through at a time.
+            self.bucket = TokenBucket(
+                budget, max(budget, len(self.fields)), clock)
+        self.on_status = None
+        self.on_error = None
+
+        self.polls = 0
+        self.commands = 0
+        self.devices = {}
+        self.queue = []
+        self.seq = itertools.count()
+        self.executor = None
+        self.stopping = threading.Event()
+        # Names being polled, and (name, status, error) for those done.
+        self.inflight = set()
+        self.completed = queue.Queue()
+
+        now = clock()
+        for name in names:
+            self.add(name, now)
+
+    def _push(self, device, due):
+        device.seq = next(self.seq)
+        heapq.heappush(self.queue, (due, device.seq, device.name))
+
+    def add(self, name, due=None):
+        if name not in self.devices:
+            device = self.devices[name] = _Device(name, self.base_interval)
+            self._push(device, self.clock() if due is None else due)
+
+    def restore(self, name, status, interval, due):
+        # Seeds a projector with what was known before a restart.
+        device = self.devices.get(name)
+        if device is None:
+            device = self.devices[name] = _Device(name, interval)
+        device.status = status
+        device.interval = min(max(interval, self.min_interval),
+                              self.max_interval)
+        device.stale = True
+        self._push(device, due)
+
+    def remove(self, name):
+        # Its queue entry is dropped when it comes up.
+        self.devices.pop(name, None)
+
+    def next_due(self):
+        return self.queue[0][0] if self.queue else None
+
+    def next_interval(self, device, status, error):
+        if error is not None:
+            # Hammering a projector that isn't answering won't help.
+            return min(
+                max(device.interval, self.base_interval) * self.backoff,
+                self.max_interval,
+            )
+        if status.power in TRANSITIONAL_STATES:
+            return self.min_interval
+        if status != device.status or _has_errors(status):
+            return self.base_interval
+        return min(device.interval * self.backoff, self.max_interval)
+
+    def _poll(self, name):
+        try:
+            with priority(BACKGROUND):
+                return self.open_projector(name).get_status(self.fields), None
+        except Exception as e:
+            return None, e
+
+    def start_due(self, now=None):
+        """
+        Starts polling whatever is due (and fits the budget), without
+        waiting for the answers; returns the names.
+        """
+        now = self.clock() if now is None else now
+        cost = len(self.fields)
+
+        names = []
+        while self.queue and self.queue[0][0] <= now:
+            _, seq, name = self.queue[0]
+            device = self.devices.get(name)
+            if device is None or device.seq != seq:
+                heapq.heappop(self.queue)
+                continue
+            if self.bucket is not None and not self.bucket.take(cost, now):
+                break
+            heapq.heappop(self.queue)
+            names.append(name)
+        if not names:
+            return names
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        for name in names:
+            self.inflight.add(name)
+            future = self.executor.submit(self._poll, name)
+            # Results are handled by finish, on the polling thread, so a
+            # slow projector only holds up itself.
+            future.add_done_callback(
+                lambda f, name=name: self.completed.put((name,) + f.result()))
+        return names
+
+    def _finish(self, name, status, error, now):
+        self.inflight.discard(name)
+        self.polls += 1
+        self.commands += len(self.fields)
+        device = self.devices.get(name)
+        if device is None:
+            # Removed while it was being polled.
+            return
+        device.interval = self.next_interval(device, status, error)
+        self._push(device, now + device.interval)
+
+        if error is not None:
+            device.failures += 1
+            if self.on_error is not None:
+                self.on_error(name, error)
+            return
+        changed = status != device.status
+        device.status = status
+        device.stale = False
+        device.failures = 0
+        if self.on_status is not None:
+            self.on_status(name, status, changed)
+
+    def finish(self, now=None, timeout=0):
+        """
+        Handles the polls that have completed, waiting up to ``timeout``
+        seconds (None for as long as it takes) for one if there are none
+        yet; returns their names.
+        """
+        names = []
+        try:
+            if timeout == 0:
+                item = self.completed.get_nowait()
+            else:
+                item = self.completed.get(timeout=timeout)
+            while True:
+                names.append(item[0])
+                self._finish(
+                    *item, now=self.clock() if now is None else now)
+                item = self.completed.get_nowait()
+        except queue.Empty:
+            pass
+        return names
+
+    def poll_once(self, now=None):
+        """Polls whatever is due and waits for the answers; returns names."""
+        now = self.clock() if now is None else now
+        names = self.start_due(now)
+        while self.inflight.intersection(names):
+            self.finish(now, timeout=None)
+        return names
+
+    def run(self, poll=1.0):
+        # Runs until stop is called.
+        try:
+            while not self.stopping.is_set():
+                self.start_due()
+                now = self.clock()
+                due = self.next_due()
+                delay = poll if due is None else due - now
+                if self.bucket is not None:
+                    delay = max(delay, self.bucket.wait_time(
+                        len(self.fields), now))
+                delay = max(min(delay, poll), 0)
+                if self.inflight:
+                    # Handle answers as they come in, rather than sleeping.
+                    self.finish(timeout=delay or 0.001)
+                else:
+                    self.sleep(delay)
+        finally:
+            self.close()
+
+    def stop(self):
+        self.stopping.set()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
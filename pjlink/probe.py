@@ -0,0 +1,132 @@
+from collections import OrderedDict, deque, namedtuple
+import errno
+import selectors
+import socket
+import time
+
+from pjlink import connection
+
+PROBE_TIMEOUT = 2.0
+CONCURRENCY = 256
+# Greetings are "PJLINK 0\r" or "PJLINK 1 <8 byte salt>\r".
+MAX_GREETING = 32
+
+# auth is whether the projector wants a password; latency is the time from
+# starting to connect until the whole greeting had arrived.
+ProbeResult = namedtuple('ProbeResult', 'host port alive auth latency error')
+
+def parse_greeting(data):
+    # Returns whether a password is needed, or raises ValueError.
+    if data[:9].upper() == b'PJLINK 0\r':
+        return False
+    if data[:9].upper() == b'PJLINK 1 ' and len(data) == 18:
+        return True
+    raise ValueError('Unexpected greeting: %r' % bytes(data))
+
+class _Probe(object):
+    def __init__(self, index, host, port, start, deadline):
+        self.index = index
+        self.host = host
+        self.port = port
+        self.start = start
+        self.deadline = deadline
+        self.buffer = b''
+        self.sock = None
+
+def sweep(targets, timeout=PROBE_TIMEOUT, concurrency=CONCURRENCY,
+          resolver=None):
+    """
+    Connects to each (host, port), reads its greeting and hangs up, with up
+    to ``concurrency`` probes in flight. Returns a ProbeResult per target,
+    in order.
+    """
+    if resolver is None:
+        resolver = connection.default_resolver
+
+    targets = list(targets)
+    results = [None] * len(targets)
+    waiting = deque(enumerate(targets))
+    # Probes all get the same timeout, so the oldest expires first.
+    active = OrderedDict()
+    sel = selectors.DefaultSelector()
+
+    def finish(probe, auth=None, error=None):
+        latency = time.perf_counter() - probe.start
+        results[probe.index] = ProbeResult(
+            probe.host, probe.port, error is None, auth, latency, error,
+        )
+        if probe.sock is not None:
+            if probe in active:
+                sel.unregister(probe.sock)
+                del active[probe]
+            probe.sock.close()
+
+    def start(index, host, port):
+        now = time.perf_counter()
+        probe = _Probe(index, host, port, now, now + timeout)
+        try:
+            # A probe only needs one way in, so don't race the others.
+            family, type_, proto, _, addr = resolver.resolve(host, port)[0]
+            probe.sock = socket.socket(family, type_, proto)
+            probe.sock.setblocking(False)
+            err = probe.sock.connect_ex(addr)
+        except (OSError, IndexError) as e:
+            return finish(probe, error=str(e) or 'No addresses')
+        if err == 0:
+            sel.register(probe.sock, selectors.EVENT_READ, probe)
+        elif err in connection._IN_PROGRESS:
+            sel.register(probe.sock, selectors.EVENT_WRITE, probe)
+        else:
+            return finish(probe, error=errno.errorcode.get(err, str(err)))
+        active[probe] = None
+
+    def ready(probe, events):
+        if events & selectors.EVENT_WRITE:
+            err = probe.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if err:
+                return finish(probe, error=errno.errorcode.get(err, str(err)))
+            sel.modify(probe.sock, selectors.EVENT_READ, probe)
+            return
+        try:
+            data = probe.sock.recv(MAX_GREETING - len(probe.buffer))
+        except OSError as e:
+            return finish(probe, error=str(e))
+        if not data:
+            return finish(probe, error='Connection closed')
+        probe.buffer += data
+        if b'\r' in probe.buffer or len(probe.buffer) >= MAX_GREETING:
+            try:
+                auth = parse_greeting(probe.buffer.split(b'\r')[0] + b'\r')
+            except ValueError as e:
+                return finish(probe, error=str(e))
+            finish(probe, auth=auth)
+
+    try:
+        while waiting or active:
+            while waiting and len(active) < concurrency:
+                index, (host, port) = waiting.popleft()
+                start(index, host, port)
+            if not active:
+                continue
+
+            oldest = next(iter(active))
+            wait = oldest.deadline - time.perf_counter()
+            for key, events in sel.select(max(wait, 0)):
+                ready(key.data, events)
+
+            now = time.perf_counter()
+            while active:
+                oldest = next(iter(active))
+                if oldest.deadline > now:
+                    break
+                finish(oldest, error='Timed out')
+    finally:
+        for probe in list(active):
+            probe.sock.close()
+        sel.close()
+
+    return results
+
+def probe(host, port=connection.DEFAULT_PORT, timeout=PROBE_TIMEOUT,
+          resolver=None):
+    return sweep([(host, port)], timeout, resolver=resolver)[0]
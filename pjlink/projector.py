@@ -1,4 +1,6 @@
-import hashlib
+from collections import namedtuple
+import itertools
+import time
 
 from pjlink import protocol
 
@@ -40,74 +42,255 @@ ERROR_STATES = {
 }
 ERROR_STATES_REV = reverse_dict(ERROR_STATES)
 
+ERROR_KINDS = ('fan', 'lamp', 'temperature', 'cover', 'filter', 'other')
+
+# Decoding tables keyed directly on the raw response bytes. The values are
+# immutable and shared, so the decode_* functions allocate nothing for these
+# replies. (The get_* methods still return fresh dicts and lists, as they
+# always have; use the decode_* functions or get_status to avoid that.)
+
+POWER_STATES_BIN = dict(
+    (code.encode('ascii'), state) for state, code in POWER_STATES.items()
+)
+
+INPUTS_BIN = dict(
+    ((code + str(number)).encode('ascii'), (source, number))
+    for source, code in SOURCE_TYPES.items()
+    for number in range(1, 10)
+)
+
+MUTE_STATES_BIN = dict(
+    (code.encode('ascii'), state) for code, state in MUTE_STATES_REV.items()
+)
+
+# There are only 3 ** 6 possible ERST replies, so just build them all.
+ERRORS_BIN = dict(
+    (
+        ''.join(ERROR_STATES[state] for state in states).encode('ascii'),
+        tuple(zip(ERROR_KINDS, states)),
+    )
+    for states in itertools.product(sorted(ERROR_STATES), repeat=6)
+)
+
+def decode_power(param):
+    return POWER_STATES_BIN[param]
+
+def decode_input(param):
+    try:
+        return INPUTS_BIN[param]
+    except KeyError:
+        source, number = param.decode('ascii')
+        return (SOURCE_TYPES_REV[source], int(number))
+
+def decode_mute(param):
+    return MUTE_STATES_BIN[param]
+
+def decode_errors(param):
+    """Returns the ERST reply as a tuple of (kind, state) pairs."""
+    try:
+        return ERRORS_BIN[param]
+    except KeyError:
+        assert len(param) == len(ERROR_KINDS)
+        raise
+
+def decode_lamps(param):
+    """Returns the LAMP reply as a tuple of (hours, on) pairs."""
+    assert len(param) <= 65
+
+    values = param.split(b' ')
+    assert len(values) <= 16 and len(values) % 2 == 0
+
+    lamps = tuple(
+        (int(time), bool(int(state)))
+        for time, state in zip(values[::2], values[1::2])
+    )
+
+    assert len(lamps) <= 8
+    return lamps
+
+def decode_inputs(param):
+    """Returns the INST reply as a tuple of (source, number) pairs."""
+    assert len(param) <= 95
+
+    values = param.split(b' ')
+    assert len(values) <= 50
+
+    inputs = []
+    for value in values:
+        try:
+            inputs.append(INPUTS_BIN[value])
+        except KeyError:
+            source, number = value.decode('ascii')
+            source = SOURCE_TYPES_REV[source]
+            assert number in '123456789'
+            inputs.append((source, int(number)))
+
+    return tuple(inputs)
+
+# A snapshot of the things worth polling a projector for. Fields hold the
+# decoded (immutable) replies: errors and lamps are tuples of pairs. Fields
+# that weren't asked for, or that the projector couldn't answer right now
+# (e.g. the input while it's off), are None.
+Status = namedtuple('Status', 'power input mute errors lamps')
+
+STATUS_QUERIES = {
+    'power': ('POWR', decode_power),
+    'input': ('INPT', decode_input),
+    'mute': ('AVMT', decode_mute),
+    'errors': ('ERST', decode_errors),
+    'lamps': ('LAMP', decode_lamps),
+}
+
+UNDEFINED_COMMAND = protocol.ERRORS[b'ERR1']
+
+def make_query(query):
+    # Queries are either a command body, or a (body, param) pair.
+    if isinstance(query, str):
+        return (query.encode('utf-8'), b'?')
+    body, param = query
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if isinstance(param, str):
+        param = param.encode('utf-8')
+    return (body, param)
+
+def decode_resolution(param):
+    # '-' means there's no signal, and '*' that it's unknown.
+    if param in (b'-', b'*'):
+        return None
+    width, height = param.split(b'x')
+    return (int(width), int(height))
+
 class Projector(object):
-    def __init__(self, f):
+    def __init__(self, f, pjlink_class=None, stats=None, audit=None,
+                 device=None):
         self.f = f
+        # A stats.LatencyStats to record command round-trips in, if any.
+        self.stats = stats
+        # An audit.AuditLog to record every set in, under the device name.
+        self.audit = audit
+        self.device = device
+        # Power state reported while authenticating, if we had to.
+        self.initial_power = None
+        # The PJLink class, once known. This can be passed in if it was
+        # detected earlier, to save asking again.
+        self.pjlink_class = pjlink_class
+        # Command bodies the projector has said it doesn't implement.
+        self.unsupported = set()
 
     def authenticate(self, get_password):
-        # I'm just implementing the authentication scheme designed in the
-        # protocol. Don't take this as any kind of assurance that it's secure.
-
-        data = self.f.read(9)
-        assert data[:7] == b'PJLINK ' or data[:7] == b'pjlink '
-        security = data[7:8]
-        if security == b'0':
-            return None
-        data += self.f.read(9)
-        assert security == b'1'
-        assert data[8:9] == b' '
-        salt = data[9:17]
-        assert data[17:] == b'\r'
-
-        # we *must* send a command to complete the procedure,
-        # so we just get the power state.
-
-        password = get_password().encode('utf-8')
-        pass_data = hashlib.md5(salt + password).hexdigest()
-        cmd_data = protocol.to_binary(b'POWR', b'?')
-        self.f.write(pass_data.encode('ascii') + cmd_data)
-        self.f.flush()
-
-        # read the response, see if it's a failed auth
-        data = self.f.read(7)
-        if data == b'PJLINK ':
-            # should be a failed auth if we get that
-            data += self.f.read(5)
-            assert data == b'PJLINK ERRA\r'
-            # it definitely is
-            return False
-
-        # good auth, so we should get a reply to the command we sent
-        body, param = protocol.parse_response(self.f, data)
-
-        # make sure we got a sensible response back
-        assert body == b'POWR'
-        if param in protocol.ERRORS:
-            raise ProjectorError(protocol.ERRORS[param])
-
-        # but we don't care about the value if we did
-        return True
-
-    def get(self, body):
-        body = body.encode('utf-8')
-        success, response = protocol.send_command(self.f, body, b'?')
+        handshake = protocol.Handshake(get_password)
+        while not handshake.done:
+            data = self.f.read(handshake.wanted)
+            if not data:
+                raise ProjectorError('Connection closed during handshake')
+            out = handshake.feed(data)
+            if out:
+                self.f.write(out)
+                self.f.flush()
+
+        # Authenticating sends a POWR query, so keep its answer around to
+        # save callers from asking again.
+        if handshake.reply is not None:
+            body, param = handshake.reply
+            if param in protocol.ERRORS:
+                raise ProjectorError(protocol.ERRORS[param])
+            # This is only a convenience, so don't fail over odd replies.
+            self.initial_power = POWER_STATES_BIN.get(param)
+
+        return handshake.result
+
+    def _detect_class(self, bodies):
+        if self.pjlink_class is None and \
+                not protocol.CLASS2_COMMANDS.isdisjoint(bodies):
+            self.get_class()
+
+    def _unsupported(self, body):
+        if body in self.unsupported:
+            return True
+        return body in protocol.CLASS2_COMMANDS and \
+            self.pjlink_class is not None and self.pjlink_class < 2
+
+    def get(self, body, param='?'):
+        success, response = self.get_many([(body, param)])[0]
         if not success:
             raise ProjectorError(response)
         return response
 
+    def get_many(self, queries):
+        queries = [make_query(query) for query in queries]
+        self._detect_class(body for body, _ in queries)
+
+        # Don't waste a round-trip on what we know will fail.
+        results = [(False, UNDEFINED_COMMAND)] * len(queries)
+        todo = [
+            i for i, (body, _) in enumerate(queries)
+            if not self._unsupported(body)
+        ]
+        if todo:
+            start = time.perf_counter() if self.stats is not None else 0
+            replies = protocol.send_commands(
+                self.f, [queries[i] for i in todo])
+            if self.stats is not None:
+                # Pipelined commands share a round-trip, so each is charged
+                # the whole batch.
+                elapsed = time.perf_counter() - start
+                for i in todo:
+                    self.stats.record(queries[i][0].decode('ascii'), elapsed)
+            for i, reply in zip(todo, replies):
+                if reply == (False, UNDEFINED_COMMAND):
+                    self.unsupported.add(queries[i][0])
+                results[i] = reply
+        return results
+
+    def get_status(self, fields=Status._fields):
+        """Returns a Status, with all of ``fields`` queried at once."""
+        queries = [STATUS_QUERIES[field] for field in fields]
+        replies = self.get_many([body for body, _ in queries])
+
+        values = dict.fromkeys(Status._fields)
+        for field, (body, decode), (success, response) in zip(
+            fields, queries, replies
+        ):
+            if success:
+                values[field] = decode(response)
+        return Status(**values)
+
     def set(self, body, param):
         body = body.encode('utf-8')
         param = param.encode('utf-8')
+        self._detect_class([body])
+        if self._unsupported(body):
+            raise ProjectorError(UNDEFINED_COMMAND)
+        start = time.perf_counter() if self.stats is not None else 0
         success, response = protocol.send_command(self.f, body, param)
+        if self.stats is not None:
+            self.stats.record(body.decode('ascii'), time.perf_counter() - start)
+        if self.audit is not None:
+            self.audit.record(
+                self.device, body.decode('ascii'), param.decode('utf-8'),
+                'OK' if success else response.decode('ascii'),
+            )
         if not success:
+            if response == UNDEFINED_COMMAND:
+                self.unsupported.add(body)
             raise ProjectorError(response)
         assert response == b'OK'
 
+    def get_class(self):
+        if self.pjlink_class is None:
+            self.pjlink_class = int(self.get('CLSS'))
+        return self.pjlink_class
+
+    def supports(self, body):
+        body = body.encode('utf-8')
+        self._detect_class([body])
+        return not self._unsupported(body)
+
     # Power
 
     def get_power(self):
-        param = self.get('POWR').decode('ascii')
-        return POWER_STATES_REV[param]
+        return decode_power(self.get('POWR'))
 
     def set_power(self, status, force=False):
         if not force and status not in ('off', 'on'):
@@ -117,11 +300,7 @@ class Projector(object):
     # Input
 
     def get_input(self):
-        param = self.get('INPT').decode('ascii')
-        source, number = param
-        source = SOURCE_TYPES_REV[source]
-        number = int(number)
-        return (source, number)
+        return decode_input(self.get('INPT'))
 
     def set_input(self, source, number):
         if source not in SOURCE_TYPES:
@@ -135,8 +314,7 @@ class Projector(object):
     # A/V mute
 
     def get_mute(self):
-        param = self.get('AVMT').decode('ascii')
-        return MUTE_STATES_REV[param]
+        return decode_mute(self.get('AVMT'))
 
     def set_mute(self, what, state):
         assert what in (MUTE_VIDEO, MUTE_AUDIO, MUTE_VIDEO | MUTE_AUDIO)
@@ -148,50 +326,17 @@ class Projector(object):
     # Errors
 
     def get_errors(self):
-        param = self.get('ERST').decode('ascii')
-        errors = 'fan lamp temperature cover filter other'.split()
-        assert len(param) == len(errors)
-        return {
-            key: ERROR_STATES_REV[value]
-            for key, value in zip(errors, param)
-        }
+        return dict(decode_errors(self.get('ERST')))
 
     # Lamps
 
     def get_lamps(self):
-        param = self.get('LAMP')
-        assert len(param) <= 65
-
-        values = param.decode('ascii').split(' ')
-        assert len(values) <= 16 and len(values) % 2 == 0
-
-        lamps = []
-        for time, state in zip(values[::2], values[1::2]):
-            time = int(time)
-            state = bool(int(state))
-            lamps.append((time, state))
-
-        assert len(lamps) <= 8
-        return lamps
+        return list(decode_lamps(self.get('LAMP')))
 
     # Input list
 
     def get_inputs(self):
-        param = self.get('INST')
-        assert len(param) <= 95
-
-        values = param.decode('ascii').split(' ')
-        assert len(values) <= 50
-
-        inputs = []
-        for value in values:
-            source, number = value
-            source = SOURCE_TYPES_REV[source]
-            assert number in '123456789'
-            number = int(number)
-            inputs.append((source, number))
-
-        return inputs
+        return list(decode_inputs(self.get('INST')))
 
     # Projector info
 
@@ -215,5 +360,46 @@ class Projector(object):
         assert len(param) <= 32
         return param.decode('ascii')
 
-    # TODO: def get_class(self): self.get('CLSS')
-    # once we know that class 2 is, and how to deal with it
+    # Class 2 information
+
+    def get_input_name(self, source, number):
+        param = self.get('INNM', '?' + SOURCE_TYPES[source] + str(number))
+        assert len(param) <= 64
+        return param.decode('utf-8')
+
+    def get_lamp_model(self):
+        param = self.get('RLMP')
+        assert len(param) <= 128
+        return param.decode('ascii')
+
+    def get_filter_hours(self):
+        return int(self.get('FILT'))
+
+    def get_filter_model(self):
+        param = self.get('RFIL')
+        assert len(param) <= 128
+        return param.decode('ascii')
+
+    def get_serial_number(self):
+        param = self.get('SNUM')
+        assert len(param) <= 32
+        return param.decode('ascii')
+
+    def get_software_version(self):
+        param = self.get('SVER')
+        assert len(param) <= 32
+        return param.decode('ascii')
+
+    def get_input_resolution(self):
+        return decode_resolution(self.get('IRES'))
+
+    def get_recommended_resolution(self):
+        return decode_resolution(self.get('RRES'))
+
+    # Freeze
+
+    def get_freeze(self):
+        return self.get('FREZ') == b'1'
+
+    def set_freeze(self, state):
+        self.set('FREZ', '1' if state else '0')
@@ -1,3 +1,5 @@
+import hashlib
+
 def read_until(f, term):
     assert len(term) == 1
     data = []
@@ -7,25 +9,29 @@ def read_until(f, term):
         c = f.read(1)
     return b''.join(data)
 
+# Commands only defined by PJLink class 2, which are sent with a %2 header.
+CLASS2_COMMANDS = frozenset([
+    b'INNM', b'RLMP', b'FILT', b'RFIL', b'SNUM', b'SVER', b'IRES', b'RRES',
+    b'FREZ',
+])
+
 def to_binary(body, param, sep=b' '):
     assert body.isupper()
 
     assert len(body) == 4
     assert len(param) <= 128
 
-    return b'%1' + body + sep + param + b'\r'
-
-def parse_response(f, data=b''):
-    if len(data) < 7:
-        data += f.read(2 + 4 + 1 - len(data))
+    version = b'2' if body in CLASS2_COMMANDS else b'1'
+    return b'%' + version + body + sep + param + b'\r'
 
+def parse_header(data, sep=b'='):
+    # Responses have a = after the body; commands (sep=b' ') a space.
     header = data[0:1]
     if header != b'%':
         raise ValueError('Invalid header in %r' % (data,))
 
     version = data[1:2]
-    # only class 1 is currently defined
-    if version != b'1':
+    if version not in (b'1', b'2'):
         raise ValueError('Invalid version in %r' % (data,))
 
     body = data[2:6]
@@ -34,14 +40,73 @@ def parse_response(f, data=b''):
     # FIXME: AFAIR this takes the current locale into consideration, it shouldn't.
     body = body.upper()
 
-    sep = data[6:]
-    if sep != b'=':
+    if data[6:7] != sep or len(data) != 7:
         raise ValueError('Invalid separator in %r' % (data,))
 
+    return body
+
+def parse_response(f, data=b''):
+    if len(data) < 7:
+        data += f.read(2 + 4 + 1 - len(data))
+
+    body = parse_header(data)
     param = read_until(f, b'\r')
 
     return (body, param)
 
+# The longest parameter a response can have.
+MAX_PARAM = 128
+
+class ResponseParser(object):
+    # Parses response frames out of arbitrarily sized chunks of data. Bytes
+    # that can't start a frame are skipped (and counted) up to the next %.
+    # With sep=b' ', it parses commands instead.
+
+    def __init__(self, sep=b'='):
+        self.sep = sep
+        self.buffer = bytearray()
+        self.discarded = 0
+
+    def feed(self, data):
+        buf = self.buffer
+        buf += data
+        frames = []
+        pos = 0
+
+        while True:
+            start = buf.find(b'%', pos)
+            if start < 0:
+                self.discarded += len(buf) - pos
+                pos = len(buf)
+                break
+            self.discarded += start - pos
+            pos = start
+
+            if len(buf) - start < 7:
+                break
+            try:
+                body = parse_header(bytes(buf[start:start + 7]), self.sep)
+            except ValueError:
+                # Not a real frame, so look for the next one.
+                self.discarded += 1
+                pos = start + 1
+                continue
+
+            end = buf.find(b'\r', start + 7, start + 8 + MAX_PARAM)
+            if end < 0:
+                if len(buf) - start > 7 + MAX_PARAM:
+                    # Far too long, so this must be garbage too.
+                    self.discarded += 1
+                    pos = start + 1
+                    continue
+                break
+
+            frames.append((body, bytes(buf[start + 7:end])))
+            pos = end + 1
+
+        del buf[:pos]
+        return frames
+
 ERRORS = {
     b'ERR1': b'undefined command',
     b'ERR2': b'out of parameter',
@@ -61,3 +126,120 @@ def send_command(f, req_body, req_param):
         return False, ERRORS[resp_param]
     return True, resp_param
 
+def send_commands(f, commands):
+    # Write every command at once, then read the responses back in order,
+    # so the whole batch costs a single round-trip.
+    f.write(b''.join(to_binary(body, param) for body, param in commands))
+    f.flush()
+
+    results = []
+    for req_body, req_param in commands:
+        resp_body, resp_param = parse_response(f)
+        assert resp_body == req_body
+
+        if resp_param in ERRORS:
+            results.append((False, ERRORS[resp_param]))
+        else:
+            results.append((True, resp_param))
+    return results
+
+
+class Handshake(object):
+    """
+    Resumable authentication handshake, which does no I/O itself: feed it
+    what the projector sent, and send what it returns.
+    """
+
+    def __init__(self, get_password, body=b'POWR', param=b'?'):
+        self.get_password = get_password
+        self.body = body
+        self.param = param
+
+        self.state = 'greeting'
+        self.buffer = b''
+
+        # None if no authentication was required, otherwise whether the
+        # password was accepted.
+        self.result = None
+        # (body, param) of the reply to our command, if we sent one.
+        self.reply = None
+
+    @property
+    def done(self):
+        return self.state == 'done'
+
+    @property
+    def wanted(self):
+        n = len(self.buffer)
+        if self.state == 'greeting':
+            return 9 - n
+        elif self.state == 'salt':
+            return 18 - n
+        elif self.state == 'reply':
+            if n < 7:
+                return 7 - n
+            if self.buffer[:7] == b'PJLINK ':
+                return 12 - n
+            # the reply is terminated by a \r, so go a byte at a time.
+            return 1
+        return 0
+
+    def feed(self, data):
+        self.buffer += data
+        out = b''
+
+        if self.state == 'greeting' and len(self.buffer) >= 9:
+            assert self.buffer[:7] in (b'PJLINK ', b'pjlink ')
+            security = self.buffer[7:8]
+            if security == b'0':
+                self.buffer = self.buffer[9:]
+                self.state = 'done'
+                return out
+            assert security == b'1'
+            self.state = 'salt'
+
+        if self.state == 'salt' and len(self.buffer) >= 18:
+            assert self.buffer[8:9] == b' '
+            salt = self.buffer[9:17]
+            assert self.buffer[17:18] == b'\r'
+            self.buffer = self.buffer[18:]
+
+            # I'm just implementing the authentication scheme designed in
+            # the protocol. Don't take this as any kind of assurance that
+            # it's secure.
+            password = self.get_password().encode('utf-8')
+            pass_data = hashlib.md5(salt + password).hexdigest()
+            # we *must* send a command to complete the procedure.
+            out = pass_data.encode('ascii') + to_binary(self.body, self.param)
+            self.state = 'reply'
+
+        if self.state == 'reply' and len(self.buffer) >= 7:
+            if self.buffer[:7] == b'PJLINK ':
+                # should be a failed auth if we get that
+                if len(self.buffer) >= 12:
+                    assert self.buffer[:12] == b'PJLINK ERRA\r'
+                    self.buffer = self.buffer[12:]
+                    self.result = False
+                    self.state = 'done'
+            elif b'\r' in self.buffer:
+                # good auth, so we should get a reply to the command we sent
+                frame, self.buffer = self.buffer.split(b'\r', 1)
+                body = parse_header(frame[:7])
+                param = frame[7:]
+                assert body == self.body
+                self.reply = (body, param)
+                self.result = True
+                self.state = 'done'
+
+        return out
+
+async def handshake_async(reader, writer, handshake):
+    while not handshake.done:
+        data = await reader.read(handshake.wanted)
+        if not data:
+            raise EOFError('Connection closed during handshake')
+        out = handshake.feed(data)
+        if out:
+            writer.write(out)
+            await writer.drain()
+    return handshake.result
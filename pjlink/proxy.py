@@ -0,0 +1,103 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import hmac
+import os
+
+from pjlink import protocol
+from pjlink.projector import ProjectorError
+
+# Sent in place of a reply when the projector can't be reached at all.
+UNREACHABLE = b'ERR4'
+# How long clients have to authenticate.
+AUTH_TIMEOUT = 10.0
+
+class Proxy(object):
+    """
+    Speaks PJLink to any number of clients per projector, passing their
+    commands over the one authenticated Session a SessionPool keeps for it.
+    Each client authenticates with the projector's own password.
+    """
+
+    def __init__(self, pool, max_workers=32, auth_timeout=AUTH_TIMEOUT):
+        self.pool = pool
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.auth_timeout = auth_timeout
+        self.servers = []
+        self.clients = 0
+
+    async def exchange(self, name, body, param):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self.executor, self.pool.run, name,
+                lambda session: session.exchange(body, param))
+        except (OSError, EOFError, ValueError, ProjectorError):
+            return UNREACHABLE
+
+    async def authenticate(self, name, reader, writer):
+        password = self.pool.inventory[name].password
+        if not password:
+            writer.write(b'PJLINK 0\r')
+            return True
+
+        salt = os.urandom(4).hex().encode('ascii')
+        writer.write(b'PJLINK 1 ' + salt + b'\r')
+        digest = await asyncio.wait_for(
+            reader.readexactly(32), self.auth_timeout)
+        expected = hashlib.md5(salt + password.encode('utf-8')).hexdigest()
+        if hmac.compare_digest(digest, expected.encode('ascii')):
+            return True
+        writer.write(b'PJLINK ERRA\r')
+        await writer.drain()
+        return False
+
+    async def handle_client(self, name, reader, writer):
+        self.clients += 1
+        try:
+            if not await self.authenticate(name, reader, writer):
+                return
+            parser = protocol.ResponseParser(sep=b' ')
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                # Answer in order, so pipelining clients get their replies
+                # back the way they expect.
+                for body, param in parser.feed(data):
+                    reply = await self.exchange(name, body, param)
+                    version = b'2' if body in protocol.CLASS2_COMMANDS \
+                        else b'1'
+                    writer.write(
+                        b'%' + version + body + b'=' + reply + b'\r')
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError,
+                asyncio.TimeoutError):
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    async def start(self, name, host='localhost', port=0):
+        # Checks the name first, rather than failing every client later.
+        self.pool.inventory[name]
+        server = await asyncio.start_server(
+            lambda reader, writer: self.handle_client(name, reader, writer),
+            host, port,
+        )
+        self.servers.append(server)
+        return server
+
+    async def serve_forever(self, listeners):
+        # listeners maps projector names to (host, port) to listen on.
+        for name, (host, port) in listeners.items():
+            await self.start(name, host, port)
+        await asyncio.gather(*[
+            server.serve_forever() for server in self.servers
+        ])
+
+    def close(self):
+        for server in self.servers:
+            server.close()
+        self.executor.shutdown()
+        self.pool.close()
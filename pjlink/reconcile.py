@@ -0,0 +1,120 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from pjlink.projector import MUTE_AUDIO, MUTE_VIDEO
+
+# What a projector should be doing. Fields left as None aren't managed;
+# mute is a (video, audio) pair, either of which may also be None.
+Desired = namedtuple('Desired', 'power input mute')
+Desired.__new__.__defaults__ = (None, None, None)
+
+# actions is a tuple of (method name, args) that were issued, and converged
+# is whether the projector is now (or will be) in the desired state.
+Result = namedtuple('Result', 'name actions converged error')
+
+TRANSITIONAL_STATES = ('warm-up', 'cooling')
+
+def status_fields(desired):
+    fields = ['power']
+    if desired.input is not None:
+        fields.append('input')
+    if desired.mute is not None:
+        fields.append('mute')
+    return tuple(fields)
+
+def plan(current, desired):
+    # Returns (actions, converged).
+    actions = []
+    wants_av = desired.input is not None or desired.mute is not None
+
+    if desired.power is not None and current.power != desired.power:
+        # Nothing can be done while it's warming up or cooling down, and
+        # once it's been told to change, input and mute have to wait until
+        # the next pass.
+        if current.power not in TRANSITIONAL_STATES:
+            actions.append(('set_power', (desired.power,)))
+        return actions, False
+
+    if current.power != 'on':
+        # Input and mute can only be changed while the projector is on, and
+        # don't matter if it's meant to be off.
+        return actions, desired.power == 'off' or not wants_av
+
+    if desired.input is not None and current.input != tuple(desired.input):
+        actions.append(('set_input', tuple(desired.input)))
+
+    if desired.mute is not None:
+        changes = {}
+        have = current.mute or (None, None)
+        for what, want, had in zip((MUTE_VIDEO, MUTE_AUDIO), desired.mute, have):
+            if want is not None and want != had:
+                changes[what] = bool(want)
+        if len(changes) == 2 and changes[MUTE_VIDEO] == changes[MUTE_AUDIO]:
+            both = MUTE_VIDEO | MUTE_AUDIO
+            actions.append(('set_mute', (both, changes[MUTE_VIDEO])))
+        else:
+            for what, state in sorted(changes.items()):
+                actions.append(('set_mute', (what, state)))
+
+    return actions, True
+
+class Report(object):
+    def __init__(self, results):
+        self.results = results
+
+    @property
+    def converged(self):
+        return [r for r in self.results if r.converged and not r.actions]
+
+    @property
+    def changed(self):
+        return [r for r in self.results if r.actions]
+
+    @property
+    def pending(self):
+        return [r for r in self.results if not r.converged and not r.error]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if r.error is not None]
+
+    @property
+    def commands(self):
+        return sum(len(r.actions) for r in self.results)
+
+    def __repr__(self):
+        return '<Report: %d converged, %d changed, %d pending, %d failed>' % (
+            len(self.converged), len(self.changed),
+            len(self.pending), len(self.failed),
+        )
+
+class Reconciler(object):
+    # open_projector(name) returns an authenticated Projector; it's not
+    # closed afterwards, so a SessionPool's get fits nicely.
+
+    def __init__(self, open_projector, max_workers=16):
+        self.open_projector = open_projector
+        self.max_workers = max_workers
+
+    def reconcile_one(self, name, desired):
+        actions = []
+        try:
+            p = self.open_projector(name)
+            # Everything we need to know comes back in a single round-trip.
+            current = p.get_status(status_fields(desired))
+            planned, converged = plan(current, desired)
+            for method, args in planned:
+                getattr(p, method)(*args)
+                actions.append((method, args))
+        except Exception as e:
+            return Result(name, tuple(actions), False, e)
+        return Result(name, tuple(actions), converged, None)
+
+    def reconcile(self, desired):
+        # desired maps projector names to Desired states.
+        items = sorted(desired.items())
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(
+                lambda item: self.reconcile_one(*item), items,
+            ))
+        return Report(results)
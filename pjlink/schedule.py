@@ -0,0 +1,227 @@
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import heapq
+import itertools
+import json
+import threading
+import time
+import zlib
+
+from six.moves.configparser import ConfigParser
+
+from pjlink.inventory import GROUPS
+from pjlink.projector import SOURCE_TYPES
+from pjlink.reconcile import Desired, Reconciler
+from pjlink.session import SCHEDULED, priority
+
+INPUT_NUMBERS = tuple('123456789')
+DAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+# Targets of an event are started over this many seconds, rather than all
+# at once, unless the event says otherwise.
+DEFAULT_SPREAD = 60.0
+# How long to wait before another pass at projectors that haven't converged
+# yet, e.g. because they were still warming up when their input was set.
+SETTLE = 30.0
+MAX_PASSES = 3
+
+# at is (hour, minute), days a frozenset of weekday numbers (0 is Monday),
+# and selector the keyword arguments for Inventory.select.
+Event = namedtuple('Event', 'name at days selector desired spread')
+
+# One attempt at bringing one projector in line with an event.
+Outcome = namedtuple('Outcome', 'event name due attempt result')
+
+def parse_days(text):
+    # e.g. "mon-fri" or "sat,sun"; empty means every day.
+    if not text:
+        return frozenset(range(7))
+    days = set()
+    for item in text.lower().replace(',', ' ').split():
+        first, _, last = item.partition('-')
+        first = DAYS.index(first[:3])
+        last = DAYS.index(last[:3]) if last else first
+        days.update(i % 7 for i in range(first, first + (last - first) % 7 + 1))
+    return frozenset(days)
+
+def parse_at(text):
+    hour, minute = text.split(':')
+    hour, minute = int(hour), int(minute)
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError('Invalid time: %s' % text)
+    return hour, minute
+
+def parse_mute(value):
+    if value is None or isinstance(value, (list, tuple)):
+        return value
+    if isinstance(value, str):
+        value = {'on': True, 'off': False}[value.lower()]
+    return (bool(value), bool(value))
+
+def make_event(name, at, days=None, tags=(), power=None, input=None,
+               mute=None, spread=DEFAULT_SPREAD, **groups):
+    if isinstance(tags, str):
+        tags = tags.replace(',', ' ').split()
+    if power not in (None, 'on', 'off'):
+        raise ValueError('Event %s has an invalid power: %s' % (name, power))
+    if isinstance(input, str):
+        source, _, number = input.partition(' ')
+        input = (source.upper(), number or '1')
+    if input is not None:
+        source, number = input
+        if source not in SOURCE_TYPES or str(number) not in INPUT_NUMBERS:
+            raise ValueError('Event %s has an invalid input: %s %s' % (
+                name, source, number))
+        input = (source, int(number))
+
+    selector = {'tags': tuple(tags)}
+    for group in GROUPS:
+        if groups.get(group):
+            selector[group] = groups.pop(group)
+    if groups:
+        raise ValueError('Unknown event options: %s' % ', '.join(groups))
+
+    desired = Desired(power, input, parse_mute(mute))
+    if desired == Desired():
+        raise ValueError('Event %s does nothing' % name)
+    return Event(name, parse_at(at), parse_days(days), selector, desired,
+                 float(spread))
+
+def parse_json(f):
+    # Either a list of events, or an object with an "events" list.
+    data = json.load(f)
+    if isinstance(data, dict):
+        data = data['events']
+    return [make_event(**item) for item in data]
+
+def parse_ini(f):
+    # One section per event.
+    config = ConfigParser(interpolation=None)
+    config.read_file(f)
+    return [
+        make_event(section, **dict(config.items(section)))
+        for section in config.sections()
+    ]
+
+def load(path):
+    with open(path, 'r') as f:
+        if path.endswith('.json'):
+            return parse_json(f)
+        return parse_ini(f)
+
+def next_time(event, after):
+    # The first time the event is due, strictly after the timestamp after.
+    now = datetime.fromtimestamp(after)
+    hour, minute = event.at
+    when = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if when <= now:
+        when += timedelta(days=1)
+    while when.weekday() not in event.days:
+        when += timedelta(days=1)
+    return when.timestamp()
+
+def offset(event, name, spread=None):
+    # Stable per projector, so each room is handled at the same time daily.
+    spread = event.spread if spread is None else spread
+    return (zlib.crc32(name.encode('utf-8')) % 1000) / 1000.0 * spread
+
+class Scheduler(object):
+    """
+    Runs a timetable of Events against an inventory, within one process.
+    ``open_projector(name)`` returns an authenticated Projector, as for a
+    Reconciler; a SessionPool's get lets the connections be reused.
+    """
+
+    def __init__(self, inventory, events, open_projector, max_workers=16,
+                 settle=SETTLE, max_passes=MAX_PASSES, history=10000,
+                 clock=time.time, sleep=time.sleep):
+        self.inventory = inventory
+        self.events = list(events)
+        self.reconciler = Reconciler(open_projector)
+        self.max_workers = max_workers
+        self.settle = settle
+        self.max_passes = max_passes
+        self.clock = clock
+        self.sleep = sleep
+        self.outcomes = deque(maxlen=history)
+        # Called with each Outcome as it completes.
+        self.on_outcome = None
+
+        # (due, seq, event, name, attempt); a name of None fires the event.
+        self.queue = []
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+        self.executor = None
+        self.stopping = threading.Event()
+
+        now = clock()
+        for event in self.events:
+            self._push(next_time(event, now), event, None, 0)
+
+    def _push(self, due, event, name, attempt):
+        with self.lock:
+            heapq.heappush(
+                self.queue, (due, next(self.seq), event, name, attempt))
+
+    def next_due(self):
+        with self.lock:
+            return self.queue[0][0] if self.queue else None
+
+    def _fire(self, due, event):
+        # Spread the event's projectors out, and line up its next run.
+        for entry in self.inventory.select(**event.selector):
+            self._push(due + offset(event, entry.name), event, entry.name, 1)
+        self._push(next_time(event, due), event, None, 0)
+
+    def _apply(self, due, event, name, attempt):
+        with priority(SCHEDULED):
+            result = self.reconciler.reconcile_one(name, event.desired)
+        outcome = Outcome(event.name, name, due, attempt, result)
+        self.outcomes.append(outcome)
+        if result.error is None and not result.converged and \
+                attempt < self.max_passes:
+            self._push(due + self.settle * attempt, event, name, attempt + 1)
+        if self.on_outcome is not None:
+            self.on_outcome(outcome)
+        return outcome
+
+    def run_pending(self, now=None):
+        """Starts everything that's due; returns futures of their Outcomes."""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        now = self.clock() if now is None else now
+
+        futures = []
+        while True:
+            with self.lock:
+                if not self.queue or self.queue[0][0] > now:
+                    break
+                due, _, event, name, attempt = heapq.heappop(self.queue)
+            if name is None:
+                self._fire(due, event)
+            else:
+                # The executor queues what it can't run yet, which keeps to
+                # max_workers projectors at a time.
+                futures.append(self.executor.submit(
+                    self._apply, due, event, name, attempt))
+        return futures
+
+    def run(self, poll=1.0):
+        # Runs until stop is called.
+        try:
+            while not self.stopping.is_set():
+                self.run_pending()
+                due = self.next_due()
+                delay = poll if due is None else due - self.clock()
+                self.sleep(max(min(delay, poll), 0))
+        finally:
+            self.close()
+
+    def stop(self):
+        self.stopping.set()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
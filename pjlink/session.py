@@ -0,0 +1,280 @@
+from concurrent.futures import Future
+from contextlib import contextmanager
+import heapq
+import itertools
+import threading
+import time
+
+from pjlink import protocol
+from pjlink.projector import Projector, ProjectorError, make_query
+from pjlink.transport import TCPTransport
+
+# Projectors drop control connections after 30 seconds of inactivity, so
+# don't bother reusing one that's been idle for longer than this.
+MAX_IDLE = 25.0
+
+# Maps error messages back to the ERRn codes they came from.
+ERROR_CODES = dict(
+    (message, code) for code, message in protocol.ERRORS.items()
+)
+
+# Priority classes, most urgent first. Commands are sent at the priority of
+# the thread sending them, which is INTERACTIVE unless it says otherwise.
+INTERACTIVE = 0
+SCHEDULED = 1
+BACKGROUND = 2
+
+# Background commands wait until a device has had no interactive traffic
+# for this long.
+QUIET = 1.0
+
+_local = threading.local()
+
+def current_priority():
+    return getattr(_local, 'priority', INTERACTIVE)
+
+@contextmanager
+def priority(level):
+    previous = current_priority()
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+class PriorityLock(object):
+    """
+    A lock which goes to the most urgent waiter first (and in order of
+    arrival within a priority), holding BACKGROUND ones off while there's
+    been INTERACTIVE use in the last ``quiet`` seconds.
+    """
+
+    def __init__(self, quiet=QUIET, clock=time.monotonic):
+        self.quiet = quiet
+        self.clock = clock
+        self.cond = threading.Condition(threading.Lock())
+        self.holder = None
+        self.waiters = []
+        self.seq = itertools.count()
+        self.last_interactive = None
+
+    def acquire(self, level=None):
+        if level is None:
+            level = current_priority()
+        with self.cond:
+            me = (level, next(self.seq))
+            heapq.heappush(self.waiters, me)
+            while True:
+                if self.holder is None and self.waiters[0] == me:
+                    if level != BACKGROUND or self.last_interactive is None:
+                        break
+                    wait = self.last_interactive + self.quiet - self.clock()
+                    if wait <= 0:
+                        break
+                    self.cond.wait(wait)
+                else:
+                    self.cond.wait()
+            heapq.heappop(self.waiters)
+            self.holder = level
+
+    def release(self):
+        with self.cond:
+            if self.holder == INTERACTIVE:
+                self.last_interactive = self.clock()
+            self.holder = None
+            self.cond.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+class Session(Projector):
+    """
+    A Projector which can be shared between threads. Commands are sent in
+    priority order; a query that's already in flight is shared rather than
+    resent.
+    """
+
+    def __init__(self, f, pjlink_class=None, stats=None, audit=None,
+                 device=None):
+        super(Session, self).__init__(f, pjlink_class, stats, audit, device)
+        self.lock = PriorityLock()
+        # (body, param) -> (Future, priority) of queries waiting or sent.
+        self.inflight = {}
+        self.inflight_lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.broken = False
+
+    def _call(self, func, *args):
+        # Must be called with the lock held.
+        try:
+            return func(self, *args)
+        except (OSError, ValueError, EOFError):
+            # The stream is in an unknown state, don't use it again.
+            self.broken = True
+            raise
+        finally:
+            self.last_used = time.monotonic()
+
+    def _locked(self, func, *args):
+        with self.lock:
+            return self._call(func, *args)
+
+    def authenticate(self, get_password):
+        return self._locked(Projector.authenticate, get_password)
+
+    def get_many(self, queries):
+        queries = [make_query(query) for query in queries]
+        # This may need to ask for CLSS, so do it before taking the lock.
+        self._detect_class(body for body, _ in queries)
+
+        # Join queries that are already in flight, and send the rest. Queued
+        # behind less urgent traffic doesn't count, as that could be a wait.
+        level = current_priority()
+        futures = []
+        owned = []
+        with self.inflight_lock:
+            for query in queries:
+                future, owner = self.inflight.get(query, (None, None))
+                if future is None or owner > level:
+                    future = Future()
+                    if owner is None:
+                        self.inflight[query] = (future, level)
+                    owned.append((query, future))
+                futures.append(future)
+
+        if owned:
+            try:
+                with self.lock:
+                    try:
+                        replies = self._call(
+                            Projector.get_many,
+                            [query for query, _ in owned])
+                    finally:
+                        # This has to happen before the lock is released, or
+                        # a set could slip in and a later get would see our
+                        # stale reply.
+                        with self.inflight_lock:
+                            for query, future in owned:
+                                if self.inflight.get(query, (None,))[0] \
+                                        is future:
+                                    del self.inflight[query]
+            except BaseException as e:
+                for _, future in owned:
+                    future.set_exception(e)
+                raise
+            for (_, future), reply in zip(owned, replies):
+                future.set_result(reply)
+
+        return [future.result() for future in futures]
+
+    def set(self, body, param):
+        self._detect_class([body.encode('utf-8')])
+        return self._locked(Projector.set, body, param)
+
+    def exchange(self, body, param):
+        # Sends a raw command on someone else's behalf, returning the raw
+        # reply (e.g. b'OK' or b'ERR3'). Queries are shared like any other.
+        if param[:1] == b'?':
+            success, response = self.get_many([(body, param)])[0]
+        else:
+            try:
+                self.set(body.decode('ascii'), param.decode('utf-8'))
+            except ProjectorError as e:
+                success, response = False, e.args[0]
+            else:
+                success, response = True, b'OK'
+        if not success:
+            return ERROR_CODES[response]
+        return response
+
+    @property
+    def idle(self):
+        return time.monotonic() - self.last_used
+
+    def close(self):
+        self.broken = True
+        self.f.close()
+
+def make_tcp_transport(entry):
+    return TCPTransport(entry.host, entry.port)
+
+class SessionPool(object):
+    """Keeps one authenticated Session open per projector."""
+
+    def __init__(self, inventory, make_transport=make_tcp_transport,
+                 max_idle=MAX_IDLE, audit=None):
+        self.inventory = inventory
+        self.make_transport = make_transport
+        self.max_idle = max_idle
+        self.audit = audit
+        self.sessions = {}
+        # (class, unsupported commands) learned from earlier sessions.
+        self.capabilities = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def open(self, name):
+        entry = self.inventory[name]
+        transport = self.make_transport(entry)
+        pjlink_class, unsupported = self.capabilities.get(name, (None, ()))
+        session = Session(
+            transport.open(), pjlink_class, audit=self.audit, device=name)
+        session.unsupported.update(unsupported)
+        if transport.greeting:
+            password = entry.password or ''
+            if session.authenticate(lambda: password) is False:
+                session.close()
+                raise ProjectorError('Incorrect password for %s' % name)
+        return session
+
+    def get(self, name):
+        with self.lock:
+            session = self.sessions.get(name)
+            if session is not None and not session.broken \
+                    and session.idle < self.max_idle:
+                return session
+            lock = self.locks.setdefault(name, threading.Lock())
+
+        # Only one thread opens a given projector at a time.
+        with lock:
+            with self.lock:
+                session = self.sessions.get(name)
+            if session is not None and not session.broken \
+                    and session.idle < self.max_idle:
+                return session
+            if session is not None:
+                self.discard(name)
+
+            session = self.open(name)
+            with self.lock:
+                self.sessions[name] = session
+            return session
+
+    def run(self, name, func, retries=1):
+        # Projectors drop idle connections, so reconnect and retry once.
+        while True:
+            session = self.get(name)
+            try:
+                return func(session)
+            except (OSError, ValueError, EOFError):
+                if not session.broken or retries <= 0:
+                    raise
+                retries -= 1
+
+    def discard(self, name):
+        with self.lock:
+            session = self.sessions.pop(name, None)
+        if session is not None:
+            self.capabilities[name] = (
+                session.pjlink_class, frozenset(session.unsupported))
+            try:
+                session.close()
+            except OSError:
+                pass
+
+    def close(self):
+        for name in list(self.sessions):
+            self.discard(name)
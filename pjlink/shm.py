@@ -0,0 +1,194 @@
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+from pjlink.projector import (
+    ERROR_KINDS, MUTE_AUDIO, MUTE_VIDEO, Status,
+)
+from pjlink.statetable import (
+    ERROR_CODES, POWER_CODES, SOURCE_CODES, UNKNOWN, _mute_code,
+)
+
+MAGIC = b'PJLKSHM1'
+# magic, slot size, capacity, slots in use
+HEADER = struct.Struct('<8sIII')
+HEADER_SIZE = 32
+# seq, name, power, input source, input number, mute, errors, lamp count,
+# lamps lit (a bit each), lamp hours, when it was published
+SLOT = struct.Struct('<I64s4B6sBB8Id')
+SEQ = struct.Struct('<I')
+MAX_LAMPS = 8
+
+POWER_NAMES = dict((code, state) for state, code in POWER_CODES.items())
+SOURCE_NAMES = dict((code, source) for source, code in SOURCE_CODES.items())
+ERROR_NAMES = dict((code, state) for state, code in ERROR_CODES.items())
+
+def encode(status, values):
+    # Updates the list of slot values with the known fields of status.
+    if status.power is not None:
+        values[2] = POWER_CODES[status.power]
+    if status.input is not None:
+        values[3] = SOURCE_CODES[status.input[0]]
+        values[4] = status.input[1]
+    if status.mute is not None:
+        values[5] = _mute_code(status.mute)
+    if status.errors is not None:
+        values[6] = bytes(ERROR_CODES[state] for _, state in status.errors)
+    if status.lamps is not None:
+        lamps = status.lamps[:MAX_LAMPS]
+        values[7] = len(lamps)
+        values[8] = sum(1 << i for i, (_, on) in enumerate(lamps) if on)
+        hours = [hours for hours, _ in lamps]
+        values[9:17] = hours + [0] * (MAX_LAMPS - len(hours))
+
+def decode(values):
+    power, source, number, mute, errors, count, lit = values[2:9]
+    if mute == UNKNOWN:
+        mute = None
+    else:
+        mute = (bool(mute & MUTE_VIDEO), bool(mute & MUTE_AUDIO))
+    lamps = None
+    if count != UNKNOWN:
+        lamps = tuple(
+            (values[9 + i], bool(lit & (1 << i))) for i in range(count)
+        )
+    return Status(
+        POWER_NAMES.get(power),
+        None if source == UNKNOWN else (SOURCE_NAMES[source], number),
+        mute,
+        None if UNKNOWN in errors else tuple(
+            zip(ERROR_KINDS, (ERROR_NAMES[code] for code in errors))),
+        lamps,
+    )
+
+class Publisher(object):
+    """
+    Publishes Statuses into a memory-mapped file, a fixed-size slot per
+    projector, for any number of Readers. Each slot has its own sequence
+    number, odd while it's being written, so readers can tell a torn read
+    and try again. There must only be one Publisher per file.
+    """
+
+    def __init__(self, path, capacity=1024):
+        self.path = path
+        self.capacity = capacity
+        self.slots = {}
+        self.values = []
+
+        size = HEADER_SIZE + capacity * SLOT.size
+        # Build it beside the old one and swap it in, so readers never see
+        # a half-made file.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.')
+        try:
+            os.fchmod(fd, 0o644)
+            os.ftruncate(fd, size)
+            self.mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        HEADER.pack_into(self.mm, 0, MAGIC, SLOT.size, capacity, 0)
+        os.replace(tmp, path)
+
+    def _offset(self, slot):
+        return HEADER_SIZE + slot * SLOT.size
+
+    def publish(self, name, status, now=None):
+        slot = self.slots.get(name)
+        if slot is None:
+            if len(self.slots) >= self.capacity:
+                raise ValueError('No room for %s in %s' % (name, self.path))
+            slot = self.slots[name] = len(self.slots)
+            values = [0, name.encode('utf-8')[:64]]
+            values += [UNKNOWN] * 4 + [bytes([UNKNOWN]) * 6, UNKNOWN, 0]
+            values += [0] * MAX_LAMPS + [0.0]
+            self.values.append(values)
+        values = self.values[slot]
+        encode(status, values)
+        values[17] = time.time() if now is None else now
+
+        offset = self._offset(slot)
+        seq = values[0]
+        SEQ.pack_into(self.mm, offset, seq + 1)
+        values[0] = seq + 1
+        SLOT.pack_into(self.mm, offset, *values)
+        values[0] = seq + 2
+        SEQ.pack_into(self.mm, offset, seq + 2)
+
+        if slot + 1 > self.count:
+            # The slot is complete before readers are told it exists.
+            HEADER.pack_into(
+                self.mm, 0, MAGIC, SLOT.size, self.capacity, slot + 1)
+
+    @property
+    def count(self):
+        return HEADER.unpack_from(self.mm, 0)[3]
+
+    def on_status(self, name, status, changed):
+        # For Poller.on_status. Unchanged statuses are published too, so
+        # readers can see how fresh they are.
+        self.publish(name, status)
+
+    def close(self):
+        self.mm.close()
+
+class Reader(object):
+    """Reads what a Publisher has published, from any process."""
+
+    def __init__(self, path, retries=1000):
+        self.path = path
+        self.retries = retries
+        self.mm = None
+        self._open()
+
+    def _open(self):
+        if self.mm is not None:
+            self.mm.close()
+        with open(self.path, 'rb') as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, slot_size, self.capacity, _ = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or slot_size != SLOT.size:
+            raise ValueError('%s is not a pjlink state file' % self.path)
+        self.slots = {}
+
+    def _refresh(self):
+        # A restarted Publisher replaces the file.
+        if os.stat(self.path).st_ino != self.inode:
+            self._open()
+        count = HEADER.unpack_from(self.mm, 0)[3]
+        for slot in range(len(self.slots), count):
+            name = self._read(slot)[1].rstrip(b'\0')
+            self.slots[name.decode('utf-8', 'replace')] = slot
+
+    def _read(self, slot):
+        offset = HEADER_SIZE + slot * SLOT.size
+        for i in range(self.retries):
+            before = SEQ.unpack_from(self.mm, offset)[0]
+            if not before & 1:
+                values = SLOT.unpack_from(self.mm, offset)
+                if SEQ.unpack_from(self.mm, offset)[0] == before == values[0]:
+                    return values
+            # Let the writer finish, if it's a thread of this process.
+            time.sleep(0)
+        raise RuntimeError('Slot %d of %s is stuck' % (slot, self.path))
+
+    def get(self, name):
+        """Returns (Status, when it was published), or None."""
+        self._refresh()
+        slot = self.slots.get(name)
+        if slot is None:
+            return None
+        values = self._read(slot)
+        return decode(values), values[17]
+
+    def snapshot(self):
+        self._refresh()
+        result = {}
+        for name, slot in self.slots.items():
+            values = self._read(slot)
+            result[name] = (decode(values), values[17])
+        return result
+
+    def close(self):
+        self.mm.close()
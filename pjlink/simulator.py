@@ -0,0 +1,228 @@
+from collections import namedtuple
+import threading
+
+from pjlink.inventory import Inventory, make_entry
+from pjlink.projector import (
+    ERROR_KINDS, ERROR_STATES, POWER_STATES, SOURCE_TYPES, SOURCE_TYPES_REV,
+)
+from pjlink.transport import LoopbackTransport
+
+WARM_UP = 30.0
+COOL_DOWN = 60.0
+
+DEFAULT_INPUTS = (('RGB', 1), ('VIDEO', 1), ('DIGITAL', 1), ('DIGITAL', 2))
+
+# Between start and end (None for never), the kind of error is reported as
+# state. A kind of 'failure' makes every command fail with ERR4.
+Fault = namedtuple('Fault', 'start end kind state')
+
+class VirtualClock(object):
+    """
+    Time that only moves when told to. ``time`` and ``sleep`` can stand in
+    for time.time (or time.monotonic) and time.sleep.
+    """
+
+    def __init__(self, start=0.0):
+        self.now = float(start)
+        self.lock = threading.Lock()
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        with self.lock:
+            self.now += max(seconds, 0)
+        return self.now
+
+    sleep = advance
+
+class SimulatedProjector(object):
+    """
+    A projector whose state follows a VirtualClock: powering on and off take
+    time, the lamp clocks up hours while lit, and faults come and go on
+    schedule. Nothing happens between commands; state is worked out when
+    it's asked for, so idle projectors cost nothing.
+    """
+
+    def __init__(self, clock, name='Simulated', warm_up=WARM_UP,
+                 cool_down=COOL_DOWN, lamp_hours=0, inputs=DEFAULT_INPUTS):
+        self.clock = clock
+        self.name = name
+        self.warm_up = warm_up
+        self.cool_down = cool_down
+        self.inputs = tuple(inputs)
+        self.input = self.inputs[0]
+        self.mute = (False, False)
+        self.faults = []
+        self.commands = 0
+        self.lock = threading.Lock()
+
+        self._power = 'off'
+        # When the current warm-up or cool-down started.
+        self._changed = clock.time()
+        self._lamp_seconds = lamp_hours * 3600.0
+        # When the lamp was lit, if it is.
+        self._lit = None
+
+    def _settle(self, now):
+        if self._power == 'warm-up' and now >= self._changed + self.warm_up:
+            self._power = 'on'
+        elif self._power == 'cooling' and \
+                now >= self._changed + self.cool_down:
+            self._power = 'off'
+
+    def power(self, now=None):
+        now = self.clock.time() if now is None else now
+        self._settle(now)
+        return self._power
+
+    def lamp_hours(self, now=None):
+        now = self.clock.time() if now is None else now
+        seconds = self._lamp_seconds
+        if self._lit is not None:
+            seconds += now - self._lit
+        return int(seconds // 3600)
+
+    def add_fault(self, start, kind, state='error', duration=None):
+        if kind != 'failure' and (kind not in ERROR_KINDS or
+                                  state not in ERROR_STATES):
+            raise ValueError('Invalid fault: %s %s' % (kind, state))
+        end = None if duration is None else start + duration
+        self.faults.append(Fault(start, end, kind, state))
+
+    def errors(self, now=None):
+        now = self.clock.time() if now is None else now
+        errors = dict.fromkeys(ERROR_KINDS, 'ok')
+        for fault in self.faults:
+            if fault.kind in errors and fault.start <= now and \
+                    (fault.end is None or now < fault.end):
+                # Report the worst of any overlapping faults.
+                if ERROR_STATES[fault.state] > ERROR_STATES[errors[fault.kind]]:
+                    errors[fault.kind] = fault.state
+        return errors
+
+    def _failing(self, now):
+        return any(
+            fault.kind == 'failure' and fault.start <= now and
+            (fault.end is None or now < fault.end)
+            for fault in self.faults
+        )
+
+    def _set_power(self, on, now):
+        power = self._power
+        if power in ('warm-up', 'cooling'):
+            # Real projectors refuse to change their minds part way.
+            return 'ERR3' if (power == 'cooling') == on else 'OK'
+        if on and power == 'off':
+            self._power = 'warm-up'
+            self._changed = self._lit = now
+        elif not on and power == 'on':
+            self._power = 'cooling'
+            self._changed = now
+            self._lamp_seconds += now - self._lit
+            self._lit = None
+        return 'OK'
+
+    def handle(self, body, param):
+        now = self.clock.time()
+        self.commands += 1
+        if self._failing(now):
+            return 'ERR4'
+        self._settle(now)
+        on = self._power == 'on'
+
+        if body == 'POWR':
+            if param == '?':
+                return POWER_STATES[self._power]
+            if param not in ('0', '1'):
+                return 'ERR2'
+            return self._set_power(param == '1', now)
+        elif body == 'INPT':
+            if param == '?':
+                if not on:
+                    return 'ERR3'
+                return SOURCE_TYPES[self.input[0]] + str(self.input[1])
+            if len(param) != 2 or param[0] not in SOURCE_TYPES_REV or \
+                    not param[1].isdigit():
+                return 'ERR2'
+            source = (SOURCE_TYPES_REV[param[0]], int(param[1]))
+            if source not in self.inputs:
+                return 'ERR2'
+            if not on:
+                return 'ERR3'
+            self.input = source
+            return 'OK'
+        elif body == 'AVMT':
+            if param == '?':
+                video, audio = self.mute
+                if video and audio:
+                    return '31'
+                return '11' if video else '21' if audio else '30'
+            if param not in ('10', '11', '20', '21', '30', '31'):
+                return 'ERR2'
+            if not on:
+                return 'ERR3'
+            what, state = param
+            video, audio = self.mute
+            if what in '13':
+                video = state == '1'
+            if what in '23':
+                audio = state == '1'
+            self.mute = (video, audio)
+            return 'OK'
+        elif param != '?':
+            return 'ERR2'
+        elif body == 'ERST':
+            errors = self.errors(now)
+            return ''.join(ERROR_STATES[errors[kind]] for kind in ERROR_KINDS)
+        elif body == 'LAMP':
+            return '%d %d' % (self.lamp_hours(now), self._lit is not None)
+        elif body == 'INST':
+            return ' '.join(
+                SOURCE_TYPES[source] + str(number)
+                for source, number in self.inputs
+            )
+        elif body == 'NAME':
+            return self.name
+        elif body == 'INF1':
+            return 'pjlink'
+        elif body == 'INF2':
+            return 'simulator'
+        elif body == 'INFO':
+            return ''
+        elif body == 'CLSS':
+            return '1'
+        return 'ERR1'
+
+    def respond(self, body, param):
+        # For a LoopbackTransport.
+        with self.lock:
+            reply = self.handle(body.decode('ascii'), param.decode('ascii'))
+        return reply.encode('ascii')
+
+    def transport(self):
+        return LoopbackTransport(self.respond)
+
+class SimulatedFleet(object):
+    """
+    Many SimulatedProjectors sharing a clock, with an Inventory describing
+    them and a make_transport suitable for a SessionPool.
+    """
+
+    def __init__(self, clock, names, **kwargs):
+        self.clock = clock
+        self.projectors = dict(
+            (name, SimulatedProjector(clock, name, **kwargs)) for name in names
+        )
+        self.inventory = Inventory(
+            make_entry(name, 'simulated') for name in names
+        )
+
+    def __getitem__(self, name):
+        return self.projectors[name]
+
+    def __len__(self):
+        return len(self.projectors)
+
+    def make_transport(self, entry):
+        return self.projectors[entry.name].transport()
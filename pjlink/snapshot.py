@@ -0,0 +1,161 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+
+from pjlink.projector import Status
+
+VERSION = 1
+# Seconds between checkpoints.
+INTERVAL = 60.0
+# Restored projectors are re-polled over at most this many seconds, rather
+# than all at once.
+SPREAD = 300.0
+# Statuses older than this aren't worth restoring; capabilities always are.
+MAX_AGE = 24 * 60 * 60.0
+
+def encode_status(status):
+    return list(status)
+
+def decode_status(values):
+    power, input, mute, errors, lamps = values
+    return Status(
+        power,
+        None if input is None else tuple(input),
+        None if mute is None else tuple(mute),
+        None if errors is None else tuple(tuple(pair) for pair in errors),
+        None if lamps is None else tuple(tuple(lamp) for lamp in lamps),
+    )
+
+def save(path, data):
+    # Written beside the old one and swapped in, so a crash mid-write leaves
+    # the previous snapshot intact.
+    payload = zlib.compress(
+        json.dumps(data, separators=(',', ':')).encode('utf-8'))
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def load(path):
+    """Returns the snapshot saved at path, or None if there isn't one."""
+    try:
+        with open(path, 'rb') as f:
+            data = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+    except (IOError, ValueError, zlib.error):
+        return None
+    if not isinstance(data, dict) or data.get('version') != VERSION:
+        return None
+    return data
+
+def _offset(name, spread):
+    # Stable per projector, like schedule.offset.
+    return (zlib.crc32(name.encode('utf-8')) % 1000) / 1000.0 * spread
+
+class Checkpointer(object):
+    """
+    Periodically saves what a Poller and SessionPool know about the fleet,
+    and restores it after a restart.
+
+    Restored statuses are marked stale and re-polled gradually, within
+    their old poll interval (up to ``spread``), so a restart doesn't query
+    every projector at once. Restored capabilities save new sessions from
+    asking for the PJLink class or trying unsupported commands again.
+    """
+
+    def __init__(self, path, poller=None, pool=None, interval=INTERVAL,
+                 spread=SPREAD, max_age=MAX_AGE, clock=time.time):
+        self.path = path
+        self.poller = poller
+        self.pool = pool
+        self.interval = interval
+        self.spread = spread
+        self.max_age = max_age
+        self.clock = clock
+        self.saves = 0
+        # The last exception raised while saving in the background, if any.
+        self.error = None
+        self.thread = None
+        self.stopping = threading.Event()
+
+    def snapshot(self):
+        devices = {}
+        if self.pool is not None:
+            capabilities = dict(self.pool.capabilities)
+            for name, session in list(self.pool.sessions.items()):
+                capabilities[name] = (
+                    session.pjlink_class, frozenset(session.unsupported))
+            for name, (pjlink_class, unsupported) in capabilities.items():
+                if pjlink_class is None and not unsupported:
+                    continue
+                devices[name] = {
+                    'class': pjlink_class,
+                    'unsupported': sorted(
+                        body.decode('ascii') for body in unsupported),
+                }
+        if self.poller is not None:
+            for name, device in list(self.poller.devices.items()):
+                if device.status is None:
+                    continue
+                entry = devices.setdefault(name, {})
+                entry['status'] = encode_status(device.status)
+                entry['interval'] = device.interval
+        return {'version': VERSION, 'saved': self.clock(), 'devices': devices}
+
+    def save(self):
+        save(self.path, self.snapshot())
+        self.saves += 1
+
+    def restore(self):
+        """Loads the last snapshot, if any; returns the names restored."""
+        data = load(self.path)
+        if data is None:
+            return []
+        fresh = self.clock() - data['saved'] < self.max_age
+        start = self.poller.clock() if self.poller is not None else None
+
+        # Projectors no longer in the inventory or being polled are skipped.
+        names = set()
+        for name, entry in sorted(data['devices'].items()):
+            if self.pool is not None and name in self.pool.inventory \
+                    and 'class' in entry:
+                self.pool.capabilities[name] = (
+                    entry['class'], frozenset(
+                        body.encode('ascii') for body in entry['unsupported']))
+                names.add(name)
+            if self.poller is not None and fresh and 'status' in entry and \
+                    name in self.poller.devices:
+                interval = entry['interval']
+                due = start + _offset(name, min(interval, self.spread))
+                self.poller.restore(
+                    name, decode_status(entry['status']), interval, due)
+                names.add(name)
+        return sorted(names)
+
+    def _run(self):
+        while not self.stopping.wait(self.interval):
+            try:
+                self.save()
+            except Exception as e:
+                # Try again next time; the last good snapshot is kept.
+                self.error = e
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self._run, name='pjlink-snapshot')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        # Saves one last time.
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.save()
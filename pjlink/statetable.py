@@ -0,0 +1,152 @@
+from array import array
+import sys
+
+from pjlink.projector import (
+    ERROR_KINDS, ERROR_STATES, POWER_STATES, SOURCE_TYPES,
+    MUTE_AUDIO, MUTE_VIDEO,
+)
+
+# Stored in place of a value we don't know (yet).
+UNKNOWN = 0xff
+
+POWER_CODES = dict((state, int(code)) for state, code in POWER_STATES.items())
+SOURCE_CODES = dict(
+    (source, int(code)) for source, code in SOURCE_TYPES.items()
+)
+ERROR_CODES = dict((state, int(code)) for state, code in ERROR_STATES.items())
+
+def _codes_for(column, values):
+    # Criteria are either a single value, or a list or set of them.
+    if not isinstance(values, (list, set, frozenset)):
+        values = [values]
+    if column == 'lamp_on':
+        return [int(bool(value)) for value in values]
+    elif column == 'power':
+        return [POWER_CODES[value] for value in values]
+    elif column == 'input':
+        return [SOURCE_CODES[value] for value in values]
+    elif column == 'mute':
+        return [_mute_code(value) for value in values]
+    return [ERROR_CODES[value] for value in values]
+
+def _mute_code(mute):
+    video, audio = mute
+    return (MUTE_VIDEO if video else 0) | (MUTE_AUDIO if audio else 0)
+
+class StateTable(object):
+    """
+    The latest state of a whole fleet, stored column-wise with one byte per
+    projector per field, so that queries run over whole columns at once.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+        self.power = bytearray()
+        self.input_source = bytearray()
+        self.input_number = bytearray()
+        self.mute = bytearray()
+        self.errors = dict((kind, bytearray()) for kind in ERROR_KINDS)
+        # The hours of the most used lamp, and whether any lamp is on.
+        self.lamp_hours = array('l')
+        self.lamp_on = bytearray()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def _byte_columns(self):
+        return [
+            self.power, self.input_source, self.input_number, self.mute,
+            self.lamp_on,
+        ] + list(self.errors.values())
+
+    def add(self, name):
+        device_id = self.ids.get(name)
+        if device_id is None:
+            device_id = len(self.names)
+            name = sys.intern(name)
+            self.names.append(name)
+            self.ids[name] = device_id
+            for column in self._byte_columns():
+                column.append(UNKNOWN)
+            self.lamp_hours.append(-1)
+        return device_id
+
+    def update(self, name, status):
+        """Stores the known fields of a projector.Status."""
+        i = self.add(name)
+
+        if status.power is not None:
+            self.power[i] = POWER_CODES[status.power]
+        if status.input is not None:
+            source, number = status.input
+            self.input_source[i] = SOURCE_CODES[source]
+            self.input_number[i] = number
+        if status.mute is not None:
+            self.mute[i] = _mute_code(status.mute)
+        if status.errors is not None:
+            for kind, state in status.errors:
+                self.errors[kind][i] = ERROR_CODES[state]
+        if status.lamps is not None:
+            hours = [hours for hours, _ in status.lamps]
+            self.lamp_hours[i] = max(hours) if hours else -1
+            self.lamp_on[i] = any(on for _, on in status.lamps)
+
+    def replace(self, name, status):
+        """Like update, but fields left as None become unknown."""
+        i = self.add(name)
+        for column in self._byte_columns():
+            column[i] = UNKNOWN
+        self.lamp_hours[i] = -1
+        self.update(name, status)
+
+    def _column(self, field):
+        if field == 'power':
+            return self.power
+        elif field == 'input':
+            return self.input_source
+        elif field == 'mute':
+            return self.mute
+        elif field == 'lamp_on':
+            return self.lamp_on
+        return self.errors[field]
+
+    def mask(self, **criteria):
+        """
+        Returns a mask (a 0 or 1 byte per projector) of those matching all
+        the criteria, e.g. ``mask(power='on', lamp=['warning', 'error'])``.
+        """
+        result = int.from_bytes(b'\x01' * len(self.names), 'little')
+        for field, values in criteria.items():
+            column = self._column(field)
+            codes = _codes_for(field, values)
+            # Map matching bytes to 1 and everything else to 0, then AND
+            # the whole column in one go.
+            table = bytearray(256)
+            for code in codes:
+                table[code] = 1
+            result &= int.from_bytes(column.translate(table), 'little')
+        return result
+
+    def select(self, **criteria):
+        """Returns the names of the projectors matching ``criteria``."""
+        matched = self.mask(**criteria).to_bytes(len(self.names), 'little')
+        names = []
+        i = matched.find(1)
+        while i >= 0:
+            names.append(self.names[i])
+            i = matched.find(1, i + 1)
+        return names
+
+    def count(self, **criteria):
+        return bin(self.mask(**criteria)).count('1')
+
+    def lamp_hours_over(self, hours):
+        return [
+            self.names[i] for i, value in enumerate(self.lamp_hours)
+            if value > hours
+        ]
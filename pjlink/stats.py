@@ -0,0 +1,142 @@
+import atexit
+import sys
+import threading
+import time
+
+# Each power of two is split into this many buckets, each spanning at most
+# 1/16 of its values, so percentiles (reported as a bucket's upper bound)
+# are within about 6% of the truth.
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF = SUB_BUCKETS // 2
+
+def bucket_index(value):
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return shift * HALF + (value >> shift)
+
+def bucket_upper(index):
+    # The largest value that falls into the bucket.
+    if index < SUB_BUCKETS:
+        return index
+    shift = index // HALF - 1
+    return ((index - shift * HALF + 1) << shift) - 1
+
+class Histogram(object):
+    """A log-linear (HDR-style) histogram of integer values, e.g. in µs."""
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value):
+        value = int(value)
+        index = bucket_index(value)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self):
+        return self.total / float(self.count or 1)
+
+    def percentile(self, p):
+        if not self.count:
+            return 0
+        wanted = max(p / 100.0 * self.count, 1)
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= wanted:
+                return min(bucket_upper(index), self.max)
+        return self.max
+
+class LatencyStats(object):
+    """Latency histograms (in microseconds) per command body."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def record(self, body, seconds):
+        with self.lock:
+            histogram = self.histograms.get(body)
+            if histogram is None:
+                histogram = self.histograms[body] = Histogram()
+            histogram.record(seconds * 1000000)
+
+    def summary(self):
+        lines = []
+        for body, h in sorted(self.histograms.items()):
+            lines.append(
+                '%s: n=%d mean=%.2fms p50=%.2fms p99=%.2fms max=%.2fms' % (
+                    body, h.count, h.mean / 1000.0, h.percentile(50) / 1000.0,
+                    h.percentile(99) / 1000.0, h.max / 1000.0,
+                ))
+        return '\n'.join(lines)
+
+    def dump(self, f=None):
+        f = f or sys.stderr
+        if self.histograms:
+            f.write(self.summary() + '\n')
+            f.flush()
+
+    def dump_at_exit(self, f=None):
+        atexit.register(self.dump, f)
+
+class TimedFile(object):
+    # Wraps a file to add up how long was spent writing and reading.
+
+    def __init__(self, f):
+        self.f = f
+        self.write_time = 0.0
+        self.read_time = 0.0
+
+    def reset(self):
+        self.write_time = self.read_time = 0.0
+
+    def write(self, data):
+        start = time.perf_counter()
+        try:
+            return self.f.write(data)
+        finally:
+            self.write_time += time.perf_counter() - start
+
+    def flush(self):
+        start = time.perf_counter()
+        try:
+            return self.f.flush()
+        finally:
+            self.write_time += time.perf_counter() - start
+
+    def read(self, n=-1):
+        start = time.perf_counter()
+        try:
+            return self.f.read(n)
+        finally:
+            self.read_time += time.perf_counter() - start
+
+    def close(self):
+        return self.f.close()
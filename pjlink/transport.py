@@ -0,0 +1,144 @@
+import ssl
+
+from pjlink import connection
+
+# How long to wait for a projector to say something before giving up.
+IO_TIMEOUT = 10.0
+
+class Transport(object):
+    """Opens file-like channels to a projector, for Projector to use."""
+
+    # Whether the projector greets us with PJLINK 0/1, and hence whether
+    # Projector.authenticate should be called.
+    greeting = True
+
+    def open(self):
+        raise NotImplementedError
+
+class TCPTransport(Transport):
+    """A plain PJLink connection on TCP port 4352."""
+
+    def __init__(self, host, port=connection.DEFAULT_PORT,
+                 timeout=connection.CONNECT_TIMEOUT, io_timeout=IO_TIMEOUT,
+                 resolver=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.io_timeout = io_timeout
+        self.resolver = resolver
+        # Timing of the most recent connection.
+        self.timing = None
+
+    def connect(self):
+        sock, self.timing = connection.connect(
+            self.host, self.port,
+            timeout=self.timeout, resolver=self.resolver,
+        )
+        sock.settimeout(self.io_timeout)
+        return sock
+
+    def open(self):
+        sock = self.connect()
+        f = sock.makefile('rwb')
+        # The file keeps the socket open until it is closed itself.
+        sock.close()
+        return f
+
+    def __repr__(self):
+        return '%s(%r, %r)' % (type(self).__name__, self.host, self.port)
+
+class TLSTransport(TCPTransport):
+    """PJLink wrapped in TLS, as provided by some secure control gateways."""
+
+    def __init__(self, host, port=connection.DEFAULT_PORT, context=None,
+                 server_hostname=None, **kwargs):
+        super(TLSTransport, self).__init__(host, port, **kwargs)
+        if context is None:
+            context = ssl.create_default_context()
+        self.context = context
+        self.server_hostname = server_hostname or host
+
+    def connect(self):
+        sock = super(TLSTransport, self).connect()
+        return self.context.wrap_socket(
+            sock, server_hostname=self.server_hostname,
+        )
+
+class SerialGatewayTransport(TCPTransport):
+    """
+    A projector's RS-232 port behind a serial-over-IP gateway: the same
+    framing, but with no greeting or authentication.
+    """
+
+    greeting = False
+
+class LoopbackFile(object):
+    # Commands are answered by respond(body, param) when flushed or read.
+
+    def __init__(self, respond, greeting):
+        self.respond = respond
+        self.incoming = bytearray()
+        self.outgoing = bytearray(greeting)
+        # How much of outgoing has been read already.
+        self.pos = 0
+        self.closed = False
+
+    def write(self, data):
+        self.incoming += data
+        return len(data)
+
+    def flush(self):
+        incoming = self.incoming
+        start = 0
+        while True:
+            end = incoming.find(b'\r', start)
+            if end < 0:
+                break
+            assert incoming[start] == ord('%')
+            assert incoming[start + 6] == ord(' ')
+            version = incoming[start + 1:start + 2]
+            body = bytes(incoming[start + 2:start + 6])
+            param = bytes(incoming[start + 7:end])
+            start = end + 1
+
+            self.outgoing += b'%' + version + body + b'=' + \
+                self.respond(body, param) + b'\r'
+        if start:
+            del incoming[:start]
+
+    def read(self, n=-1):
+        if n is None or n < 0 or len(self.outgoing) - self.pos < n:
+            self.flush()
+        end = len(self.outgoing)
+        if n is not None and n >= 0:
+            end = min(end, self.pos + n)
+
+        # Consume by moving an offset, rather than shifting the buffer down.
+        with memoryview(self.outgoing) as view:
+            data = view[self.pos:end].tobytes()
+        self.pos = end
+
+        if self.pos == len(self.outgoing):
+            del self.outgoing[:]
+            self.pos = 0
+        return data
+
+    def close(self):
+        self.closed = True
+
+class LoopbackTransport(Transport):
+    """
+    An in-memory projector. ``respond(body, param)`` takes the raw command
+    and returns the raw response parameter. It can't check passwords, so
+    the greeting is either ``PJLINK 0`` or None.
+    """
+
+    def __init__(self, respond, greeting=b'PJLINK 0\r'):
+        if greeting and greeting != b'PJLINK 0\r':
+            raise ValueError('Unsupported loopback greeting: %r' % greeting)
+        self.respond = respond
+        self.greeting = bool(greeting)
+        self.greeting_data = greeting or b''
+
+    def open(self):
+        return LoopbackFile(self.respond, self.greeting_data)
@@ -22,6 +22,10 @@ setup(
         'appdirs',
         'six',
     ],
+    extras_require={
+        'mqtt': ['paho-mqtt'],
+    },
+    python_requires='>=3.7',
     packages=find_packages(),
     entry_points = {
         'console_scripts': [
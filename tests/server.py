@@ -5,6 +5,7 @@ import socket
 from six.moves import socketserver
 
 from pjlink import projector
+from pjlink import protocol
 
 MAX_PACKET_SIZE = 1024
 
@@ -17,6 +18,18 @@ class FakeProjector(object):
         self.product_name = 'python pjlink'
         self.other_info = 'testing'
 
+        # Class 2 details, only answered if pjlink_class is 2.
+        self.pjlink_class = 1
+        self.serial_number = 'SN12345'
+        self.software_version = '2.0.1'
+        self.lamp_model = 'LMP-42'
+        self.filter_model = 'FLT-7'
+        self.filter_hours = 120
+        self.input_names = {('DIGITAL', 1): 'HDMI 1'}
+        self.input_resolution = '1920x1080'
+        self.recommended_resolution = '1280x800'
+        self.freeze = False
+
         self.power = 'off'
         self.input = ('RGB', 1)
         self.mute_video = False
@@ -142,6 +155,62 @@ class FakeProjector(object):
             assert body == 'INFO'
             return self.other_info
 
+    def handle_class2(self, body, param):
+        if body == 'FREZ':
+            if param == '?':
+                return '1' if self.freeze else '0'
+            if param not in ('0', '1'):
+                return 'ERR2'
+            self.freeze = param == '1'
+            return 'OK'
+        if body == 'INNM':
+            if len(param) != 3 or param[0] != '?':
+                return 'ERR2'
+            source = projector.SOURCE_TYPES_REV.get(param[1])
+            name = self.input_names.get((source, int(param[2])))
+            return 'ERR2' if name is None else name
+        if param != '?':
+            return 'ERR2'
+        return str({
+            'SNUM': self.serial_number,
+            'SVER': self.software_version,
+            'RLMP': self.lamp_model,
+            'RFIL': self.filter_model,
+            'FILT': self.filter_hours,
+            'IRES': self.input_resolution,
+            'RRES': self.recommended_resolution,
+        }[body])
+
+    def handle(self, body, param):
+        if body == 'CLSS':
+            return str(self.pjlink_class)
+        elif body.encode('ascii') in protocol.CLASS2_COMMANDS:
+            if self.pjlink_class < 2:
+                return 'ERR1'
+            return self.handle_class2(body, param)
+        elif body == 'POWR':
+            return self.handle_power(param)
+        elif body == 'INPT':
+            return self.handle_input(param)
+        elif body == 'AVMT':
+            return self.handle_mute(param)
+        elif body == 'ERST':
+            return self.handle_errors(param)
+        elif body == 'LAMP':
+            return self.handle_lamps(param)
+        elif body == 'INST':
+            return self.handle_inputs(param)
+        elif body in ('NAME', 'INF1', 'INF2', 'INFO'):
+            return self.handle_info(body, param)
+        return 'ERR1'
+
+def fake_responder(fp):
+    """Adapts a FakeProjector for use with a LoopbackTransport."""
+    def respond(body, param):
+        response = fp.handle(body.decode('utf-8'), param.decode('utf-8'))
+        return response.encode('utf-8')
+    return respond
+
 class FakeProjectorSession(object):
     def __init__(self, fp, auth=None, small_pjlink=False):
         self.fp = fp
@@ -226,28 +295,14 @@ class FakeProjectorSession(object):
 
         while '\r' in self.stdin:
             command, self.stdin = self.stdin.split('\r', 1)
-            assert command.startswith('%1') and ' ' in command
+            assert command[:2] in ('%1', '%2') and ' ' in command
+            version = command[:2]
             body, param = command[2:].split(' ', 1)
             assert len(body) == 4
 
-            if body == 'POWR':
-                response = self.fp.handle_power(param)
-            elif body == 'INPT':
-                response = self.fp.handle_input(param)
-            elif body == 'AVMT':
-                response = self.fp.handle_mute(param)
-            elif body == 'ERST':
-                response = self.fp.handle_errors(param)
-            elif body == 'LAMP':
-                response = self.fp.handle_lamps(param)
-            elif body == 'INST':
-                response = self.fp.handle_inputs(param)
-            elif body in ('NAME', 'INF1', 'INF2', 'INFO'):
-                response = self.fp.handle_info(body, param)
-            else:
-                response = 'ERR1'
+            response = self.fp.handle(body, param)
 
-            self.stdout += ('%1' + body + '=' + response + '\r').encode('utf-8')
+            self.stdout += (version + body + '=' + response + '\r').encode('utf-8')
 
 def make_request_handler(fp, auth):
     class Handler(socketserver.BaseRequestHandler):
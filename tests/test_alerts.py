@@ -0,0 +1,130 @@
+import pytest
+
+from pjlink import alerts
+from pjlink.poller import Poller
+from pjlink.projector import ERROR_KINDS, Status
+from pjlink.session import SessionPool
+from pjlink.simulator import SimulatedFleet, VirtualClock
+
+def errors(**states):
+    return tuple((kind, states.get(kind, 'ok')) for kind in ERROR_KINDS)
+
+def status(power=None, errors=None, lamps=None):
+    return Status(power, None, None, errors, lamps)
+
+def fired(transitions):
+    return [(t.rule, t.name, t.firing) for t in transitions]
+
+def test_lamp_error_while_on():
+    rule = alerts.error_rule('lamp', 'lamp', ['error'], power='on')
+    engine = alerts.AlertEngine([rule], clock=lambda: 5.0)
+    assert engine.update('a', status('off', errors(lamp='error'))) == []
+    assert engine.update('a', status('on')) == [
+        alerts.Transition('lamp', 'a', True, 5.0),
+    ]
+    # Already firing, so it isn't reported again.
+    assert engine.update('a', status('on', errors(lamp='error'))) == []
+    assert engine.firing() == [('lamp', 'a')]
+    assert fired(engine.update('a', status('cooling'))) == \
+        [('lamp', 'a', False)]
+    assert engine.firing() == []
+
+def test_unknown_fields_wait():
+    rule = alerts.error_rule('lamp', 'lamp', power='on')
+    engine = alerts.AlertEngine([rule])
+    # Without the errors, the rule can't be evaluated yet.
+    assert engine.update('a', status('on')) == []
+    assert engine.evaluations == 0
+    assert fired(engine.update('a', status(errors=errors(lamp='warning')))) \
+        == [('lamp', 'a', True)]
+
+def test_for_polls():
+    rule = alerts.error_rule('filter', 'filter', for_polls=3, clear_polls=2)
+    engine = alerts.AlertEngine([rule])
+    warning = status(errors=errors(filter='warning'))
+    ok = status(errors=errors())
+
+    assert engine.update('a', warning) == []
+    assert engine.update('a', warning) == []
+    # A good poll starts the count again.
+    assert engine.update('a', ok) == []
+    assert engine.update('a', warning) == []
+    assert engine.update('a', warning) == []
+    assert fired(engine.update('a', warning)) == [('filter', 'a', True)]
+    assert engine.update('a', warning) == []
+
+    assert engine.update('a', ok) == []
+    assert fired(engine.update('a', ok)) == [('filter', 'a', False)]
+    # Polls that didn't include the rule's fields don't count.
+    assert engine.update('a', warning) == []
+    assert engine.update('a', status('on')) == []
+    assert engine.update('a', warning) == []
+    assert fired(engine.update('a', warning)) == [('filter', 'a', True)]
+
+def test_lamp_life_hysteresis():
+    rule = alerts.lamp_life_rule('lamp-life', rated=2000)
+    engine = alerts.AlertEngine([rule])
+    assert engine.update('a', status(lamps=((1799, True),))) == []
+    assert fired(engine.update('a', status(lamps=((1800, True),)))) == \
+        [('lamp-life', 'a', True)]
+    # Dropping back under 90% isn't enough to clear it...
+    assert engine.update('a', status(lamps=((1750, True),))) == []
+    # ...but a new lamp is.
+    assert fired(engine.update('a', status(lamps=((0, True),)))) == \
+        [('lamp-life', 'a', False)]
+
+def test_only_affected_rules_evaluated():
+    rules = [
+        alerts.error_rule('%s-%d' % (kind, i), kind)
+        for kind in ERROR_KINDS for i in range(10)
+    ] + [alerts.lamp_life_rule('lamp-life', rated=2000)]
+    engine = alerts.AlertEngine(rules)
+    for i in range(100):
+        engine.update('p%d' % i, status('on', errors(), ((10, True),)))
+    assert engine.evaluations == 100 * len(rules)
+
+    # Unchanged polls evaluate nothing, however many rules there are.
+    engine.evaluations = 0
+    for i in range(100):
+        engine.update('p%d' % i, status('on', errors(), ((10, True),)))
+    assert engine.evaluations == 0
+
+    # Lamp hours going up only touch the lamp rule.
+    for i in range(100):
+        engine.update('p%d' % i, status('on', errors(), ((11, True),)))
+    assert engine.evaluations == 100
+
+def test_on_transition():
+    rule = alerts.error_rule('fan', 'fan')
+    engine = alerts.AlertEngine([rule])
+    seen = []
+    engine.on_transition = seen.append
+    engine.update('a', status(errors=errors(fan='error')))
+    engine.update('b', status(errors=errors()))
+    assert fired(seen) == [('fan', 'a', True)]
+
+    engine.forget('a')
+    assert engine.firing() == []
+
+def test_bad_rule():
+    with pytest.raises(ValueError):
+        alerts.make_rule('x', ('lamp_hours',), bool)
+
+def test_poller():
+    clock = VirtualClock()
+    fleet = SimulatedFleet(clock, ['p0', 'p1'])
+    pool = SessionPool(fleet.inventory, fleet.make_transport)
+    engine = alerts.AlertEngine(
+        [alerts.error_rule('lamp', 'lamp', ['error'], power='on')],
+        clock=clock.time)
+    poller = Poller(['p0', 'p1'], pool.get, clock=clock.time)
+    poller.on_status = engine.on_status
+
+    fleet['p1'].handle('POWR', '1')
+    fleet['p1'].add_fault(0, 'lamp', 'error')
+    poller.poll_once()
+    assert engine.firing() == []
+    clock.advance(60)
+    poller.poll_once(clock.time())
+    assert engine.firing() == [('lamp', 'p1')]
+    poller.close()
@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+
+import pytest
+
+from pjlink import audit
+from pjlink.inventory import Inventory, make_entry
+from pjlink.projector import Projector, ProjectorError
+from pjlink.session import SessionPool
+from pjlink.transport import LoopbackTransport
+
+from server import FakeProjector, fake_responder
+
+def read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_projector_audit(tmpdir):
+    path = str(tmpdir.join('audit.log'))
+    log = audit.AuditLog(path)
+    fp = FakeProjector()
+    p = Projector(
+        LoopbackTransport(fake_responder(fp)).open(),
+        audit=log, device='room-101',
+    )
+    p.authenticate(None)
+    p.set_power('on')
+    p.get_power()
+    fp.handle_input = lambda param: 'ERR2'
+    with pytest.raises(ProjectorError):
+        p.set_input('RGB', 1)
+    log.close()
+
+    records = read_lines(path)
+    assert [(r['device'], r['command'], r['param'], r['result'])
+            for r in records] == [
+        ('room-101', 'POWR', '1', 'OK'),
+        ('room-101', 'INPT', '11', 'out of parameter'),
+    ]
+    assert records[0]['time'].endswith('Z')
+
+def test_pool_audit(tmpdir):
+    path = str(tmpdir.join('audit.log'))
+    log = audit.AuditLog(path)
+    fp = FakeProjector()
+    pool = SessionPool(
+        Inventory([make_entry('a', 'host')]),
+        lambda entry: LoopbackTransport(fake_responder(fp)),
+        audit=log,
+    )
+    pool.get('a').set_power('on')
+    pool.close()
+    log.close()
+    assert [r['device'] for r in read_lines(path)] == ['a']
+
+def test_batching_and_rotation(tmpdir):
+    path = str(tmpdir.join('audit.log'))
+    log = audit.AuditLog(path, max_bytes=2000, backups=2, batch=10)
+    threads = [
+        threading.Thread(target=lambda i=i: [
+            log.record('p%d' % i, 'POWR', '1', 'OK') for _ in range(50)
+        ])
+        for i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    log.close()
+
+    assert log.written == 200 and log.error is None
+    assert sorted(os.listdir(str(tmpdir))) == \
+        ['audit.log', 'audit.log.1', 'audit.log.2']
+    assert os.path.getsize(path + '.1') >= 2000
+
+def test_backpressure(tmpdir):
+    log = audit.AuditLog(
+        str(tmpdir.join('audit.log')), max_queue=1, block=False,
+    )
+    # Hold the writer up, so the queue fills.
+    go = threading.Event()
+    write = log._write
+    log._write = lambda records: (go.wait(), write(records))
+    for i in range(20):
+        log.record('p', 'POWR', '1', 'OK')
+    go.set()
+    log.close()
+    assert log.dropped > 0
+    assert log.dropped + log.written == 20
+
+def test_records_racing_close(tmpdir):
+    path = str(tmpdir.join('audit.log'))
+    log = audit.AuditLog(path)
+    go = threading.Event()
+    write = log._write
+    log._write = lambda records: (go.wait(), write(records))
+    log.record('p', 'POWR', '1', 'OK')
+    # As if a record() had got in just after close() queued its stop.
+    log.queue.put(audit._STOP)
+    log.queue.put(audit.Record(0, 'p', 'POWR', '0', 'OK'))
+    go.set()
+    log.thread.join()
+    assert log.written == 2 and log.error is None
+
+    log.close()
+    # Once closed, records go nowhere rather than blocking.
+    log.record('p', 'POWR', '1', 'OK')
+    assert log.dropped == 1
+    assert len(read_lines(path)) == 2
@@ -0,0 +1,43 @@
+import pytest
+
+from pjlink import bench
+from pjlink.projector import Projector
+from pjlink.transport import LoopbackTransport
+
+from server import FakeProjector, fake_responder
+
+def test_parse_mix():
+    assert bench.parse_mix('POWR:2,erst,INPT=31') == [
+        ('POWR', '?'), ('POWR', '?'), ('ERST', '?'), ('INPT', '31'),
+    ]
+    with pytest.raises(ValueError):
+        bench.parse_mix('POW')
+
+def open_fake(fp):
+    p = Projector(LoopbackTransport(fake_responder(fp)).open())
+    p.authenticate(None)
+    return p
+
+def test_run():
+    fps = [FakeProjector(), FakeProjector()]
+    # This projector is having a bad day.
+    fps[1].handle_errors = lambda param: 'ERR4'
+
+    result = bench.run(
+        open_fake, fps, bench.parse_mix('POWR,ERST'),
+        duration=0.2, concurrency=2,
+    )
+    assert result.count > 0
+    assert set(result.errors) == set(['ERR4'])
+    # Half the commands are ERST, and half of those go to the bad one.
+    assert 0.1 < result.error_rate('ERR4') < 0.4
+    assert 0 <= result.percentile(50) <= result.percentile(99)
+    assert 'throughput:' in result.report()
+
+def test_run_rate():
+    result = bench.run(
+        open_fake, [FakeProjector()], bench.parse_mix('POWR'),
+        duration=0.5, rate=40,
+    )
+    assert result.count == 20
+    assert not result.errors
@@ -0,0 +1,189 @@
+import json
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from pjlink import cluster
+from pjlink.poller import Poller
+from pjlink.session import SessionPool
+from pjlink.simulator import SimulatedFleet, VirtualClock
+
+NAMES = ['room%d' % i for i in range(60)]
+
+def test_ring():
+    ring = cluster.HashRing(['a', 'b', 'c'])
+    before = dict((name, ring.owner(name)) for name in NAMES)
+    shares = [list(before.values()).count(node) for node in 'abc']
+    assert min(shares) >= 10
+
+    # Only c's projectors move when it goes.
+    ring.remove('c')
+    for name in NAMES:
+        if before[name] != 'c':
+            assert ring.owner(name) == before[name]
+        assert ring.owner(name) in ('a', 'b')
+    ring.add('c')
+    assert dict((name, ring.owner(name)) for name in NAMES) == before
+    assert cluster.HashRing().owner('room1') is None
+
+def test_leases(tmpdir):
+    store = cluster.FileLeaseStore(str(tmpdir))
+    assert store.heartbeat('a', 10, now=0) == ['a']
+    assert store.heartbeat('b', 10, now=5) == ['a', 'b']
+    assert store.acquire('a', ['x', 'y'], 10, now=5) == {'x', 'y'}
+    assert store.acquire('b', ['y', 'z'], 10, now=5) == {'z'}
+    # Renewing, and letting go of x.
+    assert store.acquire('a', ['y'], 10, now=12) == {'y'}
+    assert store.leases() == {'y': ('a', 22), 'z': ('b', 15)}
+    # a has stopped beating, so only b is alive; its leases run out later.
+    assert store.heartbeat('b', 10, now=16) == ['b']
+    assert store.acquire('b', ['y'], 10, now=16) == set()
+    assert store.acquire('b', ['y'], 10, now=22) == {'y'}
+
+    store.leave('b')
+    assert store.leases() == {}
+    assert store.heartbeat('c', 10, now=30) == ['c']
+
+def make_node(name, store, fleet, clock, polled):
+    pool = SessionPool(fleet.inventory, fleet.make_transport)
+    poller = Poller([], pool.get, fields=('power',), clock=clock.time)
+    node = cluster.ClusterNode(
+        name, NAMES, store, poller, ttl=15, max_poll=2, clock=clock.time)
+
+    def on_status(device, status, changed):
+        # Only what it holds a lease on gets polled.
+        assert device in node.held
+        polled.append((name, device))
+
+    poller.on_status = on_status
+    return node
+
+def check_exclusive(nodes):
+    owned = [node.held for node in nodes]
+    for i, held in enumerate(owned):
+        for other in owned[i + 1:]:
+            assert not held & other
+
+def test_nodes(tmpdir):
+    clock = VirtualClock(1000)
+    fleet = SimulatedFleet(clock, NAMES)
+    store = cluster.FileLeaseStore(str(tmpdir))
+    polled = []
+    nodes = [make_node(name, store, fleet, clock, polled) for name in 'abc']
+
+    def run(nodes, seconds):
+        for _ in range(seconds):
+            for node in nodes:
+                node.run_once()
+                check_exclusive(nodes)
+            clock.advance(1)
+
+    run(nodes, 30)
+    assert set().union(*(node.held for node in nodes)) == set(NAMES)
+    assert all(len(node.held) >= 10 for node in nodes)
+    assert set(device for _, device in polled) == set(NAMES)
+
+    # c dies; once its leases run out, a and b share everything.
+    dead = nodes.pop()
+    lost = set(dead.held)
+    del polled[:]
+    run(nodes, 30)
+    assert set().union(*(node.held for node in nodes)) == set(NAMES)
+    assert lost <= set(device for _, device in polled)
+
+    # A node leaving hands its projectors over on the next beat.
+    nodes[1].leave()
+    run(nodes[:1], 6)
+    assert nodes[0].held == set(NAMES)
+
+def test_store_unreachable(tmpdir):
+    clock = VirtualClock(1000)
+    fleet = SimulatedFleet(clock, NAMES[:3])
+    store = cluster.FileLeaseStore(str(tmpdir))
+    node = make_node('a', store, fleet, clock, [])
+    node.names = NAMES[:3]
+    assert node.beat() == set(NAMES[:3])
+
+    store.path = str(tmpdir.join('missing', 'cluster.json'))
+    clock.advance(5)
+    # The leases are still good for a while...
+    assert node.beat() == set(NAMES[:3])
+    clock.advance(7)
+    # ...but not once a poll started now might outlast them.
+    assert node.beat() == set()
+    assert node.poller.devices == {}
+
+def test_no_polls_past_lease(tmpdir):
+    clock = VirtualClock(1000)
+    fleet = SimulatedFleet(clock, NAMES[:1])
+    store = cluster.FileLeaseStore(str(tmpdir))
+    node = make_node('a', store, fleet, clock, [])
+    node.names = NAMES[:1]
+    node.beat()
+    assert node.safe_until == 1012
+
+    # The store is gone, so the lease can't be renewed.
+    store.path = str(tmpdir.join('missing', 'cluster.json'))
+    clock.advance(11.5)
+    node.run_once()
+    while node.poller.inflight:
+        node.poller.finish(timeout=None)
+    assert node.poller.polls == 1
+    # Close to the end of the lease, polls stop being started at all.
+    clock.advance(0.5)
+    node.run_once()
+    assert node.held == set() and not node.poller.inflight
+
+def test_lease_margin():
+    with pytest.raises(ValueError):
+        cluster.ClusterNode('a', [], None, None, ttl=15)
+
+def test_dropped_after_poll(tmpdir):
+    # A projector handed over mid-poll isn't released until it's answered.
+    clock = VirtualClock(1000)
+    fleet = SimulatedFleet(clock, NAMES[:1])
+    store = cluster.FileLeaseStore(str(tmpdir))
+    node = make_node('a', store, fleet, clock, [])
+    node.names = NAMES[:1]
+    node.beat()
+    go = threading.Event()
+    get = node.poller.open_projector
+    node.poller.open_projector = lambda name: (go.wait(), get(name))[1]
+    node.poller.start_due()
+
+    threading.Timer(0.05, go.set).start()
+    node.leave()
+    assert go.is_set()
+    assert store.leases() == {}
+
+def test_no_fcntl(monkeypatch, tmpdir):
+    monkeypatch.setattr(cluster, 'fcntl', None)
+    with pytest.raises(ImportError):
+        cluster.FileLeaseStore(str(tmpdir))
+
+SCRIPT = '''
+import json, sys
+from pjlink.cluster import FileLeaseStore
+held = FileLeaseStore(sys.argv[1]).acquire(
+    sys.argv[2], json.loads(sys.argv[3]), 60, 0)
+print(json.dumps(sorted(held)))
+'''
+
+def test_processes(tmpdir):
+    # Several processes at once; each lease goes to exactly one of them.
+    procs = [
+        subprocess.Popen(
+            [sys.executable, '-c', SCRIPT, str(tmpdir), node,
+             json.dumps(NAMES)],
+            stdout=subprocess.PIPE,
+        )
+        for node in 'abcd'
+    ]
+    held = [set(json.loads(proc.communicate()[0])) for proc in procs]
+    assert sum(len(names) for names in held) == len(NAMES)
+    assert set().union(*held) == set(NAMES)
+    leases = cluster.FileLeaseStore(str(tmpdir)).leases()
+    for node, names in zip('abcd', held):
+        assert all(leases[name][0] == node for name in names)
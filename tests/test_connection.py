@@ -0,0 +1,107 @@
+import socket
+
+import pytest
+
+from pjlink import connection
+
+def info(family, addr):
+    return (family, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', addr)
+
+def test_interleave():
+    v6 = [info(socket.AF_INET6, ('::%d' % i, 1, 0, 0)) for i in range(3)]
+    v4 = [info(socket.AF_INET, ('10.0.0.%d' % i, 1)) for i in range(2)]
+
+    assert connection.interleave(v6 + v4) == [
+        v6[0], v4[0], v6[1], v4[1], v6[2],
+    ]
+    assert connection.interleave(v4 + v6)[:2] == [v4[0], v6[0]]
+
+def test_resolver_cache(monkeypatch):
+    calls = []
+    now = [0]
+
+    def getaddrinfo(host, port, *args):
+        calls.append(host)
+        if host == 'missing':
+            raise socket.gaierror('no such host')
+        return [info(socket.AF_INET, ('10.0.0.1', port))]
+
+    monkeypatch.setattr(socket, 'getaddrinfo', getaddrinfo)
+    resolver = connection.Resolver(ttl=10, negative_ttl=5, clock=lambda: now[0])
+
+    assert resolver.resolve('proj') == resolver.resolve('proj')
+    assert calls == ['proj']
+
+    # Failures are remembered too, and raised afresh each time.
+    errors = []
+    for i in range(2):
+        with pytest.raises(socket.gaierror) as e:
+            resolver.resolve('missing')
+        errors.append(e.value)
+    assert calls == ['proj', 'missing']
+    assert errors[0] is not errors[1] and errors[0].args == errors[1].args
+
+    # Until they expire.
+    now[0] = 6
+    with pytest.raises(socket.gaierror):
+        resolver.resolve('missing')
+    resolver.resolve('proj')
+    assert calls == ['proj', 'missing', 'missing']
+
+    now[0] = 11
+    resolver.resolve('proj')
+    assert calls == ['proj', 'missing', 'missing', 'proj']
+
+def listener():
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    return server
+
+def closed_port():
+    # Bind without listening, so connections are refused.
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    return s
+
+class FixedResolver(object):
+    def __init__(self, *addrs):
+        self.infos = [info(socket.AF_INET, addr) for addr in addrs]
+
+    def resolve(self, host, port):
+        return self.infos
+
+def test_connect():
+    server = listener()
+    try:
+        sock, timing = connection.connect(*server.getsockname())
+        assert timing.address == server.getsockname()
+        assert timing.resolve >= 0 and timing.connect >= 0
+        sock.close()
+    finally:
+        server.close()
+
+def test_connect_skips_dead_addresses():
+    server, dead = listener(), closed_port()
+    try:
+        resolver = FixedResolver(dead.getsockname(), server.getsockname())
+        sock, timing = connection.connect(
+            'proj', delay=10, timeout=2, resolver=resolver,
+        )
+        # A refused address moves straight on to the next, without delay.
+        assert timing.address == server.getsockname()
+        assert timing.connect < 5
+        sock.close()
+    finally:
+        server.close()
+        dead.close()
+
+def test_connect_fails():
+    dead = closed_port()
+    try:
+        with pytest.raises(OSError):
+            connection.connect(
+                'proj', resolver=FixedResolver(dead.getsockname()),
+            )
+    finally:
+        dead.close()
@@ -162,3 +162,34 @@ def test_errors():
         'other: error\n'
         'temperature: warning\n'
     )
+
+def test_profile():
+    fp = FakeProjector()
+    with fake_projection_server(fp) as addr:
+        p = start_cli('-p', '%s:%d' % addr, '--profile', 'power')
+    assert p.wait() == 0
+    assert p.stdout.read() == b'off\n'
+    stderr = p.stderr.read().decode('utf-8')
+    assert stderr.startswith('resolve: ') and '\nconnect: ' in stderr
+    assert '\nauth: ' in stderr and '\nread: ' in stderr
+    assert '\nPOWR: n=1 ' in stderr
+
+def test_bench():
+    fp = FakeProjector()
+    with fake_projection_server(fp) as addr:
+        p = start_cli(
+            '-p', '%s:%d' % addr, 'bench', '--duration', '0.3',
+            '--mix', 'POWR,LAMP',
+        )
+    stdout = finish_cli(p)
+    assert stdout.startswith('commands: ')
+    assert 'errors: none\n' in stdout
+    assert 'latency: p50 ' in stdout
+
+def test_ping():
+    fp = FakeProjector()
+    with fake_projection_server(fp) as addr:
+        p = start_cli('-p', '%s:%d' % addr, 'ping')
+    stdout = finish_cli(p)
+    assert stdout.startswith('%s:%d: ' % addr)
+    assert stdout.endswith(' ms (no password)\n')
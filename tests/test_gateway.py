@@ -0,0 +1,159 @@
+import asyncio
+import json
+
+from pjlink.gateway import Gateway
+from pjlink.inventory import Inventory, make_entry
+from pjlink.session import SessionPool
+from pjlink.transport import LoopbackTransport
+
+from server import FakeProjector, fake_responder
+
+def make_gateway(n=3, **kwargs):
+    fps = dict(('p%d' % i, FakeProjector()) for i in range(n))
+    queries = []
+
+    def make_transport(entry):
+        fp = fps[entry.name]
+        if getattr(fp, 'unreachable', False):
+            raise OSError('no route to host')
+        respond = fake_responder(fp)
+        def counting(body, param):
+            queries.append((entry.name, body))
+            return respond(body, param)
+        return LoopbackTransport(counting)
+
+    inventory = Inventory([
+        make_entry(name, 'host', room='10%d' % i, tags='lab' if i else '')
+        for i, name in enumerate(sorted(fps))
+    ])
+    gateway = Gateway(SessionPool(inventory, make_transport), **kwargs)
+    return gateway, fps, queries
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+def test_status():
+    now = [0.0]
+    gateway, fps, queries = make_gateway(clock=lambda: now[0])
+    status, response = run(gateway.handle('GET', '/projectors/p0'))
+    assert status == 200
+    assert response['power'] == 'off'
+    assert response['errors']['lamp'] == 'ok'
+    assert response['lamps'] == [{'hours': 42, 'on': False}]
+
+    # Served from the cache until it expires.
+    erst = queries.count(('p0', b'ERST'))
+    assert run(gateway.handle('GET', '/projectors/p0/power')) == \
+        (200, {'power': 'off'})
+    assert queries.count(('p0', b'ERST')) == erst
+    now[0] += 5
+    run(gateway.handle('GET', '/projectors/p0/power'))
+    assert queries.count(('p0', b'ERST')) == erst + 1
+
+    assert run(gateway.handle('GET', '/projectors/nope'))[0] == 404
+    assert run(gateway.handle('GET', '/projectors/p0/nope'))[0] == 404
+    assert run(gateway.handle('GET', '/elsewhere'))[0] == 404
+    gateway.close()
+
+def test_coalescing():
+    gateway, fps, queries = make_gateway()
+
+    async def many():
+        return await asyncio.gather(*[
+            gateway.handle('GET', '/projectors/p1') for _ in range(50)
+        ])
+
+    results = run(many())
+    assert all(status == 200 for status, _ in results)
+    assert queries.count(('p1', b'ERST')) == 1
+    gateway.close()
+
+def test_set():
+    gateway, fps, queries = make_gateway()
+    assert run(gateway.handle('GET', '/projectors/p0'))[1]['power'] == 'off'
+    assert run(gateway.handle(
+        'PUT', '/projectors/p0/power', b'{"state": "on"}',
+    )) == (200, {'ok': True})
+    # Setting drops the cached status.
+    assert run(gateway.handle('GET', '/projectors/p0'))[1]['power'] == \
+        'warm-up'
+
+    fps['p0'].power = 'on'
+    assert run(gateway.handle(
+        'POST', '/projectors/p0/input', b'{"source": "RGB", "number": 2}',
+    ))[0] == 200
+    assert fps['p0'].input == ('RGB', 2)
+    assert run(gateway.handle(
+        'PUT', '/projectors/p0/mute', b'{"video": true, "audio": true}',
+    ))[0] == 200
+    assert fps['p0'].mute_video and fps['p0'].mute_audio
+
+    for body in (b'{"state": "maybe"}', b'[]', b'nonsense', b'{}'):
+        assert run(gateway.handle('PUT', '/projectors/p0/power', body))[0] \
+            == 400
+    assert run(gateway.handle('DELETE', '/projectors/p0/power'))[0] == 405
+
+    # Errors from the projector itself.
+    fps['p0'].handle_power = lambda param: 'ERR3'
+    status, response = run(gateway.handle(
+        'PUT', '/projectors/p0/power', b'{"state": "off"}',
+    ))
+    assert status == 502 and response == {'error': 'unavailable time'}
+    gateway.close()
+
+def test_fleet():
+    gateway, fps, queries = make_gateway(4)
+    fps['p2'].power = 'on'
+    fps['p3'].unreachable = True
+
+    status, response = run(gateway.handle('GET', '/projectors?tag=lab'))
+    assert status == 200
+    assert sorted(response['projectors']) == ['p1', 'p2']
+    assert response['failed'] == {'p3': 'no route to host'}
+
+    status, response = run(gateway.handle('GET', '/projectors?power=on'))
+    assert sorted(response['projectors']) == ['p2']
+    status, response = run(gateway.handle('GET', '/projectors?room=101'))
+    assert sorted(response['projectors']) == ['p1']
+
+    status, response = run(gateway.handle('GET', '/projectors?input=RGB'))
+    assert 'p1' in response['projectors']
+    # Input can't be read (e.g. it's off), so it no longer matches.
+    fps['p1'].handle_input = lambda param: 'ERR3'
+    status, response = run(
+        gateway.handle('GET', '/projectors?input=RGB&fresh=1'))
+    assert 'p1' not in response['projectors']
+    assert 'p0' in response['projectors']
+
+    assert run(gateway.handle('GET', '/projectors?colour=red'))[0] == 400
+    assert run(gateway.handle('GET', '/projectors?power=dim'))[0] == 400
+    gateway.close()
+
+def test_http():
+    gateway, fps, queries = make_gateway()
+
+    async def session():
+        server = await gateway.start('localhost', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('localhost', port)
+
+        body = b'{"state": "on"}'
+        writer.write(
+            b'PUT /projectors/p1/power HTTP/1.1\r\nHost: x\r\n'
+            b'Content-Length: %d\r\n\r\n' % len(body) + body +
+            b'GET /projectors/p1/power HTTP/1.1\r\nConnection: close\r\n\r\n'
+        )
+        data = await reader.read()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return data
+
+    data = run(session()).decode('utf-8')
+    first, second = data.split('HTTP/1.1 ')[1:]
+    assert first.startswith('200 OK\r\n')
+    assert 'Connection: keep-alive' in first
+    assert second.startswith('200 OK\r\n')
+    assert 'Connection: close' in second
+    assert json.loads(second.split('\r\n\r\n')[1]) == {'power': 'warm-up'}
+    gateway.close()
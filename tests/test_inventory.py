@@ -0,0 +1,134 @@
+import json
+import os
+
+import pytest
+
+from pjlink import inventory
+
+INI = '''\
+[default]
+host = 192.168.1.100
+password = panasonic
+
+[lt1]
+host = lt1.example.com
+port = 4353
+tags = lecture, hdmi
+building = A
+floor = 1
+room = A101
+
+[lt2]
+host = lt2.example.com
+tags = lecture
+building = A
+floor = 2
+room = A201
+'''
+
+def write(tmpdir, name, data):
+    path = os.path.join(str(tmpdir), name)
+    with open(path, 'w') as f:
+        f.write(data)
+    return path
+
+def test_ini(tmpdir):
+    inv = inventory.load(write(tmpdir, 'pjlink.conf', INI))
+
+    assert len(inv) == 3
+    assert [entry.name for entry in inv] == ['default', 'lt1', 'lt2']
+
+    default = inv['default']
+    assert (default.host, default.port, default.password) == \
+        ('192.168.1.100', 4352, 'panasonic')
+    assert default.tags == frozenset() and default.building is None
+
+    lt1 = inv['lt1']
+    assert (lt1.host, lt1.port, lt1.password) == ('lt1.example.com', 4353, None)
+    assert lt1.tags == frozenset(['lecture', 'hdmi'])
+    assert (lt1.building, lt1.floor, lt1.room) == ('A', '1', 'A101')
+
+    assert 'lt2' in inv and 'lt3' not in inv
+    with pytest.raises(KeyError):
+        inv['lt3']
+
+def test_json(tmpdir):
+    data = {'projectors': [
+        {'name': 'p%d' % i, 'host': '10.0.0.%d' % i,
+         'tags': ['even' if i % 2 == 0 else 'odd'],
+         'building': 'B', 'floor': str(i // 10)}
+        for i in range(100)
+    ]}
+    inv = inventory.load(write(tmpdir, 'fleet.json', json.dumps(data)))
+
+    assert len(inv) == 100
+    assert inv['p42'].host == '10.0.0.42'
+    assert inv.tags() == ['even', 'odd']
+
+    selected = inv.select(tags=['odd'], floor='3')
+    assert [entry.name for entry in selected] == \
+        ['p31', 'p33', 'p35', 'p37', 'p39']
+
+def test_select(tmpdir):
+    inv = inventory.load(write(tmpdir, 'pjlink.conf', INI))
+
+    assert inv.select() == inv.entries
+    assert [e.name for e in inv.select(tags=['lecture'])] == ['lt1', 'lt2']
+    assert [e.name for e in inv.select(tags=['lecture', 'hdmi'])] == ['lt1']
+    assert [e.name for e in inv.select(building='A', floor='2')] == ['lt2']
+    assert inv.select(tags=['missing']) == ()
+    assert inv.select(tags=['lecture'], room='B101') == ()
+
+def test_duplicates():
+    entry = inventory.make_entry('p', 'host')
+    with pytest.raises(ValueError):
+        inventory.Inventory([entry, entry])
+
+def test_load_inventory_shared(tmpdir):
+    path = write(tmpdir, 'pjlink.conf', INI)
+
+    inv = inventory.load_inventory(path)
+    assert inventory.load_inventory(path) is inv
+
+    # Changes on disk are picked up.
+    write(tmpdir, 'pjlink.conf', INI + '\n[lt3]\nhost = lt3\n')
+    os.utime(path, (0, 0))
+    reloaded = inventory.load_inventory(path)
+    assert reloaded is not inv and 'lt3' in reloaded
+
+def test_ini_invalid_sections(tmpdir):
+    path = write(tmpdir, 'pjlink.conf', INI + (
+        '\n[nohost]\nport = 4352\n'
+        '\n[badport]\nhost = x\nport = abc\n'
+        '\n[percent]\nhost = y\npassword = 100%\n'
+    ))
+    inv = inventory.load(path)
+
+    # The rest of the file is still usable.
+    assert inv['default'].host == '192.168.1.100'
+    assert inv['percent'].password == '100%'
+
+    with pytest.raises(ValueError) as e:
+        inv['nohost']
+    assert e.value.args == ('Projector nohost has no host',)
+    with pytest.raises(ValueError):
+        inv['badport']
+    assert 'nohost' not in inv
+
+def test_json_invalid_entries(tmpdir):
+    data = [
+        {'name': 'good', 'host': 'x', 'notes': 'by the window'},
+        {'name': 'nohost', 'port': 4352},
+        {'name': 'badport', 'host': 'y', 'port': 'abc'},
+    ]
+    inv = inventory.load(write(tmpdir, 'fleet.json', json.dumps(data)))
+
+    # The rest of the file is still usable.
+    assert inv['good'].host == 'x'
+    assert len(inv) == 1
+
+    with pytest.raises(ValueError) as e:
+        inv['nohost']
+    assert e.value.args == ('Projector nohost has no host',)
+    with pytest.raises(ValueError):
+        inv['badport']
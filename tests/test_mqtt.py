@@ -0,0 +1,194 @@
+import json
+
+import pytest
+
+from pjlink import mqtt
+from pjlink.poller import Poller
+from pjlink.projector import MUTE_AUDIO, MUTE_VIDEO
+from pjlink.session import SessionPool
+from pjlink.simulator import SimulatedFleet, VirtualClock
+
+class Broker(object):
+    """A stand-in MQTT broker, which delivers messages synchronously."""
+
+    def __init__(self):
+        self.retained = {}
+        self.log = []
+        self.subscriptions = []
+
+    def publish(self, topic, payload, retain=False):
+        self.log.append((topic, payload))
+        if retain:
+            self.retained[topic] = payload
+        for pattern, handler in self.subscriptions:
+            if mqtt.topic_matches(pattern, topic):
+                handler(topic, payload)
+
+    def subscribe(self, pattern, handler):
+        self.subscriptions.append((pattern, handler))
+
+def test_topic_matches():
+    assert mqtt.topic_matches('a/+/set/+', 'a/room/set/power')
+    assert not mqtt.topic_matches('a/+/set/+', 'a/room/power')
+    assert not mqtt.topic_matches('a/+', 'a/room/power')
+    assert mqtt.topic_matches('a/#', 'a/room/power')
+
+def test_parse_command():
+    both = MUTE_VIDEO | MUTE_AUDIO
+    assert mqtt.parse_command('power', 'on') == [('set_power', ('on',))]
+    assert mqtt.parse_command('input', 'digital 2') == \
+        [('set_input', ('DIGITAL', 2))]
+    assert mqtt.parse_command('input', 'RGB') == [('set_input', ('RGB', 1))]
+    assert mqtt.parse_command('mute', 'off') == [('set_mute', (both, False))]
+    assert mqtt.parse_command('mute', '{"audio": true}') == \
+        [('set_mute', (MUTE_AUDIO, True))]
+    assert mqtt.parse_command('mute', '{"video": true, "audio": false}') == [
+        ('set_mute', (MUTE_VIDEO, True)), ('set_mute', (MUTE_AUDIO, False)),
+    ]
+    for field, payload in [('power', 'dim'), ('input', 'HDMI'),
+                           ('mute', '{}'), ('mute', 'loud'), ('lens', '1')]:
+        with pytest.raises(ValueError):
+            mqtt.parse_command(field, payload)
+
+def make_bridge():
+    clock = VirtualClock()
+    fleet = SimulatedFleet(clock, ['a', 'b'], warm_up=10)
+    pool = SessionPool(fleet.inventory, fleet.make_transport, max_idle=1e9)
+    broker = Broker()
+    bridge = mqtt.Bridge(pool, broker, prefix='site')
+    bridge.start()
+    return clock, fleet, pool, broker, bridge
+
+def command(broker, bridge, topic, payload):
+    broker.publish(topic, payload)
+    # Wait for the command to be carried out.
+    bridge.executor.submit(lambda: None).result()
+
+def test_state_published_on_change():
+    clock, fleet, pool, broker, bridge = make_bridge()
+    poller = Poller(['a', 'b'], pool.get, clock=clock.time)
+    poller.on_status = bridge.on_status
+    poller.on_error = bridge.on_error
+
+    poller.poll_once()
+    assert broker.retained['site/a/power'] == 'off'
+    assert broker.retained['site/a/online'] == 'true'
+    assert json.loads(broker.retained['site/b/lamps']) == \
+        [{'hours': 0, 'on': False}]
+    published = len(broker.log)
+
+    # Nothing changed, so nothing more is sent.
+    clock.advance(100)
+    poller.poll_once(clock.time())
+    assert len(broker.log) == published
+
+    fleet['a'].handle('POWR', '1')
+    clock.advance(100)
+    poller.poll_once(clock.time())
+    changes = dict(broker.log[published:])
+    assert changes['site/a/power'] == 'on'
+    assert all(topic.startswith('site/a/') for topic in changes)
+    poller.close()
+
+def test_commands():
+    clock, fleet, pool, broker, bridge = make_bridge()
+    command(broker, bridge, 'site/a/set/power', 'on')
+    assert fleet['a'].power() == 'warm-up'
+    # The new state is published straight away.
+    assert broker.retained['site/a/power'] == 'warm-up'
+
+    # Input can't be changed while warming up.
+    command(broker, bridge, 'site/a/set/input', 'DIGITAL 2')
+    assert broker.log[-1] == ('site/a/error', 'unavailable time')
+
+    clock.advance(10)
+    command(broker, bridge, 'site/a/set/input', 'DIGITAL 2')
+    command(broker, bridge, 'site/a/set/mute', '{"video": true}')
+    assert broker.retained['site/a/input'] == 'DIGITAL 2'
+    assert json.loads(broker.retained['site/a/mute']) == \
+        {'video': True, 'audio': False}
+
+    command(broker, bridge, 'site/a/set/power', 'maybe')
+    assert broker.log[-1] == ('site/a/error', 'Invalid power: maybe')
+    command(broker, bridge, 'site/zz/set/power', 'on')
+    assert broker.log[-1] == ('site/zz/error', 'No such projector: zz')
+    # Our own state topics aren't commands.
+    command(broker, bridge, 'site/b/power', 'on')
+    assert fleet['b'].power() == 'off'
+    bridge.close()
+
+def test_unreachable():
+    clock, fleet, pool, broker, bridge = make_bridge()
+
+    def broken(entry):
+        raise OSError('no route to host')
+
+    pool.make_transport = broken
+    command(broker, bridge, 'site/a/set/power', 'on')
+    assert broker.retained['site/a/online'] == 'false'
+    assert broker.log[1] == ('site/a/error', 'Unreachable: no route to host')
+    bridge.close()
+
+def test_paho_missing(monkeypatch):
+    monkeypatch.setattr(mqtt, 'paho', None)
+    with pytest.raises(ImportError):
+        mqtt.PahoClient.connect('localhost')
+
+class FakePaho(object):
+    """Stands in for the paho.mqtt.client module (2.x)."""
+
+    class CallbackAPIVersion(object):
+        VERSION1 = 1
+        VERSION2 = 2
+
+    class Client(object):
+        def __init__(self, callback_api_version, client_id=''):
+            self.callback_api_version = callback_api_version
+            self.calls = []
+            self.callbacks = {}
+
+        def connect(self, host, port):
+            self.calls.append(('connect', host, port))
+
+        def loop_start(self):
+            self.calls.append(('loop_start',))
+
+        def loop_stop(self):
+            self.calls.append(('loop_stop',))
+
+        def disconnect(self):
+            self.calls.append(('disconnect',))
+
+        def publish(self, topic, payload, qos=0, retain=False):
+            self.calls.append(('publish', topic, payload, qos, retain))
+
+        def message_callback_add(self, pattern, callback):
+            self.callbacks[pattern] = callback
+
+        def subscribe(self, pattern, qos=0):
+            self.calls.append(('subscribe', pattern, qos))
+
+class Message(object):
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+def test_paho_client(monkeypatch):
+    monkeypatch.setattr(mqtt, 'paho', FakePaho)
+    client = mqtt.PahoClient.connect('broker', 1884, client_id='pjlink')
+    paho_client = client.client
+    assert paho_client.callback_api_version == 2
+    assert paho_client.calls == [('connect', 'broker', 1884), ('loop_start',)]
+
+    client.publish('site/a/power', 'on', retain=True)
+    assert paho_client.calls[-1] == ('publish', 'site/a/power', 'on', 1, True)
+
+    received = []
+    client.subscribe('site/+/set/+', lambda *args: received.append(args))
+    assert paho_client.calls[-1] == ('subscribe', 'site/+/set/+', 1)
+    paho_client.callbacks['site/+/set/+'](
+        paho_client, None, Message('site/a/set/power', b'off'))
+    assert received == [('site/a/set/power', 'off')]
+
+    client.close()
+    assert paho_client.calls[-2:] == [('loop_stop',), ('disconnect',)]
@@ -0,0 +1,138 @@
+import threading
+
+from pjlink.poller import Poller, TokenBucket
+from pjlink.session import SessionPool
+from pjlink.simulator import SimulatedFleet, VirtualClock
+
+def make_poller(n, **kwargs):
+    clock = VirtualClock()
+    fleet = SimulatedFleet(clock, ['p%d' % i for i in range(n)])
+    pool = SessionPool(fleet.inventory, fleet.make_transport, max_idle=1e9)
+    poller = Poller(
+        sorted(fleet.projectors), pool.get, fields=('power', 'errors'),
+        clock=clock.time, sleep=clock.sleep, **kwargs)
+    return clock, fleet, poller
+
+def run_for(clock, poller, seconds):
+    end = clock.time() + seconds
+    while clock.time() < end:
+        poller.poll_once()
+        due = poller.next_due()
+        step = (due if due is not None else end) - clock.time()
+        if poller.bucket is not None:
+            step = max(step, poller.bucket.wait_time(len(poller.fields)))
+        clock.advance(max(min(step, end - clock.time()), 0.001))
+
+def test_token_bucket():
+    now = [0.0]
+    bucket = TokenBucket(10, 20, clock=lambda: now[0])
+    assert bucket.take(20)
+    assert not bucket.take(1)
+    assert bucket.wait_time(5) == 0.5
+    now[0] = 0.5
+    assert bucket.take(5)
+
+def test_backoff():
+    clock, fleet, poller = make_poller(1)
+    device = poller.devices['p0']
+
+    intervals = []
+    for i in range(8):
+        poller.poll_once()
+        intervals.append(device.interval)
+        clock.advance(poller.next_due() - clock.time())
+    # The first poll is a change (from nothing), then it backs off.
+    assert intervals == [10, 20, 40, 80, 160, 300, 300, 300]
+
+def test_transitions():
+    clock, fleet, poller = make_poller(1)
+    changes = []
+    poller.on_status = lambda name, status, changed: \
+        changed and changes.append((clock.time(), status.power))
+    run_for(clock, poller, 600)
+    assert poller.devices['p0'].interval == 300
+
+    # Warming up is followed closely, and noticed within min_interval.
+    fleet['p0'].handle('POWR', '1')
+    turned_on = clock.time()
+    run_for(clock, poller, 600)
+    powers = [power for _, power in changes]
+    assert powers == ['off', 'warm-up', 'on']
+    on_at = changes[-1][0]
+    assert on_at - (turned_on + fleet['p0'].warm_up) <= 2
+
+    # An error tightens things up again.
+    fleet['p0'].add_fault(clock.time(), 'lamp', 'warning')
+    run_for(clock, poller, 600)
+    assert poller.devices['p0'].interval == 10
+
+def test_failures():
+    clock, fleet, poller = make_poller(2)
+    pool = poller.open_projector.__self__
+
+    def make_transport(entry):
+        if entry.name == 'p1':
+            raise OSError('unreachable')
+        return fleet.make_transport(entry)
+
+    pool.make_transport = make_transport
+    errors = []
+    poller.on_error = lambda name, e: errors.append(name)
+    run_for(clock, poller, 600)
+    # Unreachable projectors back off too.
+    assert set(errors) == {'p1'}
+    assert poller.devices['p1'].interval == 300
+    assert poller.devices['p1'].failures == len(errors)
+
+def test_budget():
+    # 100 idle projectors, allowed 4 commands (2 polls) a second.
+    clock, fleet, poller = make_poller(100, budget=4)
+    run_for(clock, poller, 3600)
+    assert poller.commands <= 4 * 3600 + 4
+    # Everyone got polled, and as they settle there's capacity to spare.
+    assert all(d.status is not None for d in poller.devices.values())
+    assert poller.commands < 4 * 3600 / 2
+
+    # Compared to polling every 5 seconds, that's a fraction of the work.
+    assert poller.polls < 100 * 3600 / 5 / 10
+
+def test_remove():
+    clock, fleet, poller = make_poller(2)
+    assert poller.poll_once() == ['p0', 'p1']
+    poller.remove('p0')
+    clock.advance(10)
+    assert poller.poll_once() == ['p1']
+
+    # Added back, it's polled once, not once per queue entry.
+    poller.add('p0')
+    poller.remove('p0')
+    poller.add('p0')
+    assert poller.poll_once() == ['p0']
+    poller.close()
+
+def test_slow_projector():
+    clock, fleet, poller = make_poller(2)
+    fleet['p1'].handle('POWR', '1')
+    go = threading.Event()
+    get = poller.open_projector
+
+    def open_projector(name):
+        if name == 'p0':
+            go.wait()
+        return get(name)
+
+    poller.open_projector = open_projector
+    assert poller.start_due() == ['p0', 'p1']
+    # p1 is warming up, so it's polled every couple of seconds, however
+    # long p0 takes to answer.
+    for _ in range(3):
+        assert poller.finish(timeout=None) == ['p1']
+        clock.advance(poller.min_interval)
+        assert poller.start_due() == ['p1']
+    assert poller.inflight == {'p0', 'p1'}
+
+    go.set()
+    while poller.inflight:
+        poller.finish(timeout=None)
+    assert poller.polls == 5
+    poller.close()
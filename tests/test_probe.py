@@ -0,0 +1,78 @@
+from contextlib import contextmanager
+import socket
+import threading
+
+import pytest
+
+from pjlink import probe
+
+@contextmanager
+def greeter(greeting):
+    # Sends every connection the greeting (if any) and leaves it open.
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(16)
+    conns = []
+
+    def serve():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            conns.append(conn)
+            if greeting:
+                conn.sendall(greeting)
+
+    thread = threading.Thread(target=serve)
+    thread.daemon = True
+    thread.start()
+    try:
+        yield listener.getsockname()
+    finally:
+        listener.close()
+        for conn in conns:
+            conn.close()
+
+def closed_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    addr = sock.getsockname()
+    sock.close()
+    return addr
+
+def test_parse_greeting():
+    assert probe.parse_greeting(b'PJLINK 0\r') is False
+    assert probe.parse_greeting(b'PJLINK 1 498e4a67\r') is True
+    with pytest.raises(ValueError):
+        probe.parse_greeting(b'SSH-2.0-OpenSSH\r')
+    with pytest.raises(ValueError):
+        probe.parse_greeting(b'PJLINK 1 short\r')
+
+def test_sweep():
+    with greeter(b'PJLINK 0\r') as open_, \
+            greeter(b'PJLINK 1 498e4a67\r') as secured, \
+            greeter(None) as silent, \
+            greeter(b'220 mail.example.com ESMTP\r\n') as other:
+        results = probe.sweep(
+            [open_, secured, silent, closed_port(), other, open_],
+            timeout=0.5, concurrency=2,
+        )
+
+    assert [r.alive for r in results] == \
+        [True, True, False, False, False, True]
+    assert results[0].auth is False and results[1].auth is True
+    assert results[0].error is None and results[0].latency < 0.5
+    assert results[2].error == 'Timed out'
+    assert results[2].latency >= 0.5
+    assert results[3].error == 'ECONNREFUSED'
+    assert results[4].error.startswith('Unexpected greeting')
+
+def test_unresolvable():
+    class Resolver(object):
+        def resolve(self, host, port):
+            raise socket.gaierror('Name or service not known')
+
+    result = probe.probe('nowhere', 4352, resolver=Resolver())
+    assert not result.alive
+    assert result.error == 'Name or service not known'
@@ -2,6 +2,7 @@ import itertools
 
 import pytest
 
+from pjlink import projector
 from pjlink.projector import MUTE_AUDIO, MUTE_VIDEO, Projector, ProjectorError
 
 from server import FakeProjector, FakeProjectorSession
@@ -26,6 +27,8 @@ def test_authenticate_correct():
     fp, fps, p = make_fakes(auth=('foobar', 'ABCDEFGH'))
     assert p.authenticate(lambda: 'foobar') is True
     assert fps.stdio_clean and not fps.lockdown
+    # The power query sent to complete authentication is kept:
+    assert p.initial_power == 'off'
 
     fp, fps, p = make_fakes(auth=('foobar', 'QWERTYUI'))
     assert p.authenticate(lambda: 'foobar') is True
@@ -235,3 +238,105 @@ def test_info():
     assert p.get_other_info() == 'testing'
 
     # TODO: test these are all handled as UTF-8, with max lengths
+
+def test_decode_tables():
+    # Common replies decode to shared, immutable objects:
+    assert projector.decode_power(b'1') == 'on'
+    assert projector.decode_input(b'31') is projector.decode_input(b'31')
+    assert projector.decode_input(b'31') == ('DIGITAL', 1)
+    assert projector.decode_mute(b'21') == (False, True)
+    assert projector.decode_errors(b'000000') is \
+        projector.decode_errors(b'000000')
+    assert len(projector.ERRORS_BIN) == 3 ** 6
+
+    # Variable replies decode to tuples of shared pairs:
+    assert projector.decode_lamps(b'100 1 50 0') == \
+        ((100, True), (50, False))
+    inputs = projector.decode_inputs(b'11 35')
+    assert inputs == (('RGB', 1), ('DIGITAL', 5))
+    assert inputs[0] is projector.decode_input(b'11')
+
+    with pytest.raises(KeyError):
+        projector.decode_power(b'9')
+    with pytest.raises(AssertionError):
+        projector.decode_errors(b'00')
+
+def test_status():
+    fp, fps, p = make_fakes(auth=False)
+    fp.power = 'on'
+    fp.errors['lamp'] = 'warning'
+
+    status = p.get_status()
+    # Everything was asked for in one go.
+    assert fps.stdio_clean
+    assert status.power == 'on'
+    assert status.input == ('RGB', 1)
+    assert status.mute == (False, False)
+    assert dict(status.errors) == fp.errors
+    assert status.lamps == ((42, False),)
+
+    status = p.get_status(('power', 'mute'))
+    assert status.power == 'on' and status.mute == (False, False)
+    assert status.input is None and status.errors is None
+
+    # Queries the projector can't answer are left as None.
+    assert p.get_many(['POWR', 'XXXX']) == \
+        [(True, b'1'), (False, b'undefined command')]
+
+def test_authenticate_odd_power():
+    fp, fps, p = make_fakes(auth=('foobar', 'ABCDEFGH'))
+    fp.handle_power = lambda param: '9'
+    assert p.authenticate(lambda: 'foobar') is True
+    assert p.initial_power is None
+
+def test_class1_capabilities():
+    fp, fps, p = make_fakes(auth=False)
+    assert p.get_class() == 1
+
+    # Class 2 commands fail without bothering the projector.
+    assert not p.supports('SNUM')
+    with pytest.raises(ProjectorError) as error:
+        p.get_serial_number()
+    assert error.value.args == (b'undefined command',)
+    assert fps.stdio_clean and not fps.stdin
+
+def test_class2():
+    fp, fps, p = make_fakes(auth=False)
+    fp.pjlink_class = 2
+
+    assert p.get_serial_number() == 'SN12345'
+    assert p.pjlink_class == 2
+    assert p.get_software_version() == '2.0.1'
+    assert p.get_lamp_model() == 'LMP-42'
+    assert p.get_filter_model() == 'FLT-7'
+    assert p.get_filter_hours() == 120
+    assert p.get_input_name('DIGITAL', 1) == 'HDMI 1'
+    assert p.get_input_resolution() == (1920, 1080)
+    assert p.get_recommended_resolution() == (1280, 800)
+
+    fp.input_resolution = '-'
+    assert p.get_input_resolution() is None
+
+    assert p.get_freeze() is False
+    p.set_freeze(True)
+    assert fp.freeze and p.get_freeze() is True
+
+def test_unsupported_commands_are_remembered():
+    fp, fps, p = make_fakes(auth=False)
+    fp.pjlink_class = 2
+    p.pjlink_class = 2
+    handle = fp.handle_class2
+    calls = []
+
+    def handle_class2(body, param):
+        calls.append(body)
+        if body == 'FILT':
+            return 'ERR1'
+        return handle(body, param)
+
+    fp.handle_class2 = handle_class2
+    for i in range(3):
+        with pytest.raises(ProjectorError):
+            p.get_filter_hours()
+    assert calls == ['FILT']
+    assert not p.supports('FILT') and p.supports('SNUM')
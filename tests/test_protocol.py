@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
+import hashlib
+
 import pytest
 from six import BytesIO
 
@@ -18,6 +21,9 @@ def test_to_binary():
     assert protocol.to_binary(b'POWR', b'foo') == b'%1POWR foo\r'
     assert protocol.to_binary(b'INPT', b'') == b'%1INPT \r'
 
+    # Class 2 commands get a class 2 header:
+    assert protocol.to_binary(b'SNUM', b'?') == b'%2SNUM ?\r'
+
     # Command must be 4 characters long:
     with pytest.raises(AssertionError):
         protocol.to_binary(b'INP', b'')
@@ -44,6 +50,10 @@ def test_parse_response():
     assert protocol.parse_response(BytesIO(b'%1aBc4=eFg=%1kL\r')) == \
         (b'ABC4', b'eFg=%1kL')
 
+    # Class 2 responses:
+    assert protocol.parse_response(BytesIO(b'%2SVER=1.0\r')) == \
+        (b'SVER', b'1.0')
+
     # UTF-8 encoded data:
     param = u'möse'.encode('utf-8')
     assert protocol.parse_response(BytesIO(b'%1INFO=' + param + b'\r')) == \
@@ -58,6 +68,8 @@ def test_parse_response():
         protocol.parse_response(BytesIO(b'%'))
     with pytest.raises(ValueError):
         protocol.parse_response(BytesIO(b'%0'))
+    with pytest.raises(ValueError):
+        protocol.parse_response(BytesIO(b'%3POWR=0\r'))
     with pytest.raises(ValueError):
         protocol.parse_response(BytesIO(b'%1ABCD'))
     with pytest.raises(ValueError):
@@ -94,3 +106,94 @@ def test_send_command():
     f = BytesI(b'%1INPT=ERR4\r')
     assert protocol.send_command(f, b'INPT', b'VGA1') == \
         (False, b'projector failure')
+
+def _greeting(salt):
+    return b'PJLINK 1 ' + salt + b'\r'
+
+def _digest(salt, password):
+    return hashlib.md5(salt + password).hexdigest().encode('ascii')
+
+def test_handshake_no_auth():
+    h = protocol.Handshake(None)
+    assert h.wanted == 9
+    assert h.feed(b'PJLINK 0\r') == b''
+    assert h.done and h.result is None and h.reply is None
+
+def test_handshake_chunks():
+    stream = _greeting(b'ABCDEFGH') + b'%1POWR=1\r'
+    expected = _digest(b'ABCDEFGH', b'foobar') + b'%1POWR ?\r'
+
+    # However the bytes are split up, the outcome is the same.
+    for size in (1, 2, 5, 9, len(stream)):
+        h = protocol.Handshake(lambda: 'foobar')
+        out = b''
+        for i in range(0, len(stream), size):
+            out += h.feed(stream[i:i + size])
+        assert out == expected
+        assert h.done and h.result is True
+        assert h.reply == (b'POWR', b'1')
+
+def test_handshake_wanted():
+    # Blocking readers never read past the end of the handshake.
+    stream = BytesIO(_greeting(b'ABCDEFGH') + b'%1POWR=0\r%1EXTRA')
+    h = protocol.Handshake(lambda: 'foobar')
+    while not h.done:
+        h.feed(stream.read(h.wanted))
+    assert h.reply == (b'POWR', b'0')
+    assert stream.read() == b'%1EXTRA'
+
+def test_handshake_failed():
+    h = protocol.Handshake(lambda: 'foobar')
+    h.feed(_greeting(b'ABCDEFGH'))
+    assert h.feed(b'PJLINK ERRA\r') == b''
+    assert h.done and h.result is False and h.reply is None
+
+def test_handshake_async():
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(_greeting(b'QWERTYUI') + b'%1POWR=3\r')
+        reader.feed_eof()
+        written = []
+
+        class Writer(object):
+            def write(self, data):
+                written.append(data)
+
+            async def drain(self):
+                pass
+
+        h = protocol.Handshake(lambda: 'pw')
+        result = await protocol.handshake_async(reader, Writer(), h)
+        return result, h.reply, b''.join(written)
+
+    result, reply, written = asyncio.run(run())
+    assert result is True
+    assert reply == (b'POWR', b'3')
+    assert written == _digest(b'QWERTYUI', b'pw') + b'%1POWR ?\r'
+
+def test_response_parser():
+    stream = b'%1POWR=1\r%2SVER=1.0\r%1INFO=' + u'möse'.encode('utf-8') + b'\r'
+    expected = [
+        (b'POWR', b'1'), (b'SVER', b'1.0'),
+        (b'INFO', u'möse'.encode('utf-8')),
+    ]
+
+    # However the data is split up, the same frames come out.
+    for size in (1, 2, 3, 7, 100):
+        parser = protocol.ResponseParser()
+        frames = []
+        for i in range(0, len(stream), size):
+            frames.extend(parser.feed(stream[i:i + size]))
+        assert frames == expected
+        assert not parser.buffer and parser.discarded == 0
+
+def test_response_parser_resync():
+    parser = protocol.ResponseParser()
+    assert parser.feed(b'garbage%9XX%1POWR=0\r') == [(b'POWR', b'0')]
+    assert parser.discarded == len(b'garbage%9XX')
+
+    # A frame that never ends is given up on.
+    parser = protocol.ResponseParser()
+    assert parser.feed(b'%1NAME=' + b'x' * 200) == []
+    assert parser.feed(b'%1POWR=1\r') == [(b'POWR', b'1')]
+    assert parser.discarded == 207
@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+
+from pjlink import protocol
+from pjlink.inventory import Inventory, make_entry
+from pjlink.proxy import Proxy
+from pjlink.session import SessionPool
+from pjlink.transport import LoopbackTransport
+
+from server import FakeProjector, fake_responder
+
+def make_proxy(password=None):
+    fp = FakeProjector()
+    opened = []
+    commands = []
+    respond = fake_responder(fp)
+
+    def counting(body, param):
+        commands.append((body, param))
+        return respond(body, param)
+
+    def make_transport(entry):
+        opened.append(entry.name)
+        return LoopbackTransport(counting)
+
+    inventory = Inventory([make_entry('room', 'host', password=password)])
+    return Proxy(SessionPool(inventory, make_transport)), fp, opened, commands
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+async def client(port, data, replies, password=None):
+    reader, writer = await asyncio.open_connection('localhost', port)
+    greeting = await reader.readuntil(b'\r')
+    if password is not None:
+        salt = greeting[9:17]
+        writer.write(hashlib.md5(salt + password).hexdigest().encode('ascii'))
+    writer.write(data)
+    parser = protocol.ResponseParser()
+    frames = []
+    while len(frames) < replies:
+        chunk = await reader.read(100)
+        if not chunk:
+            break
+        frames.extend(parser.feed(chunk))
+    writer.close()
+    return greeting, frames
+
+async def stop(proxy, server):
+    # Let the handlers see their clients hang up.
+    while proxy.clients:
+        await asyncio.sleep(0.01)
+    server.close()
+    await server.wait_closed()
+
+def test_many_clients():
+    proxy, fp, opened, commands = make_proxy()
+
+    async def scenario():
+        server = await proxy.start('room')
+        port = server.sockets[0].getsockname()[1]
+        # Lots of clients at once, some pipelining.
+        results = await asyncio.gather(*[
+            client(port, b'%1POWR ?\r%1LAMP ?\r%2SNUM ?\r', 3)
+            for _ in range(20)
+        ])
+        set_result = await client(port, b'%1POWR 1\r%1powr ?\r', 2)
+        await stop(proxy, server)
+        return results, set_result
+
+    results, (_, set_frames) = run(scenario())
+    for greeting, frames in results:
+        assert greeting == b'PJLINK 0\r'
+        assert frames == [
+            (b'POWR', b'0'), (b'LAMP', b'42 0'), (b'SNUM', b'ERR1'),
+        ]
+    assert set_frames == [(b'POWR', b'OK'), (b'POWR', b'3')]
+    assert fp.power == 'warm-up'
+
+    # Everyone shared one upstream connection, and SNUM was only tried once.
+    assert opened == ['room']
+    assert commands.count((b'SNUM', b'?')) == 0
+    assert commands.count((b'CLSS', b'?')) == 1
+    proxy.close()
+
+def test_auth():
+    proxy, fp, opened, commands = make_proxy(password='secret')
+
+    async def scenario():
+        server = await proxy.start('room')
+        port = server.sockets[0].getsockname()[1]
+        good = await client(port, b'%1POWR ?\r', 1, password=b'secret')
+        bad = await client(port, b'%1POWR ?\r', 1, password=b'guess')
+        await stop(proxy, server)
+        return good, bad
+
+    (greeting, frames), (_, bad_frames) = run(scenario())
+    assert greeting.startswith(b'PJLINK 1 ') and len(greeting) == 18
+    assert frames == [(b'POWR', b'0')]
+    assert bad_frames == []
+    proxy.close()
+
+def test_unreachable():
+    proxy, fp, opened, commands = make_proxy()
+
+    def broken(entry):
+        raise OSError('no route to host')
+
+    proxy.pool.make_transport = broken
+
+    async def scenario():
+        server = await proxy.start('room')
+        port = server.sockets[0].getsockname()[1]
+        result = await client(port, b'%1POWR ?\r', 1)
+        await stop(proxy, server)
+        return result
+
+    assert run(scenario())[1] == [(b'POWR', b'ERR4')]
+    proxy.close()
@@ -0,0 +1,90 @@
+from pjlink.projector import MUTE_AUDIO, MUTE_VIDEO, Projector, Status
+from pjlink.reconcile import Desired, Reconciler, plan
+from pjlink.transport import LoopbackTransport
+
+from server import FakeProjector, fake_responder
+
+def status(power, input=None, mute=None):
+    return Status(power, input, mute, None, None)
+
+def test_plan_power():
+    on = Desired(power='on')
+    assert plan(status('on'), on) == ([], True)
+    assert plan(status('off'), on) == ([('set_power', ('on',))], False)
+    # Can't do anything while it's changing state.
+    assert plan(status('cooling'), on) == ([], False)
+    assert plan(status('warm-up'), Desired(power='off')) == ([], False)
+
+def test_plan_av():
+    want = Desired('on', ('DIGITAL', 1), (False, False))
+
+    # Input and mute wait until the projector is on.
+    assert plan(status('off'), want) == ([('set_power', ('on',))], False)
+    assert plan(status('on', ('DIGITAL', 1), (False, False)), want) == \
+        ([], True)
+    assert plan(status('on', ('RGB', 1), (True, True)), want) == ([
+        ('set_input', ('DIGITAL', 1)),
+        ('set_mute', (MUTE_VIDEO | MUTE_AUDIO, False)),
+    ], True)
+    assert plan(status('on', ('DIGITAL', 1), (False, True)), want) == \
+        ([('set_mute', (MUTE_AUDIO, False))], True)
+
+    # Input and mute don't matter when it's meant to be off.
+    assert plan(status('off'), Desired('off', ('RGB', 1))) == ([], True)
+    # But they can't be converged while it's off without a power change.
+    assert plan(status('off'), Desired(input=('RGB', 1))) == ([], False)
+
+    # Parts of the mute state can be left unmanaged.
+    assert plan(status('on', mute=(True, True)), Desired(mute=(None, False))) \
+        == ([('set_mute', (MUTE_AUDIO, False))], True)
+
+def make_fleet(n):
+    fps = dict(('p%d' % i, FakeProjector()) for i in range(n))
+    sessions = {}
+    for name, fp in fps.items():
+        p = Projector(LoopbackTransport(fake_responder(fp)).open())
+        p.authenticate(None)
+        sessions[name] = p
+    return fps, sessions
+
+def test_reconcile():
+    fps, sessions = make_fleet(10)
+    reconciler = Reconciler(sessions.__getitem__, max_workers=4)
+    desired = dict(
+        (name, Desired('on', ('DIGITAL', 2), (False, False)))
+        for name in fps
+    )
+
+    report = reconciler.reconcile(desired)
+    assert len(report.changed) == 10 and len(report.pending) == 10
+    assert all(fp.power == 'warm-up' for fp in fps.values())
+
+    for fp in fps.values():
+        fp.power = 'on'
+        fp.mute_video = True
+
+    report = reconciler.reconcile(desired)
+    assert report.commands == 20 and not report.pending
+    assert all(fp.input == ('DIGITAL', 2) for fp in fps.values())
+    assert not any(fp.mute_video for fp in fps.values())
+
+    # In steady state, nothing needs to be sent.
+    report = reconciler.reconcile(desired)
+    assert report.commands == 0
+    assert len(report.converged) == 10
+
+def test_reconcile_failure():
+    fps, sessions = make_fleet(1)
+
+    def open_projector(name):
+        if name == 'broken':
+            raise IOError('unreachable')
+        return sessions[name]
+
+    report = Reconciler(open_projector).reconcile({
+        'p0': Desired(power='off'),
+        'broken': Desired(power='off'),
+    })
+    assert [r.name for r in report.converged] == ['p0']
+    assert [r.name for r in report.failed] == ['broken']
+    assert isinstance(report.failed[0].error, IOError)
@@ -0,0 +1,140 @@
+from datetime import datetime
+import io
+
+import pytest
+
+from pjlink import schedule
+from pjlink.inventory import Inventory, make_entry
+from pjlink.projector import Projector
+from pjlink.reconcile import Desired
+from pjlink.transport import LoopbackTransport
+
+from server import FakeProjector, fake_responder
+
+TIMETABLE = '''[
+    {"name": "morning", "at": "07:45", "days": "mon-fri", "tags": "lecture",
+     "power": "on", "input": "DIGITAL 2", "mute": "off", "spread": 120},
+    {"name": "night", "at": "22:00", "building": "A", "power": "off"}
+]'''
+
+def test_parse():
+    morning, night = schedule.parse_json(io.StringIO(TIMETABLE))
+    assert morning.at == (7, 45)
+    assert morning.days == frozenset(range(5))
+    assert morning.selector == {'tags': ('lecture',)}
+    assert morning.desired == Desired('on', ('DIGITAL', 2), (False, False))
+    assert night.days == frozenset(range(7))
+    assert night.selector == {'tags': (), 'building': 'A'}
+
+    events = schedule.parse_ini(io.StringIO(
+        '[night]\nat = 22:00\ndays = sat-mon\nroom = 101\npower = off\n'))
+    assert events[0].days == frozenset([5, 6, 0])
+    assert events[0].selector == {'tags': (), 'room': '101'}
+
+    with pytest.raises(ValueError):
+        schedule.make_event('nothing', '10:00')
+    with pytest.raises(ValueError):
+        schedule.make_event('late', '24:00', power='on')
+    with pytest.raises(ValueError):
+        schedule.make_event('odd', '10:00', power='on', wing='east')
+    # Typos are caught when the timetable is loaded, not when it fires.
+    with pytest.raises(ValueError):
+        schedule.make_event('typo', '10:00', power='On')
+    with pytest.raises(ValueError):
+        schedule.make_event('typo', '10:00', input='HDMI 1')
+    with pytest.raises(ValueError):
+        schedule.make_event('typo', '10:00', input='RGB 0')
+    assert schedule.make_event('ok', '10:00', input='rgb').desired.input == \
+        ('RGB', 1)
+
+def test_next_time():
+    event = schedule.make_event('e', '07:45', days='mon-fri', power='on')
+    # A Friday afternoon: the next run is on Monday.
+    friday = datetime(2026, 10, 16, 15, 0).timestamp()
+    assert datetime.fromtimestamp(schedule.next_time(event, friday)) == \
+        datetime(2026, 10, 19, 7, 45)
+    # Runs are strictly after the given time.
+    monday = datetime(2026, 10, 19, 7, 45).timestamp()
+    assert datetime.fromtimestamp(schedule.next_time(event, monday)) == \
+        datetime(2026, 10, 20, 7, 45)
+
+def make_fleet(n):
+    fps = {}
+    sessions = {}
+    entries = []
+    for i in range(n):
+        name = 'p%d' % i
+        fps[name] = FakeProjector()
+        p = Projector(LoopbackTransport(fake_responder(fps[name])).open())
+        p.authenticate(None)
+        sessions[name] = p
+        entries.append(make_entry(
+            name, 'host%d' % i, tags='lecture' if i % 2 else '',
+        ))
+    return fps, sessions, Inventory(entries)
+
+def run_until(scheduler, when):
+    outcomes = []
+    for future in scheduler.run_pending(when):
+        outcomes.append(future.result())
+    return outcomes
+
+def test_scheduler():
+    fps, sessions, inventory = make_fleet(6)
+    event = schedule.make_event(
+        'morning', '07:45', tags='lecture', power='on', input='DIGITAL 2',
+        spread=60,
+    )
+    start = datetime(2026, 10, 19, 7, 0).timestamp()
+    scheduler = schedule.Scheduler(
+        inventory, [event], sessions.__getitem__, max_workers=2,
+        settle=120, clock=lambda: start,
+    )
+    seen = []
+    scheduler.on_outcome = seen.append
+
+    fire = datetime(2026, 10, 19, 7, 45).timestamp()
+    assert scheduler.next_due() == fire
+    assert run_until(scheduler, fire - 1) == []
+
+    # Every lecture projector is started within the spread.
+    outcomes = run_until(scheduler, fire + 60)
+    assert sorted(o.name for o in outcomes) == ['p1', 'p3', 'p5']
+    assert all(fire <= o.due < fire + 60 for o in outcomes)
+    assert all(fps[o.name].power == 'warm-up' for o in outcomes)
+    assert not any(o.result.converged for o in outcomes)
+    assert fps['p0'].power == 'off'
+
+    # Once warmed up, a second pass sets the input.
+    for fp in fps.values():
+        if fp.power == 'warm-up':
+            fp.power = 'on'
+    outcomes = run_until(scheduler, fire + 200)
+    assert sorted(o.name for o in outcomes) == ['p1', 'p3', 'p5']
+    assert all(o.attempt == 2 and o.result.converged for o in outcomes)
+    assert fps['p1'].input == ('DIGITAL', 2)
+
+    assert len(seen) == len(scheduler.outcomes) == 6
+    # Tomorrow's run is lined up.
+    assert scheduler.next_due() == fire + 86400
+    scheduler.close()
+
+def test_scheduler_failure():
+    fps, sessions, inventory = make_fleet(2)
+
+    def open_projector(name):
+        if name == 'p1':
+            raise IOError('unreachable')
+        return sessions[name]
+
+    event = schedule.make_event('night', '22:00', power='off', spread=0)
+    start = datetime(2026, 10, 19, 21, 0).timestamp()
+    scheduler = schedule.Scheduler(
+        inventory, [event], open_projector, clock=lambda: start,
+    )
+    outcomes = run_until(scheduler, start + 3600)
+    failed = [o for o in outcomes if o.result.error is not None]
+    assert [o.name for o in failed] == ['p1']
+    # Failures aren't retried until the next run.
+    assert run_until(scheduler, start + 7200) == []
+    scheduler.close()
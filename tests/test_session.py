@@ -0,0 +1,244 @@
+import threading
+import time
+
+import pytest
+
+from pjlink.inventory import Inventory, make_entry
+from pjlink.projector import ProjectorError
+from pjlink.session import (
+    BACKGROUND, INTERACTIVE, SCHEDULED, PriorityLock, Session, SessionPool,
+    priority,
+)
+from pjlink.transport import LoopbackTransport
+
+from server import FakeProjector, fake_responder
+
+class SlowResponder(object):
+    """Answers like a FakeProjector, but holds queries until released."""
+
+    def __init__(self, fp):
+        self.respond = fake_responder(fp)
+        self.release = threading.Event()
+        self.calls = []
+
+    def __call__(self, body, param):
+        self.calls.append((body, param))
+        if param == b'?':
+            self.release.wait(5)
+        return self.respond(body, param)
+
+def test_coalescing():
+    fp = FakeProjector()
+    responder = SlowResponder(fp)
+    session = Session(LoopbackTransport(responder, greeting=None).open())
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(session.get_power()))
+        for i in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    # Give them all a chance to ask before the projector answers.
+    time.sleep(0.1)
+    responder.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ['off'] * 5
+    assert responder.calls == [(b'POWR', b'?')]
+    assert not session.inflight
+
+def test_coalescing_batches():
+    fp = FakeProjector()
+    responder = SlowResponder(fp)
+    session = Session(LoopbackTransport(responder, greeting=None).open())
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(session.get_power())),
+        threading.Thread(target=lambda: results.append(
+            session.get_status(('power', 'errors')))),
+    ]
+    threads[0].start()
+    time.sleep(0.1)
+    threads[1].start()
+    time.sleep(0.1)
+    responder.release.set()
+    for thread in threads:
+        thread.join()
+
+    # The status shares the in-flight POWR, and only asks for ERST itself.
+    assert responder.calls == [(b'POWR', b'?'), (b'ERST', b'?')]
+    assert results[0] == 'off' and results[1].power == 'off'
+    assert not session.inflight
+
+def test_sets_are_not_coalesced():
+    fp = FakeProjector()
+    responder = SlowResponder(fp)
+    responder.release.set()
+    session = Session(LoopbackTransport(responder, greeting=None).open())
+
+    session.set_power('on')
+    session.set_power('on')
+    assert session.get_power() == 'warm-up'
+    assert responder.calls == [
+        (b'POWR', b'1'), (b'POWR', b'1'), (b'POWR', b'?'),
+    ]
+
+def test_errors_are_shared():
+    fp = FakeProjector()
+    transport = LoopbackTransport(fake_responder(fp), greeting=None)
+    session = Session(transport.open())
+    with pytest.raises(ProjectorError):
+        session.get('XXXX')
+    assert not session.inflight and not session.broken
+
+def make_pool(fps, **kwargs):
+    inventory = Inventory(make_entry(name, name) for name in fps)
+    opened = []
+
+    def make_transport(entry):
+        opened.append(entry.name)
+        return LoopbackTransport(fake_responder(fps[entry.name]))
+
+    return SessionPool(inventory, make_transport, **kwargs), opened
+
+def test_pool():
+    fps = {'a': FakeProjector(), 'b': FakeProjector()}
+    fps['b'].power = 'on'
+    pool, opened = make_pool(fps)
+
+    assert pool.get('a') is pool.get('a')
+    assert pool.run('b', lambda p: p.get_power()) == 'on'
+    assert opened == ['a', 'b']
+
+    # Broken sessions are replaced.
+    pool.get('a').broken = True
+    assert pool.get('a').get_power() == 'off'
+    assert opened == ['a', 'b', 'a']
+
+    pool.close()
+    assert not pool.sessions
+
+def test_pool_idle():
+    fps = {'a': FakeProjector()}
+    pool, opened = make_pool(fps, max_idle=0)
+    pool.get('a')
+    pool.get('a')
+    assert opened == ['a', 'a']
+
+def test_pool_run_retries():
+    fps = {'a': FakeProjector()}
+    pool, opened = make_pool(fps)
+    calls = []
+
+    def func(session):
+        calls.append(session)
+        if len(calls) == 1:
+            session.broken = True
+            raise IOError('connection reset')
+        return session.get_power()
+
+    assert pool.run('a', func) == 'off'
+    assert calls[0] is not calls[1]
+
+def test_pool_remembers_capabilities():
+    fps = {'a': FakeProjector()}
+    pool, opened = make_pool(fps)
+
+    assert pool.get('a').get_class() == 1
+    pool.discard('a')
+
+    # A new session doesn't need to ask again.
+    session = pool.get('a')
+    assert session.pjlink_class == 1
+    assert not session.supports('SNUM')
+
+def test_priority_lock_order():
+    lock = PriorityLock(quiet=0)
+    lock.acquire(BACKGROUND)
+    order = []
+
+    def waiter(level, label):
+        lock.acquire(level)
+        order.append(label)
+        lock.release()
+
+    threads = []
+    for level, label in [(BACKGROUND, 'b1'), (SCHEDULED, 's'),
+                         (BACKGROUND, 'b2'), (INTERACTIVE, 'i')]:
+        thread = threading.Thread(target=waiter, args=(level, label))
+        thread.start()
+        threads.append(thread)
+        # Make sure they queue up in this order.
+        while len(lock.waiters) < len(threads):
+            time.sleep(0.001)
+    lock.release()
+    for thread in threads:
+        thread.join()
+    assert order == ['i', 's', 'b1', 'b2']
+
+def test_priority_lock_quiet():
+    now = [0.0]
+    lock = PriorityLock(quiet=1.0, clock=lambda: now[0])
+    lock.acquire(INTERACTIVE)
+    lock.release()
+
+    acquired = threading.Event()
+
+    def background():
+        lock.acquire(BACKGROUND)
+        acquired.set()
+        lock.release()
+
+    thread = threading.Thread(target=background)
+    thread.start()
+    # Background traffic waits while the device is in interactive use...
+    assert not acquired.wait(0.1)
+    # ...but other traffic doesn't.
+    lock.acquire(SCHEDULED)
+    lock.release()
+    now[0] = 1.0
+    thread.join(5)
+    assert acquired.is_set()
+
+def test_interactive_jumps_queue():
+    fp = FakeProjector()
+    responder = SlowResponder(fp)
+    session = Session(LoopbackTransport(responder, greeting=None).open())
+    session.lock.quiet = 0.1
+
+    def poll(query):
+        with priority(BACKGROUND):
+            session.get_many([query])
+
+    # One background query is on the wire, and more are queued behind it.
+    threads = [threading.Thread(target=poll, args=('LAMP',))]
+    threads[0].start()
+    while not responder.calls:
+        time.sleep(0.001)
+    for body in ('INST', 'ERST', 'NAME'):
+        threads.append(threading.Thread(target=poll, args=(body,)))
+        threads[-1].start()
+    while len(session.lock.waiters) < 3:
+        time.sleep(0.001)
+
+    # An interactive query for something already queued at background
+    # priority doesn't wait for it, and goes first.
+    threads.append(threading.Thread(
+        target=lambda: session.get_many(['ERST'])))
+    threads[-1].start()
+    while len(session.lock.waiters) < 4:
+        time.sleep(0.001)
+    threads.append(threading.Thread(target=lambda: session.set_power('on')))
+    threads[-1].start()
+    while len(session.lock.waiters) < 5:
+        time.sleep(0.001)
+    responder.release.set()
+    for thread in threads:
+        thread.join()
+
+    bodies = [body for body, _ in responder.calls]
+    assert bodies[:3] == [b'LAMP', b'ERST', b'POWR']
+    assert sorted(bodies[3:]) == [b'ERST', b'INST', b'NAME']
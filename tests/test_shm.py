@@ -0,0 +1,110 @@
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from pjlink import shm
+from pjlink.poller import Poller
+from pjlink.projector import Status
+from pjlink.session import SessionPool
+from pjlink.simulator import SimulatedFleet, VirtualClock
+
+ERRORS = (
+    ('fan', 'ok'), ('lamp', 'warning'), ('temperature', 'ok'),
+    ('cover', 'ok'), ('filter', 'error'), ('other', 'ok'),
+)
+
+def test_round_trip(tmpdir):
+    path = str(tmpdir.join('state'))
+    publisher = shm.Publisher(path, capacity=4)
+    reader = shm.Reader(path)
+    assert reader.get('a') is None
+
+    status = Status(
+        'on', ('DIGITAL', 2), (True, False), ERRORS,
+        ((1200, True), (30, False)),
+    )
+    publisher.publish('a', status, now=100.0)
+    assert reader.get('a') == (status, 100.0)
+
+    # Fields that weren't polled keep their last known values.
+    publisher.publish('a', Status('cooling', None, None, None, None), now=101)
+    assert reader.get('a')[0] == status._replace(power='cooling')
+
+    publisher.publish('b', Status('off', None, None, None, None), now=102)
+    assert reader.snapshot() == {
+        'a': (status._replace(power='cooling'), 101.0),
+        'b': (Status('off', None, None, None, None), 102.0),
+    }
+
+    for name in 'cd':
+        publisher.publish(name, Status('off', None, None, None, None))
+    with pytest.raises(ValueError):
+        publisher.publish('e', Status('off', None, None, None, None))
+
+    # A restarted publisher replaces the file, and readers follow it.
+    publisher.close()
+    publisher = shm.Publisher(path, capacity=4)
+    publisher.publish('z', status, now=200.0)
+    assert reader.snapshot() == {'z': (status, 200.0)}
+    publisher.close()
+    reader.close()
+
+def test_not_a_state_file(tmpdir):
+    path = tmpdir.join('other')
+    path.write(b'x' * 64, mode='wb')
+    with pytest.raises(ValueError):
+        shm.Reader(str(path))
+
+def test_consistent_reads(tmpdir):
+    path = str(tmpdir.join('state'))
+    publisher = shm.Publisher(path, capacity=1)
+    statuses = [
+        Status('on', ('RGB', 1), (False, False), ERRORS, ((i, True),))
+        for i in range(2000)
+    ]
+    publisher.publish('a', statuses[0])
+    reader = shm.Reader(path)
+
+    def write():
+        for status in statuses:
+            publisher.publish('a', status, now=status.lamps[0][0])
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    while thread.is_alive():
+        status, when = reader.get('a')
+        # The timestamp and lamp hours are written together, or not at all.
+        assert status.lamps[0][0] == when
+    thread.join()
+    publisher.close()
+
+def test_other_process(tmpdir):
+    path = str(tmpdir.join('state'))
+    publisher = shm.Publisher(path)
+    publisher.publish('room', Status('on', ('VIDEO', 1), None, None, None))
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        'from pjlink.shm import Reader; '
+        'print(Reader(%r).get("room")[0].input)' % path,
+    ])
+    assert output == b"('VIDEO', 1)\n"
+    publisher.close()
+
+def test_poller(tmpdir):
+    path = str(tmpdir.join('state'))
+    clock = VirtualClock(1000)
+    fleet = SimulatedFleet(clock, ['p0', 'p1'])
+    pool = SessionPool(fleet.inventory, fleet.make_transport)
+    publisher = shm.Publisher(path)
+    poller = Poller(['p0', 'p1'], pool.get, clock=clock.time)
+    poller.on_status = publisher.on_status
+    fleet['p1'].handle('POWR', '1')
+    poller.poll_once()
+    poller.close()
+
+    snapshot = shm.Reader(path).snapshot()
+    assert snapshot['p0'][0].power == 'off'
+    assert snapshot['p1'][0].power == 'warm-up'
+    publisher.close()
@@ -0,0 +1,124 @@
+from datetime import datetime
+import time
+
+import pytest
+
+from pjlink import schedule
+from pjlink.projector import Projector, ProjectorError
+from pjlink.reconcile import Desired, Reconciler
+from pjlink.session import SessionPool
+from pjlink.simulator import SimulatedFleet, SimulatedProjector, VirtualClock
+
+def open_projector(sim):
+    p = Projector(sim.transport().open())
+    p.authenticate(None)
+    return p
+
+def test_power_cycle():
+    clock = VirtualClock()
+    sim = SimulatedProjector(clock, warm_up=30, cool_down=60, lamp_hours=10)
+    p = open_projector(sim)
+
+    assert p.get_power() == 'off'
+    with pytest.raises(ProjectorError):
+        p.set_input('DIGITAL', 1)
+    p.set_power('on')
+    assert p.get_power() == 'warm-up'
+    # Can't turn it off again part way.
+    with pytest.raises(ProjectorError):
+        p.set_power('off')
+    clock.advance(30)
+    assert p.get_power() == 'on'
+    p.set_input('DIGITAL', 2)
+    assert p.get_input() == ('DIGITAL', 2)
+    p.set_mute(1, True)
+    assert p.get_mute() == (True, False)
+
+    clock.advance(2 * 3600)
+    assert p.get_lamps() == [(12, True)]
+    p.set_power('off')
+    assert p.get_power() == 'cooling'
+    clock.advance(59)
+    assert p.get_power() == 'cooling'
+    clock.advance(1)
+    assert p.get_power() == 'off'
+
+    # The lamp only counts while lit.
+    clock.advance(10 * 3600)
+    assert p.get_lamps() == [(12, False)]
+
+def test_faults():
+    clock = VirtualClock(1000)
+    sim = SimulatedProjector(clock)
+    sim.add_fault(1100, 'lamp', 'warning', duration=100)
+    sim.add_fault(1150, 'lamp', 'error', duration=10)
+    sim.add_fault(1500, 'failure', duration=5)
+    p = open_projector(sim)
+
+    assert p.get_errors()['lamp'] == 'ok'
+    clock.advance(100)
+    assert p.get_errors()['lamp'] == 'warning'
+    clock.advance(50)
+    assert p.get_errors()['lamp'] == 'error'
+    clock.advance(50)
+    assert p.get_errors()['lamp'] == 'ok'
+
+    clock.advance(300)
+    with pytest.raises(ProjectorError) as exc:
+        p.get_power()
+    assert exc.value.args[0] == b'projector failure'
+    clock.advance(5)
+    assert p.get_power() == 'off'
+
+    with pytest.raises(ValueError):
+        sim.add_fault(0, 'smoke')
+
+def test_reconcile_fleet():
+    clock = VirtualClock()
+    fleet = SimulatedFleet(clock, ['p%d' % i for i in range(50)])
+    pool = SessionPool(fleet.inventory, fleet.make_transport)
+    reconciler = Reconciler(pool.get)
+    desired = dict(
+        (name, Desired('on', ('DIGITAL', 1))) for name in fleet.projectors
+    )
+
+    assert len(reconciler.reconcile(desired).pending) == 50
+    clock.advance(10)
+    assert len(reconciler.reconcile(desired).pending) == 50
+    clock.advance(30)
+    report = reconciler.reconcile(desired)
+    assert not report.pending and report.commands == 50
+    assert all(sim.input == ('DIGITAL', 1) for sim in fleet.projectors.values())
+    pool.close()
+
+def test_day():
+    # A school day for a thousand rooms, which should take no time at all.
+    started = time.monotonic()
+    clock = VirtualClock(datetime(2026, 10, 19, 0, 0).timestamp())
+    fleet = SimulatedFleet(clock, ['room-%d' % i for i in range(1000)])
+    pool = SessionPool(fleet.inventory, fleet.make_transport, max_idle=1e9)
+    events = [
+        schedule.make_event(
+            'morning', '07:45', power='on', input='DIGITAL 2', spread=300),
+        schedule.make_event('night', '22:00', power='off', spread=300),
+    ]
+    scheduler = schedule.Scheduler(
+        fleet.inventory, events, pool.get, settle=60,
+        clock=clock.time, sleep=clock.sleep,
+    )
+
+    end = datetime(2026, 10, 20, 0, 0).timestamp()
+    while clock.time() < end:
+        for future in scheduler.run_pending():
+            future.result()
+        clock.advance(min(scheduler.next_due(), end) - clock.time())
+    scheduler.close()
+    pool.close()
+
+    sims = list(fleet.projectors.values())
+    assert all(sim.power() == 'off' for sim in sims)
+    assert all(sim.input == ('DIGITAL', 2) for sim in sims)
+    assert all(14 <= sim.lamp_hours() <= 15 for sim in sims)
+    failed = [o for o in scheduler.outcomes if o.result.error is not None]
+    assert not failed
+    assert time.monotonic() - started < 30
@@ -0,0 +1,139 @@
+import pytest
+
+from pjlink import snapshot
+from pjlink.poller import Poller
+from pjlink.projector import ProjectorError, Status
+from pjlink.session import SessionPool
+from pjlink.simulator import SimulatedFleet, VirtualClock
+
+NAMES = ['room%d' % i for i in range(20)]
+
+def start(clock, fleet, path):
+    pool = SessionPool(fleet.inventory, fleet.make_transport, max_idle=1e9)
+    poller = Poller(NAMES, pool.get, clock=clock.time)
+    checkpointer = snapshot.Checkpointer(
+        path, poller, pool, spread=60, clock=clock.time)
+    return pool, poller, checkpointer
+
+def test_round_trip(tmpdir):
+    path = str(tmpdir.join('snapshot'))
+    status = Status(
+        'on', ('RGB', 2), (True, False), (('fan', 'ok'), ('lamp', 'error')),
+        ((100, True), (5, False)),
+    )
+    snapshot.save(path, {'version': snapshot.VERSION,
+                         'status': snapshot.encode_status(status)})
+    data = snapshot.load(path)
+    assert snapshot.decode_status(data['status']) == status
+    assert snapshot.decode_status(snapshot.encode_status(
+        Status('off', None, None, None, None))) == \
+        Status('off', None, None, None, None)
+
+    assert snapshot.load(str(tmpdir.join('missing'))) is None
+    tmpdir.join('corrupt').write(b'not zlib', mode='wb')
+    assert snapshot.load(str(tmpdir.join('corrupt'))) is None
+    snapshot.save(path, {'version': snapshot.VERSION + 1})
+    assert snapshot.load(path) is None
+
+def test_warm_start(tmpdir):
+    path = str(tmpdir.join('snapshot'))
+    clock = VirtualClock(1000)
+    fleet = SimulatedFleet(clock, NAMES)
+    fleet['room3'].handle('POWR', '1')
+    pool, poller, checkpointer = start(clock, fleet, path)
+    poller.poll_once()
+    clock.advance(100)
+    poller.poll_once(clock.time())
+    pool.get('room3').get_class()
+    poller.close()
+    checkpointer.close()
+    pool.close()
+    assert checkpointer.saves == 1
+    before = dict((name, poller.devices[name].status) for name in NAMES)
+
+    # Restarted, everything is known straight away, but marked stale.
+    clock.advance(10)
+    pool, poller, checkpointer = start(clock, fleet, path)
+    assert checkpointer.restore() == sorted(NAMES)
+    for name in NAMES:
+        assert poller.devices[name].status == before[name]
+        assert poller.devices[name].stale
+    assert pool.capabilities['room3'] == (1, frozenset())
+
+    # Rather than a rush, they're refreshed within their old poll interval.
+    changes = {}
+    poller.on_status = \
+        lambda name, status, changed: changes.setdefault(name, changed)
+    assert len(poller.poll_once()) < len(NAMES) / 2
+    for _ in range(20):
+        clock.advance(1)
+        poller.poll_once()
+    assert sorted(changes) == sorted(NAMES)
+    # Nothing happened while it was down, so nothing's reported as changed.
+    assert not any(changes.values())
+    assert not any(device.stale for device in poller.devices.values())
+
+    # Sessions opened since don't need to ask for the class.
+    commands = fleet['room3'].commands
+    assert pool.get('room3').get_class() == 1
+    assert fleet['room3'].commands == commands
+    poller.close()
+
+def test_old_snapshot(tmpdir):
+    path = str(tmpdir.join('snapshot'))
+    clock = VirtualClock(1000)
+    fleet = SimulatedFleet(clock, NAMES)
+    pool, poller, checkpointer = start(clock, fleet, path)
+    poller.poll_once()
+    pool.get('room1').get_class()
+    checkpointer.save()
+    poller.close()
+
+    clock.advance(snapshot.MAX_AGE)
+    pool, poller, checkpointer = start(clock, fleet, path)
+    # The statuses are too old to trust, but capabilities don't change.
+    assert checkpointer.restore() == ['room1']
+    assert poller.devices['room1'].status is None
+    assert len(poller.poll_once()) == len(NAMES)
+    poller.close()
+
+def test_periodic(tmpdir):
+    path = str(tmpdir.join('snapshot'))
+    clock = VirtualClock(1000)
+    fleet = SimulatedFleet(clock, NAMES)
+    pool, poller, checkpointer = start(clock, fleet, path)
+    checkpointer.interval = 0.01
+    checkpointer.start()
+    poller.poll_once()
+    while snapshot.load(path) is None or \
+            len(snapshot.load(path)['devices']) < len(NAMES):
+        pass
+    checkpointer.close()
+    poller.close()
+
+def test_unsupported_commands(tmpdir):
+    path = str(tmpdir.join('snapshot'))
+    clock = VirtualClock(1000)
+    fleet = SimulatedFleet(clock, NAMES)
+    pool, poller, checkpointer = start(clock, fleet, path)
+    # A class 2 projector that doesn't report its lamp model.
+    session = pool.get('room3')
+    session.pjlink_class = 2
+    with pytest.raises(ProjectorError):
+        session.get_lamp_model()
+    assert session.unsupported == {b'RLMP'}
+    checkpointer.start()
+    checkpointer.close()
+    assert checkpointer.error is None
+    poller.close()
+
+    pool, poller, checkpointer = start(clock, fleet, path)
+    checkpointer.restore()
+    assert pool.capabilities['room3'] == (2, frozenset([b'RLMP']))
+    commands = fleet['room3'].commands
+    session = pool.get('room3')
+    with pytest.raises(ProjectorError):
+        session.get_lamp_model()
+    # Neither CLSS nor RLMP was sent.
+    assert fleet['room3'].commands == commands
+    poller.close()
@@ -0,0 +1,51 @@
+import sys
+
+from pjlink.projector import Status, decode_errors
+from pjlink.statetable import StateTable
+
+def status(power, lamp='ok', lamps=((100, True),), input=('RGB', 1),
+           mute=(False, False)):
+    errors = decode_errors(
+        ('0' + {'ok': '0', 'warning': '1', 'error': '2'}[lamp] + '0000')
+        .encode('ascii'))
+    return Status(power, input, mute, errors, lamps)
+
+def make_table():
+    table = StateTable()
+    table.update('a', status('on', lamp='error'))
+    table.update('b', status('off', lamp='error', lamps=((2000, False),)))
+    table.update('c', status('on', mute=(True, True), input=('DIGITAL', 2)))
+    table.update('d', status('warm-up', lamp='warning'))
+    table.add('e')
+    return table
+
+def test_select():
+    table = make_table()
+    assert len(table) == 5
+
+    assert table.select(power='on', lamp='error') == ['a']
+    assert table.select(lamp=['warning', 'error']) == ['a', 'b', 'd']
+    assert table.select(power=['on', 'warm-up']) == ['a', 'c', 'd']
+    assert table.select(mute=(True, True)) == ['c']
+    assert table.select(input='DIGITAL') == ['c']
+    assert table.select(lamp_on=False) == ['b']
+    assert table.count(fan='ok') == 4
+    assert table.select() == ['a', 'b', 'c', 'd', 'e']
+
+def test_update():
+    table = make_table()
+    table.update('a', Status('off', None, None, None, None))
+    # Only the known fields change.
+    assert table.select(power='off') == ['a', 'b']
+    assert table.select(lamp='error') == ['a', 'b']
+
+def test_lamp_hours():
+    table = make_table()
+    assert table.lamp_hours_over(1000) == ['b']
+    assert table.lamp_hours_over(-1) == ['a', 'b', 'c', 'd']
+
+def test_names_interned():
+    table = StateTable()
+    name = ''.join(['pro', 'jector'])
+    table.add(name)
+    assert table.names[0] is sys.intern('projector')
@@ -0,0 +1,66 @@
+import io
+
+from pjlink import stats
+from pjlink.projector import Projector
+from pjlink.transport import LoopbackTransport
+
+from server import FakeProjector, fake_responder
+
+def test_buckets():
+    last = -1
+    for value in range(100000):
+        index = stats.bucket_index(value)
+        assert index >= last
+        last = index
+        upper = stats.bucket_upper(index)
+        assert value <= upper
+        # Never more than a bucket's width (1/16th) out.
+        assert upper - value <= max(value // 16, 0)
+
+def test_histogram():
+    h = stats.Histogram()
+    for value in range(1, 1001):
+        h.record(value)
+    assert h.count == 1000
+    assert h.min == 1 and h.max == 1000
+    assert h.mean == 500.5
+    assert abs(h.percentile(50) - 500) <= 500 // 16
+    assert abs(h.percentile(99) - 990) <= 990 // 16
+    assert h.percentile(100) == 1000
+
+    other = stats.Histogram()
+    other.record(5000)
+    h.merge(other)
+    assert h.count == 1001 and h.max == 5000
+    assert h.percentile(100) == 5000
+
+def test_empty():
+    assert stats.Histogram().percentile(99) == 0
+
+def test_projector_stats():
+    latency = stats.LatencyStats()
+    p = Projector(
+        LoopbackTransport(fake_responder(FakeProjector())).open(),
+        stats=latency,
+    )
+    p.authenticate(None)
+    p.get_power()
+    p.set_power('on')
+    p.get_status(['power', 'lamps'])
+
+    assert latency.histograms['POWR'].count == 3
+    assert latency.histograms['LAMP'].count == 1
+
+    out = io.StringIO()
+    latency.dump(out)
+    lines = out.getvalue().splitlines()
+    assert [line.split(':')[0] for line in lines] == ['LAMP', 'POWR']
+
+def test_timed_file():
+    f = stats.TimedFile(io.BytesIO(b'abc'))
+    assert f.read(2) == b'ab'
+    f.write(b'x')
+    f.flush()
+    assert f.read_time > 0 and f.write_time > 0
+    f.reset()
+    assert f.read_time == f.write_time == 0
@@ -0,0 +1,74 @@
+import threading
+
+import pytest
+
+from pjlink.projector import Projector
+from pjlink.transport import (
+    LoopbackTransport,
+    SerialGatewayTransport,
+    TCPTransport,
+)
+
+from server import FakeProjector, fake_projection_server, fake_responder
+
+def test_loopback():
+    fp = FakeProjector()
+    transport = LoopbackTransport(fake_responder(fp))
+    assert transport.greeting
+
+    p = Projector(transport.open())
+    assert p.authenticate(None) is None
+    assert p.get_power() == 'off'
+    p.set_input('DIGITAL', 3)
+    assert fp.input == ('DIGITAL', 3)
+    assert p.get_inputs() == fp.inputs
+
+def test_loopback_no_greeting():
+    fp = FakeProjector()
+    transport = LoopbackTransport(fake_responder(fp), greeting=None)
+    assert not transport.greeting
+
+    p = Projector(transport.open())
+    assert p.get_name() == 'FakeProjector'
+
+def test_loopback_no_auth():
+    fp = FakeProjector()
+    with pytest.raises(ValueError):
+        LoopbackTransport(fake_responder(fp), greeting=b'PJLINK 1 498e4a67\r')
+
+def run_in_thread(func):
+    results = []
+    thread = threading.Thread(target=lambda: results.append(func()))
+    thread.start()
+    return thread, results
+
+def test_tcp():
+    fp = FakeProjector()
+
+    def session(transport):
+        p = Projector(transport.open())
+        p.authenticate(lambda: 'foobar')
+        return p.get_power()
+
+    with fake_projection_server(fp, ('foobar', 'ABCDEFGH')) as (host, port):
+        transport = TCPTransport(host, port, io_timeout=5)
+        thread, results = run_in_thread(lambda: session(transport))
+    thread.join()
+
+    assert results == ['off']
+    assert transport.timing.address[1] == port
+
+def test_serial_gateway():
+    fp = FakeProjector()
+    fp.power = 'on'
+
+    def session(transport):
+        assert not transport.greeting
+        return Projector(transport.open()).get_power()
+
+    with fake_projection_server(fp, False) as (host, port):
+        transport = SerialGatewayTransport(host, port, io_timeout=5)
+        thread, results = run_in_thread(lambda: session(transport))
+    thread.join()
+
+    assert results == ['on']